@@ -0,0 +1,208 @@
+# ann.py — approximate nearest neighbours for the content (TF-IDF) vectors
+# Two pluggable indexes with the same build/add/search interface:
+#
+# TermProbeIndex (default) — impact-ordered inverted lists over the sparse rows.
+#   A song can only be similar to songs sharing one of its terms, and the
+#   heavy (rare) terms dominate cosine, so search probes the `nprobe` heaviest
+#   terms of the query, takes the top-weighted postings of each (bounded by
+#   `budget`), and scores just those candidates exactly.
+#
+# IVFIndex — IVF over SVD-reduced, unit-length dense vectors, pure NumPy:
+#   build : TruncatedSVD on a row sample → k-means centroids → rows bucketed by
+#           nearest centroid ("inverted lists")
+#   search: project the query, scan only the `nprobe` closest lists, score the
+#           candidates in the reduced space, then rerank the best `rerank * k`
+#           with exact sparse cosine
+#   Works well for descriptive text; on short artist/genre metadata the
+#   reduction blurs the rare tokens that matter, so it isn't the default.
+#
+# In both, nprobe is the recall/latency knob: more probed = higher recall, slower.
+# Deleted rows are never removed from an index; searches filter them with `alive`.
+
+from __future__ import annotations
+from typing import List, Optional, Tuple
+import threading
+
+import numpy as np
+from scipy import sparse
+
+
+def _unit(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return (x / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+class TermProbeIndex:
+    def __init__(self, nprobe: int = 4, budget: int = 5000):
+        self.nprobe = nprobe
+        self.budget = budget      # max candidates scored per query
+        self.epoch = -1           # ContentModel.epoch this index was built for
+        self._n = 0
+        self._lock = threading.Lock()  # add/search from many request threads
+
+    def build(self, matrix: sparse.csr_matrix, alive: np.ndarray, epoch: int = 0) -> "TermProbeIndex":
+        csc = matrix.tocsc()
+        # impact order: inside each term's postings, highest-weight rows first
+        cols = np.repeat(np.arange(csc.shape[1]), np.diff(csc.indptr))
+        order = np.lexsort((-csc.data, cols))
+        self._postings = csc.indices[order].astype(np.int64)
+        self._offsets = csc.indptr
+        self._bucketed = matrix.shape[0]
+        self._n = max(self._n, self._bucketed)  # rows add()ed past `matrix` stay in the tail
+        self.epoch = epoch
+        return self
+
+    def add(self, i: int, row: sparse.csr_matrix) -> None:
+        # new rows stay in an exactly-scanned tail until the next rebuild
+        with self._lock:
+            self._n = max(self._n, i + 1)
+
+    @property
+    def stale(self) -> bool:
+        """The exactly-scanned tail has grown enough to be worth a rebuild (the
+        owner does that off the request path, from the current model)."""
+        return self._n - self._bucketed > max(1024, self._bucketed // 10)
+
+    def search(self, matrix: sparse.csr_matrix, alive: np.ndarray, i: int, k: int,
+               nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k rows most similar to row i (excluding i). Returns (indices, sims)."""
+        with self._lock:
+            q = matrix[i]
+            nprobe = max(1, nprobe or self.nprobe)
+            heavy = q.indices[np.argsort(-q.data)[:nprobe]]
+            per_term = max(k, self.budget // len(heavy)) if len(heavy) else 0
+            parts: List[np.ndarray] = [
+                self._postings[self._offsets[t]:min(self._offsets[t + 1], self._offsets[t] + per_term)]
+                for t in heavy
+            ]
+            parts.append(np.arange(self._bucketed, self._n))
+            cand = np.unique(np.concatenate(parts))
+            cand = cand[cand < len(alive)]  # rows newer than the caller's snapshot
+            cand = cand[alive[cand] & (cand != i)]
+            if len(cand) == 0:
+                return cand, np.zeros(0, dtype=np.float32)
+            sims = np.asarray((matrix[cand] @ q.T).todense()).ravel()
+            top = np.argpartition(-sims, k - 1)[:k] if len(cand) > k else np.arange(len(cand))
+            top = top[np.argsort(-sims[top])]
+            return cand[top], sims[top]
+
+
+class IVFIndex:
+    def __init__(self, dim: int = 48, nlist: Optional[int] = None, nprobe: int = 8,
+                 rerank: int = 4, sample: int = 50000, seed: int = 0):
+        self.dim = dim
+        self.nlist = nlist        # None → ~4*sqrt(n)
+        self.nprobe = nprobe
+        self.rerank = rerank
+        self.sample = sample      # rows used to fit SVD / k-means
+        self.seed = seed
+        self.epoch = -1           # ContentModel.epoch this index was built for
+        self._n = 0
+        self._lock = threading.Lock()  # add/search/re-bucketing from many request threads
+
+    # ---- projection ---------------------------------------------------------
+    def project(self, rows: sparse.csr_matrix) -> np.ndarray:
+        """Sparse TF-IDF rows → unit vectors in the reduced space."""
+        z = (rows @ self._select) @ self._components  # columns unseen at build time drop out
+        return _unit(np.asarray(z))
+
+    # ---- build --------------------------------------------------------------
+    def build(self, matrix: sparse.csr_matrix, alive: np.ndarray, epoch: int = 0) -> "IVFIndex":
+        from sklearn.decomposition import TruncatedSVD  # imported here: only this index needs sklearn
+        rng = np.random.default_rng(self.seed)
+        live = np.flatnonzero(alive)
+        fit_rows = live if len(live) <= self.sample else rng.choice(live, self.sample, replace=False)
+        X_fit = matrix[np.sort(fit_rows)]
+        used = np.unique(X_fit.indices)  # only columns that actually occur
+        self._select = sparse.csr_matrix(
+            (np.ones(len(used), dtype=np.float32), (used, np.arange(len(used)))),
+            shape=(matrix.shape[1], len(used)),
+        )
+        dim = max(1, min(self.dim, len(used) - 1, X_fit.shape[0] - 1))
+        svd = TruncatedSVD(n_components=dim, random_state=self.seed)
+        svd.fit(X_fit @ self._select)
+        self._components = svd.components_.T.astype(np.float32)  # (used, dim)
+
+        n = matrix.shape[0]
+        self._z = np.zeros((max(n, 16), dim), dtype=np.float32)
+        self._z[:n] = self.project(matrix)
+        nlist = self.nlist or int(4 * np.sqrt(max(len(live), 1)))
+        nlist = max(1, min(nlist, len(fit_rows)))
+        self._centroids = self._kmeans(self._z[np.sort(fit_rows)], nlist, rng)
+        self._assign = np.zeros(len(self._z), dtype=np.int32)
+        self._assign[:n] = self._nearest(self._z[:n])
+        self._n = n
+        self._bucket()
+        self.epoch = epoch
+        return self
+
+    @staticmethod
+    def _kmeans(z: np.ndarray, k: int, rng, iters: int = 10) -> np.ndarray:
+        # spherical k-means: cosine assignment, re-normalised means
+        cent = z[rng.choice(len(z), k, replace=False)].copy()
+        for _ in range(iters):
+            lab = np.argmax(z @ cent.T, axis=1)
+            sums = np.zeros_like(cent)
+            np.add.at(sums, lab, z)
+            empty = np.bincount(lab, minlength=k) == 0
+            sums[empty] = z[rng.choice(len(z), int(empty.sum()))]  # reseed empty clusters
+            cent = _unit(sums)
+        return cent
+
+    def _nearest(self, z: np.ndarray, block: int = 65536) -> np.ndarray:
+        out = np.empty(len(z), dtype=np.int32)
+        for s in range(0, len(z), block):
+            out[s:s + block] = np.argmax(z[s:s + block] @ self._centroids.T, axis=1)
+        return out
+
+    def _bucket(self) -> None:
+        # rows sorted by list id; list j is order[offsets[j]:offsets[j+1]]
+        assign = self._assign[:self._n]
+        self._order = np.argsort(assign, kind="stable").astype(np.int64)
+        counts = np.bincount(assign, minlength=len(self._centroids))
+        self._offsets = np.concatenate([[0], np.cumsum(counts)])
+        self._bucketed = self._n
+
+    # ---- updates --------------------------------------------------------------
+    def add(self, i: int, row: sparse.csr_matrix) -> None:
+        """Index row `i` (rows must be added in order; deletes are handled by `alive`)."""
+        with self._lock:
+            if i >= len(self._z):
+                grow = max(i + 1, 2 * len(self._z))
+                self._z = np.vstack([self._z, np.zeros((grow - len(self._z), self._z.shape[1]), np.float32)])
+                self._assign = np.concatenate([self._assign, np.zeros(grow - len(self._assign), np.int32)])
+            z = self.project(row)
+            self._z[i] = z[0]
+            self._assign[i] = self._nearest(z)[0]
+            self._n = max(self._n, i + 1)
+            if self._n - self._bucketed > max(1024, self._bucketed // 10):
+                self._bucket()  # re-sort lists once the unbucketed tail gets big
+
+    @property
+    def stale(self) -> bool:
+        return False  # add() re-buckets by itself: no rebuild needed for the tail
+
+    # ---- search ---------------------------------------------------------------
+    def search(self, matrix: sparse.csr_matrix, alive: np.ndarray, i: int, k: int,
+               nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k rows most similar to row i (excluding i). Returns (indices, sims)."""
+        with self._lock:
+            nprobe = max(1, min(nprobe or self.nprobe, len(self._centroids)))
+            q = self._z[i]
+            probes = np.argpartition(-(self._centroids @ q), nprobe - 1)[:nprobe]
+            parts: List[np.ndarray] = [self._order[self._offsets[p]:self._offsets[p + 1]] for p in probes]
+            tail = np.arange(self._bucketed, self._n)
+            if len(tail):
+                parts.append(tail[np.isin(self._assign[tail], probes)])
+            cand = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+            cand = cand[cand < len(alive)]  # rows newer than the caller's snapshot
+            cand = cand[alive[cand] & (cand != i)]
+            if len(cand) == 0:
+                return cand, np.zeros(0, dtype=np.float32)
+            m = min(len(cand), max(k * self.rerank, k))
+            approx = self._z[cand] @ q
+            if m < len(cand):
+                cand = cand[np.argpartition(-approx, m - 1)[:m]]
+            exact = np.asarray((matrix[cand] @ matrix[i].T).todense()).ravel()
+            top = np.argsort(-exact)[:k]
+            return cand[top], exact[top]
@@ -1,62 +1,126 @@
-# api.py — FastAPI backend for Hybrid Music Recommender (single-user)
+# api.py — FastAPI backend for Hybrid Music Recommender (multi-user)
 # Endpoints:
-#   GET  /songs                      → list all songs
+#   GET  /songs                      → songs; ?limit=&cursor=&sort=&artist=&min_plays= pages
+#                                      (next cursor in the X-Next-Cursor header)
+#   GET  /search?q=&k=&prefix=&fuzzy= → full-text search over title/artist/album/genres
+#                                      (BM25; the last word also matches as a prefix)
 #   POST /songs                      → add manual song
 #   DELETE /songs/{song_id}          → delete song
-#   POST /import-deezer              → import songs from Deezer (no API key)
-#   POST /events                     → record {song_id, kind: like|play|skip}
-#   GET  /recommendations            → top-N hybrid recs (CB + CF [+ MF later])
-#   GET  /similar                    → top-N content-similar songs to a seed
+#   POST /import-deezer?q=..&q=..    → import songs from Deezer (no API key; DEEZER_BASE overrides the host)
+#   POST /events?user_id=            → record {song_id, kind: like|play|skip}
+#   POST /events/batch?user_id=      → many events: JSON array or NDJSON stream
+#   GET  /recommendations?user_id=   → top-N hybrid recs (CB + CF via implicit ALS)
+#   GET  /similar                    → top-N content-similar songs to a seed (ANN on big libraries)
+#   GET  /trending?window=1h|24h|7d  → top-N by time-decayed plays/likes
 #   GET  /stats                      → basic library stats
-#   GET  /playlist                   → list playlist items (as songs)
-#   POST /playlist/add               → add a song_id to playlist
-#   POST /playlist/remove            → remove a song_id from playlist
-#   GET  /playlist/export            → JSON export of current playlist
+#   GET  /ready                      → readiness probe: 503 until the content model is live
+#   GET  /cache/stats                → result cache hits/misses/versions
+#   GET  /playlist?name=             → list playlist items (as songs); name defaults to "default"
+#   POST /playlist/add               → add {song_id, name?} to a playlist (created on first add)
+#   POST /playlist/remove            → remove {song_id, name?} from a playlist
+#   GET  /playlist/export?format=    → streamed JSON or CSV export of a playlist
+#   GET  /playlists                  → playlist names and sizes
+#   DELETE /playlists/{name}         → delete a playlist
+#   GET  /metrics                    → Prometheus text: stage timings, request latency, counters
+#   GET|POST /metrics/profile?rate=  → sampled per-request stage breakdowns (MUSICLIB_PROFILE;
+#                                      admin: X-Admin-Token, or loopback clients when no token is set)
 #
 # How to run:
 #   pip install fastapi uvicorn requests scikit-learn scipy numpy pydantic
 #   uvicorn api:app --reload
+# Several worker processes: python serve.py --workers 4 (not `uvicorn --workers`,
+# whose workers would each own — and overwrite — the same files; see serve.py)
+#
+# Startup: the server listens straight away and loads the content model in the
+# background — from the copy saved at the last shutdown (content/), applying
+# only the songs that changed since, or by fitting the library when there is
+# none. /ready turns 200 once that is done. sklearn and requests are imported
+# on first use (fitting new text, IVF, Deezer, reader forwarding), not here.
 
 from __future__ import annotations
-from typing import List, Dict, Any, Optional
-import json
+from collections import Counter
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 import os
+import base64
+import csv
 import hashlib
+import hmac
+import io
+import json
+import sys
+import threading
+import time
 
 import numpy as np
-from fastapi import FastAPI, Query, Body
+from fastapi import FastAPI, Query, Body, Depends, Request, Response, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from scipy import sparse
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import requests
 
 # ---- local modules (you already have these) ---------------------------------
 from song import Song                   # musiclib/song.py
 from library import SongLibrary    # wrapper using BST keyed by song_id
+from content import ContentModel, ContentSnapshot, EMPTY_SNAPSHOT, song_popularity, song_text  # incremental TF-IDF
+from storage import JsonStore      # snapshot + append-only log persistence
+from playlist import Playlists, DEFAULT as DEFAULT_PLAYLIST  # named ordered-set playlists
+from interactions import InteractionStore, LIKE_WEIGHT, EVENT_KINDS  # sparse user×item feedback
+from ann import IVFIndex, TermProbeIndex  # approximate nearest neighbours for /similar
+from neighbours import NeighbourCache, SimilarTable  # cached item-item top-M tables
+from mf import MFTrainer                   # implicit ALS factors, retrained in the background
+import recommender                        # array-based CB/CF/hybrid scoring
+from cache import VersionedCache          # memoised /recommendations + /similar
+from trending import Trending, WINDOWS    # decayed play counters + live top-k
+from concurrency import SharedVersions    # cross-process change counters (multi-worker)
+import metrics                            # stage timings, counters, /metrics, sampling profiler
+from metrics import span
 
 # ----------------------------------------------------------------------------
 # Storage setup
 # ----------------------------------------------------------------------------
 DATA_DIR = os.environ.get("MUSICLIB_DATA", ".")
-LIB_PATH = os.path.join(DATA_DIR, "library.json")
-INTERACTIONS_PATH = os.path.join(DATA_DIR, "interactions.json")  # {song_id: {likes, plays}}
-PLAYLIST_PATH = os.path.join(DATA_DIR, "playlist.json")          # [song_id, ...]
+# "library.cat" (or any *.cat) keeps the library snapshot in the columnar,
+# memory-mapped format (catalog.py) instead of JSON
+LIB_PATH = os.path.join(DATA_DIR, os.environ.get("MUSICLIB_LIBRARY", "library.json"))
+INTERACTIONS_PATH = os.path.join(DATA_DIR, "interactions.npz")   # user×item likes/plays (CSR)
+LEGACY_INTERACTIONS_PATH = os.path.join(DATA_DIR, "interactions.json")  # old single-user {song_id: {likes, plays}}
+PLAYLIST_PATH = os.path.join(DATA_DIR, "playlist.json")          # {name: [song_id, ...]}
+TRENDING_PATH = os.path.join(DATA_DIR, "trending.json")          # decayed counters (saved on shutdown)
+CONTENT_DIR = os.environ.get("MUSICLIB_CONTENT_DIR") or os.path.join(DATA_DIR, "content")  # fitted model (.npy)
+# each file above gets a "<file>.log" of changes; fold it back in after this many
+COMPACT_EVERY = int(os.environ.get("MUSICLIB_COMPACT_EVERY", "5000"))
+# optional user_id,song_id CSV (like data:plays.csv) bulk-loaded when the store is first created
+PLAYS_CSV = os.environ.get("MUSICLIB_PLAYS_CSV")
+DEFAULT_USER = "default"  # user for clients that don't send a user_id
+# interaction log writes are buffered: flushed every EVENT_FLUSH_S seconds or
+# once EVENT_FLUSH_EVERY records are pending (a crash loses at most that tail)
+EVENT_FLUSH_S = float(os.environ.get("MUSICLIB_EVENT_FLUSH_S", "1.0"))
+EVENT_FLUSH_EVERY = int(os.environ.get("MUSICLIB_EVENT_FLUSH_EVERY", "5000"))
 
-os.makedirs(DATA_DIR, exist_ok=True)
+# Multi-worker serving (serve.py). MUSICLIB_ROLE is "single" (this process does
+# everything; the default), "writer" (owns every file and publishes changes) or
+# "reader" (serves reads from what the writer published, forwards writes to
+# MUSICLIB_WRITER_URL). Readers check for changes every FOLLOW_S seconds; the
+# writer republishes the content matrix at most every PUBLISH_S seconds.
+ROLE = os.environ.get("MUSICLIB_ROLE", "single")
+if ROLE not in ("single", "writer", "reader"):
+    raise ValueError(f"MUSICLIB_ROLE must be single, writer or reader, not {ROLE!r}")
+READER = ROLE == "reader"
+WRITER_URL = os.environ.get("MUSICLIB_WRITER_URL", "http://127.0.0.1:8001").rstrip("/")
+SHARED_DIR = os.environ.get("MUSICLIB_SHARED_DIR") or os.path.join(DATA_DIR, "shared")
+PUBLISH_S = float(os.environ.get("MUSICLIB_PUBLISH_S", "1.0"))
+FOLLOW_S = float(os.environ.get("MUSICLIB_FOLLOW_S", "0.05"))
 
-# Small JSON helpers (robust to missing/corrupt files)
-def _load_json(path: str, default):
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return default
+os.makedirs(DATA_DIR, exist_ok=True)
+if ROLE == "writer":
+    os.makedirs(SHARED_DIR, exist_ok=True)
 
-def _save_json(path: str, obj: Any) -> None:
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(obj, f, indent=2, ensure_ascii=False)
+# Replay helpers for the JSON stores (records must stay idempotent)
+def _apply_legacy_interaction(data: Dict[str, Dict[str, int]], rec: Dict[str, Any]) -> None:
+    if rec.get("op") == "set":
+        data[rec["k"]] = rec["v"]
+    elif rec.get("op") == "del":
+        data.pop(rec["k"], None)
 
 # ----------------------------------------------------------------------------
 # App & global state
@@ -68,147 +132,606 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # /songs pagination
 )
 
-library = SongLibrary(LIB_PATH)
-interactions: Dict[str, Dict[str, int]] = _load_json(INTERACTIONS_PATH, {})  # {song_id: {likes, plays}}
-playlist: List[str] = _load_json(PLAYLIST_PATH, [])
+# readers open read-only replicas that follow the writer's logs
+library = SongLibrary(LIB_PATH, compact_every=COMPACT_EVERY, follow=READER)
+_fresh_interactions = not os.path.exists(INTERACTIONS_PATH) and not READER
+interactions_store = InteractionStore(INTERACTIONS_PATH, compact_every=COMPACT_EVERY,
+                                      flush_every=EVENT_FLUSH_EVERY, follow=READER)
+if _fresh_interactions and os.path.exists(LEGACY_INTERACTIONS_PATH):
+    # one-time migration of the single-user file to DEFAULT_USER
+    _legacy = JsonStore(LEGACY_INTERACTIONS_PATH, {}, _apply_legacy_interaction)
+    interactions_store.load_dict(DEFAULT_USER, _legacy.data)
+    interactions_store.save()
+playlists = Playlists(PLAYLIST_PATH, compact_every=COMPACT_EVERY, follow=READER)
+trending = Trending()
+trending.load(TRENDING_PATH)
+
+# what changed, per source; the writer bumps a counter once the change is on disk
+shared_versions = (SharedVersions(os.path.join(SHARED_DIR, "versions"),
+                                  ("library", "content", "interactions", "playlists", "mf"),
+                                  create=ROLE == "writer")
+                   if ROLE != "single" else None)
+
+
+def _announce(*sources: str) -> None:
+    """Writer role: tell the reader workers these sources changed."""
+    if ROLE == "writer":
+        for src in sources:
+            shared_versions.bump(src)
+
+
+interactions_store.listeners.append(lambda: _announce("interactions"))  # after each log flush
+
+# ----------------------------------------------------------------------------
+# Result cache: entries are keyed by the versions of the data they were computed
+# from; bumping a source ("library", "content", "interactions") drops only the
+# endpoints that read it
+# ----------------------------------------------------------------------------
+result_cache = VersionedCache(
+    maxsize=int(os.environ.get("MUSICLIB_CACHE_SIZE", "1024")),
+    ttl=float(os.environ.get("MUSICLIB_CACHE_TTL", "300")),
+)
+result_cache.depends("recommendations", "library", "content", "interactions", "mf")
+result_cache.depends("similar", "library", "content", "similar_table")
+result_cache.depends("search", "library")
+
+
+def _bump(*sources: str) -> None:
+    """Sources changed: drop the cached results that read them, here and in reader workers."""
+    result_cache.bump(*sources)
+    _announce(*sources)
 
 # ----------------------------------------------------------------------------
 # Content features (TF-IDF)
 # ----------------------------------------------------------------------------
-_vectorizer: Optional[TfidfVectorizer] = None
-_content_matrix: Optional[sparse.csr_matrix] = None
-_id_to_idx: Dict[str, int] = {}
-_idx_to_id: List[str] = []
+# IDF is recomputed in the background once this fraction of rows changed,
+# and at least every IDF_REFRESH_S seconds if anything changed at all
+IDF_DRIFT = float(os.environ.get("MUSICLIB_IDF_DRIFT", "0.05"))
+IDF_REFRESH_S = float(os.environ.get("MUSICLIB_IDF_REFRESH_S", "300"))
+# song writes wait at most this long for the startup load before answering 503
+CONTENT_WAIT_S = float(os.environ.get("MUSICLIB_CONTENT_WAIT_S", "30"))
+
+# /similar switches from exact search to an ANN index above this many songs.
+# MUSICLIB_ANN picks the index ("terms" or "ivf", see ann.py); ANN_NPROBE is its
+# default recall/latency trade-off (unset = the index's own default)
+ANN_MIN_ROWS = int(os.environ.get("MUSICLIB_ANN_MIN_ROWS", "20000"))
+ANN_KIND = os.environ.get("MUSICLIB_ANN", "terms")
+ANN_NPROBE = int(os.environ.get("MUSICLIB_ANN_NPROBE", "0")) or None
+
+# CF can score from a cached top-M neighbour table instead of full similarity
+# rows (0 = off); the table is rebuilt in the background when content changes
+CF_NEIGHBOURS = int(os.environ.get("MUSICLIB_CF_NEIGHBOURS", "0"))
+
+# /similar answers from a precomputed top-K table on disk (data/similar.*) when
+# it can; the table is built by a process pool in the background and patched
+# as songs are added (0 = off)
+SIMILAR_K = int(os.environ.get("MUSICLIB_SIMILAR_K", "50"))
+SIMILAR_WORKERS = int(os.environ.get("MUSICLIB_SIMILAR_WORKERS", "0"))  # 0 = min(4, cpus)
+
+content_model = ContentModel(drift=IDF_DRIFT)
+neighbour_cache = NeighbourCache(m=CF_NEIGHBOURS) if CF_NEIGHBOURS > 0 else None
+similar_table = (SimilarTable(os.path.join(DATA_DIR, "similar"), k=SIMILAR_K, workers=SIMILAR_WORKERS,
+                              read_only=READER)
+                 if SIMILAR_K > 0 else None)
+if similar_table is not None:  # each process patches its own copy: nothing to announce
+    similar_table.listeners.append(lambda: result_cache.bump("similar_table"))
+ann_index = None  # TermProbeIndex | IVFIndex | None
+_ann_building = False
+_ann_lock = threading.Lock()  # rows added to ann_index vs. swapping in a rebuilt one
+# immutable view of content_model (matrix, ids, alive mask), replaced as a whole
+# by _sync_content; readers take it once per request (see concurrency.py)
+_content: ContentSnapshot = EMPTY_SNAPSHOT
+# set once the startup load (load_content) is done: /ready, and content writes
+# wait for it so they can't land on a model that is about to be replaced
+_content_ready = threading.Event()
+_content_settled = threading.Event()  # ... or failed: then _content_error says why
+_content_error: Optional[str] = None
+_saved_content_version = -1  # content_model.version last written to CONTENT_DIR
+
+
+def _sync_content() -> None:
+    global _content
+    _content = content_model.snapshot()  # one reference store: readers see old or new, never a mix
+    result_cache.bump("content")
 
 
-def _song_text(s: Song) -> str:
-    # simple concatenation of text features
-    parts = [s.title, s.artist] + list(getattr(s, "genres", []) or [])
-    return " ".join(str(x) for x in parts if x)
+def _on_content_refresh() -> None:
+    _sync_content()
+    if ann_index is not None and ann_index.epoch != content_model.epoch:
+        _rebuild_ann()  # rows were renumbered by compaction
+    if neighbour_cache is not None:
+        neighbour_cache.refresh_async(content_model)
+    if similar_table is not None:
+        similar_table.refresh_async(content_model)  # new IDF weights / renumbered rows
+
+
+content_model.listeners.append(_on_content_refresh)  # background IDF refreshes
+
+
+def _rebuild_ann() -> None:
+    """(Re)build the ANN index, or drop it while the library is small enough for exact search.
+
+    The index is only installed if the rows weren't renumbered while it was
+    building: a compaction meanwhile has its own rebuild (_on_content_refresh),
+    which this stale one must not overwrite.
+    """
+    global ann_index
+    if len(content_model) < ANN_MIN_ROWS:
+        with _ann_lock:
+            ann_index = None
+        return
+    index = IVFIndex() if ANN_KIND == "ivf" else TermProbeIndex()
+    if ANN_NPROBE:
+        index.nprobe = ANN_NPROBE
+    snap = content_model.snapshot()
+    index.build(snap.matrix, snap.alive, epoch=snap.epoch)
+    with _ann_lock:
+        now = content_model.snapshot()
+        if now.epoch != snap.epoch:
+            return  # built for rows that no longer exist
+        for i in range(snap.n, now.n):  # appended while it was building
+            index.add(i, now.matrix[i])
+        ann_index = index
+
+
+def _rebuild_ann_in_background() -> None:
+    global _ann_building
+    try:
+        _rebuild_ann()
+    except Exception as e:  # keep serving the old index / exact search
+        print(f"[ann] rebuild failed: {e}")
+    finally:
+        _ann_building = False  # set by _ann_add, which started this thread
+
+
+def _ann_add(snap: ContentSnapshot, rows: Iterable[int]) -> None:
+    """Index rows appended to the model. Rebuilding (when the library outgrows
+    exact search, or the index's unbucketed tail gets long) happens in a
+    background thread from the current model, never inside a request."""
+    global _ann_building
+    with _ann_lock:
+        ann = ann_index
+        if ann is not None and ann.epoch == snap.epoch:
+            for i in rows:
+                if i < snap.n:
+                    ann.add(i, snap.matrix[i])
+            if not ann.stale:
+                return
+        elif ann is not None or len(content_model) < ANN_MIN_ROWS:
+            return  # renumbered rows are _on_content_refresh's job
+        if _ann_building:
+            return
+        _ann_building = True
+    threading.Thread(target=_rebuild_ann_in_background, daemon=True).start()
+
+
+def _content_replaced() -> None:
+    """The model's rows were replaced wholesale (fit/load): rebuild what's derived from them."""
+    _sync_content()
+    with span("ann.build"):
+        _rebuild_ann()
+    if neighbour_cache is not None:
+        neighbour_cache.refresh_async(content_model)
+    if similar_table is not None and not similar_table.open(content_model):
+        similar_table.refresh_async(content_model)  # no saved table for these rows
 
 
 def rebuild_content() -> None:
-    """Recompute TF-IDF features for the entire library."""
-    global _vectorizer, _content_matrix, _id_to_idx, _idx_to_id
-    songs = library.bst.inorder()  # List[Song]
-    _idx_to_id = [s.song_id for s in songs]
-    _id_to_idx = {sid: i for i, sid in enumerate(_idx_to_id)}
-    corpus = [_song_text(s) for s in songs]
-    if not corpus:
-        _vectorizer = None
-        _content_matrix = None
+    """Recompute TF-IDF features for the entire library (full resync)."""
+    with span("content.rebuild"):
+        content_model.fit((s.song_id, song_text(s), song_popularity(s)) for s in library.all_songs())
+    _content_replaced()
+
+
+def load_content() -> None:
+    """Startup: restore the model saved by the last run and apply the songs added,
+    changed or deleted since; fit from scratch when there is none (or when most
+    of the library changed). Saves the result if it differs from what's on disk."""
+    global _saved_content_version
+    with span("content.load"):
+        loaded = content_model.load(CONTENT_DIR)
+    if not loaded:
+        rebuild_content()
+        _save_content()
+        return
+    items = [(s.song_id, song_text(s), song_popularity(s)) for s in library.all_songs()]
+    changed, gone = content_model.diff(items)
+    if len(changed) + len(gone) > len(items) // 4:
+        rebuild_content()  # cheaper than that many single-row updates
+    else:
+        with span("content.catch_up"):
+            for sid in gone:
+                content_model.remove(sid)
+            for it in changed:
+                content_model.add(*it)
+        if not changed and not gone:
+            _saved_content_version = content_model.version  # what's on disk already
+        _content_replaced()
+    _save_content()
+
+
+def _save_content() -> None:
+    """Write the content model to CONTENT_DIR for the next boot (skipped if unchanged)."""
+    global _saved_content_version
+    if content_model.version == _saved_content_version:
+        return
+    os.makedirs(CONTENT_DIR, exist_ok=True)
+    with span("content.save"):
+        _saved_content_version = content_model.save(CONTENT_DIR)
+
+
+def _require_content() -> None:
+    """Wait for the startup load before touching the model; 503 if it failed or
+    is still running after CONTENT_WAIT_S (a threadpool thread never waits forever)."""
+    if _content_ready.is_set():
         return
-    _vectorizer = TfidfVectorizer(min_df=1, stop_words="english")
-    _content_matrix = _vectorizer.fit_transform(corpus)
+    _content_settled.wait(CONTENT_WAIT_S)
+    if not _content_ready.is_set():
+        raise HTTPException(status_code=503, detail=_content_error or "loading the content model")
 
 
-def content_similar_ids(song_id: str, k: int = 10) -> List[str]:
-    if _content_matrix is None or song_id not in _id_to_idx:
+def content_add(s: Song) -> None:
+    """Add (or replace) one song's row without refitting the whole library."""
+    content_add_many([s])
+
+
+def content_add_many(songs: List[Song]) -> None:
+    """content_add for a batch: one sync/cache bump at the end."""
+    _require_content()
+    with span("content.add"):
+        rows = [content_model.add(s.song_id, song_text(s), song_popularity(s)) for s in songs]
+    if not rows:
+        return
+    _sync_content()
+    if similar_table is not None:
+        similar_table.patch_async(content_model)  # a product over the whole library: not on the request
+    _ann_add(_content, rows)
+
+
+def content_remove(song_id: str) -> None:
+    _require_content()
+    content_model.remove(song_id)
+    _sync_content()
+
+
+top_k_indices = recommender.top_k_indices
+
+
+def content_similar_ids(song_id: str, k: int = 10, nprobe: Optional[int] = None) -> List[str]:
+    snap = _content
+    i = snap.row(song_id)
+    if snap.matrix is None or i is None:
         return []
-    i = _id_to_idx[song_id]
-    sims = cosine_similarity(_content_matrix[i], _content_matrix).ravel()
+    ids = snap.idx_to_id
+    if similar_table is not None:
+        top = similar_table.lookup(i, k, snap.alive, snap.epoch)
+        if top is not None:
+            return [ids[j] for j in top]
+    ann = ann_index
+    if ann is not None and ann.epoch == snap.epoch:
+        top, _ = ann.search(snap.matrix, snap.alive, i, k, nprobe=nprobe)
+        return [ids[j] for j in top]
+    sims = (snap.matrix @ snap.matrix[i].T).toarray().ravel()  # rows are unit length: dot = cosine
+    sims[~snap.alive] = -2  # deleted rows
     sims[i] = -1  # exclude self
-    top = np.argsort(-sims)[:k]
-    return [_idx_to_id[j] for j in top]
+    top = top_k_indices(sims, k + 1)  # +1: the seed itself may sneak in when k >= n
+    return [ids[j] for j in top if snap.alive[j] and j != i][:k]
 
 
-def content_scores_for_user() -> Dict[str, float]:
-    # Build an average profile from interacted items (likes+plays)
-    if _content_matrix is None or len(interactions) == 0:
-        return {}
-    idxs = [ _id_to_idx[sid] for sid in interactions.keys() if sid in _id_to_idx ]
-    if not idxs:
+UserItems = Tuple[List[str], np.ndarray, np.ndarray]  # interactions_store.user_items()
+Seeds = Tuple[np.ndarray, np.ndarray]  # _user_seeds()
+
+
+def _user_seeds(user_id: str, snap: ContentSnapshot, items: Optional[UserItems] = None) -> Seeds:
+    """(content-matrix rows, likes/plays weights) of the songs a user interacted with.
+
+    The score helpers below take these (and `items`) as optional arguments so
+    one request reads the user's interactions once (see hybrid_recommend).
+    """
+    ids, likes, plays = items if items is not None else interactions_store.user_items(user_id)
+    rows, keep = [], []
+    for n, sid in enumerate(ids):
+        j = snap.row(sid)
+        if j is not None:
+            rows.append(j)
+            keep.append(n)
+    weights = likes[keep] * LIKE_WEIGHT + plays[keep] * 1.0
+    return np.asarray(rows, dtype=np.int64), weights.astype(np.float32)
+
+
+def content_score_array(user_id: str = DEFAULT_USER, snap: Optional[ContentSnapshot] = None,
+                        seeds: Optional[Seeds] = None) -> Optional[np.ndarray]:
+    """Cosine of every song against the user's average profile (likes+plays), aligned to snapshot rows."""
+    snap = snap or _content
+    if snap.matrix is None:
+        return None
+    idxs, _ = seeds if seeds is not None else _user_seeds(user_id, snap)
+    if len(idxs) == 0:
+        return None
+    return recommender.content_scores(snap.matrix, idxs)
+
+
+def content_scores_for_user(user_id: str = DEFAULT_USER) -> Dict[str, float]:
+    snap = _content
+    sims = content_score_array(user_id, snap)
+    if sims is None:
         return {}
-    prof = _content_matrix[idxs].mean(axis=0)     # (1, V) but type is numpy.matrix
-    prof = np.asarray(prof).reshape(1, -1)        # convert to ndarray
-    sims = cosine_similarity(prof, _content_matrix).ravel()  # fixes
-    return { _idx_to_id[i]: float(sims[i]) for i in range(len(_idx_to_id)) }
+    return { snap.idx_to_id[i]: float(sims[i]) for i in np.flatnonzero(snap.alive) }
 # ----------------------------------------------------------------------------
-# Collaborative (toy item-kNN reusing TF-IDF as item features)
+# Collaborative: implicit ALS factors (mf.py), item-kNN over TF-IDF until the
+# first model is trained
 # ----------------------------------------------------------------------------
+# factors per user/item (0 = off) and how often the background trainer checks
+# for new interactions; the latest factors are kept in mf.npz across restarts
+MF_FACTORS = int(os.environ.get("MUSICLIB_MF_FACTORS", "32"))
+MF_ITERS = int(os.environ.get("MUSICLIB_MF_ITERS", "10"))
+MF_RETRAIN_S = float(os.environ.get("MUSICLIB_MF_RETRAIN_S", "60"))
+MF_PATH = os.path.join(DATA_DIR, "mf.npz")
 
-def cf_item_scores() -> Dict[str, float]:
-    if _content_matrix is None or len(_idx_to_id) == 0 or len(interactions) == 0:
-        return {}
+mf_trainer = MFTrainer(interactions_store, factors=MF_FACTORS, iters=MF_ITERS,
+                       path=MF_PATH) if MF_FACTORS > 0 else None
+if mf_trainer is not None:
+    mf_trainer.listeners.append(lambda: _bump("mf"))
+# (model, content snapshot) → (content rows, factor rows) of the songs both know
+_mf_align: Tuple[Any, Any, np.ndarray, np.ndarray] = (None, None, np.zeros(0, np.int64), np.zeros(0, np.int64))
+
+
+def _mf_alignment(model, snap: ContentSnapshot) -> Tuple[np.ndarray, np.ndarray]:
+    global _mf_align
+    align = _mf_align  # read once: another thread may replace it
+    if align[0] is not model or align[1] is not snap:
+        # O(factor rows), not O(catalog): every song write makes a new snapshot
+        rows, cols = model.align(snap.row)
+        align = _mf_align = (model, snap, rows, cols)
+    return align[2], align[3]
+
+
+def mf_score_array(user_id: str = DEFAULT_USER, snap: Optional[ContentSnapshot] = None,
+                   model=None, items: Optional[UserItems] = None) -> Optional[np.ndarray]:
+    """User·item factor scores aligned to snapshot rows (songs unknown to the model get 0).
+
+    The user vector is folded in from their current likes/plays against the
+    snapshot's item factors, so new events count before the next retrain.
+    """
+    snap = snap or _content
+    if model is None:
+        model = mf_trainer.model if mf_trainer is not None else None  # one snapshot per request
+    if model is None or snap.matrix is None:
+        return None
+    ids, likes, plays = items if items is not None else interactions_store.user_items(user_id)
+    known = [(model.item_idx[sid], n) for n, sid in enumerate(ids) if sid in model.item_idx]
+    if not known:
+        return None
+    item_rows = np.array([k[0] for k in known], dtype=np.int64)
+    keep = [k[1] for k in known]
+    weights = likes[keep] * LIKE_WEIGHT + plays[keep] * 1.0
+    raw = model.scores(model.fold_in(item_rows, weights))
+    rows, cols = _mf_alignment(model, snap)
+    out = np.zeros(snap.n, dtype=np.float32)
+    out[rows] = raw[cols]
+    return out
+
+
+def cf_item_score_array(user_id: str = DEFAULT_USER, snap: Optional[ContentSnapshot] = None,
+                        seeds: Optional[Seeds] = None, items: Optional[UserItems] = None) -> Optional[np.ndarray]:
+    """Collaborative score per song as one array aligned to snapshot rows, min-max
+    scaled over the unseen songs.
+
+    Summed seed→item TF-IDF similarity weighted by likes/plays, one sparse
+    product over the matrix no matter how many seeds a user has (see
+    recommender.cf_scores). Where an ALS model has factors for a song, its
+    score replaces the kNN one (recommender.mf_with_fallback): songs nobody
+    has interacted with yet, which is every unseen song with a single user,
+    keep their kNN score instead of dropping to 0.
+    """
+    snap = snap or _content
+    if snap.matrix is None or snap.n == 0:
+        return None
+    if seeds is None:
+        items = interactions_store.user_items(user_id)
+        seeds = _user_seeds(user_id, snap, items)
+    seeds, weights = seeds
+    if len(seeds) == 0:
+        return None
+    mask = snap.alive.copy()
+    mask[seeds] = False  # hide seen
     # treat interacted items as neighbors; score other items by summed similarity
-    scores = np.zeros(len(_idx_to_id), dtype=np.float32)
-    weights = []
-    seeds = []
-    for sid, ev in interactions.items():
-        j = _id_to_idx.get(sid)
-        if j is None:
-            continue
-        w = (ev.get("likes", 0) * 3.0) + (ev.get("plays", 0) * 1.0)
-        seeds.append(j)
-        weights.append(w)
-    if not seeds:
+    table = neighbour_cache.get(snap.version) if neighbour_cache is not None else None
+    if table is None and neighbour_cache is not None:
+        neighbour_cache.refresh_async(content_model)
+    with span("recommend.knn"):
+        knn = recommender.cf_scores(snap.matrix, seeds, weights, table)
+    model = mf_trainer.model if mf_trainer is not None else None
+    with span("recommend.mf"):
+        mf = mf_score_array(user_id, snap, model, items)
+    if mf is None:
+        return recommender.minmax(knn, mask)
+    known = np.zeros(snap.n, dtype=bool)
+    known[_mf_alignment(model, snap)[0]] = True
+    return recommender.mf_with_fallback(mf, knn, known, mask)
+
+
+def cf_item_scores(user_id: str = DEFAULT_USER) -> Dict[str, float]:
+    snap = _content
+    scores = cf_item_score_array(user_id, snap)
+    if scores is None:
         return {}
-    weights = np.array(weights, dtype=np.float32)
-    for j, w in zip(seeds, weights):
-        sims = cosine_similarity(_content_matrix[j], _content_matrix).ravel()
-        scores += sims * w
-    for j in seeds:
-        scores[j] = -1e9  # hide seen
-    # normalize to 0..1
-    scores = (scores - scores.min()) / (scores.max() - scores.min() + 1e-8)
-    return { _idx_to_id[i]: float(scores[i]) for i in range(len(scores)) }
+    return { snap.idx_to_id[i]: float(scores[i]) for i in np.flatnonzero(snap.alive) }
+
+
+def cf_top_k(k: int, user_id: str = DEFAULT_USER) -> List[str]:
+    """Top-k CF song ids (seen songs excluded)."""
+    snap = _content
+    items = interactions_store.user_items(user_id)
+    seeds = _user_seeds(user_id, snap, items)
+    scores = cf_item_score_array(user_id, snap, seeds, items)
+    if scores is None:
+        return []
+    candidates = snap.alive.copy()
+    candidates[seeds[0]] = False
+    return [snap.idx_to_id[i] for i in recommender.hybrid_top_k(k, candidates, 0.0, 1.0, 0.0, cf=scores)]
 
 
 # Hybrid blend
 
 
 
-def hybrid_recommend(k: int, alpha: float, beta: float, gamma: float = 0.0) -> List[Song]:
+def hybrid_recommend(k: int, alpha: float, beta: float, gamma: float = 0.0,
+                     user_id: str = DEFAULT_USER) -> List[Song]:
     """
     Hybrid recommendations using:
       - alpha: content-based score weight (CB)
-      - beta : collaborative score weight (CF)
+      - beta : collaborative score weight (CF: implicit ALS where it knows the song, item-kNN elsewhere)
       - gamma: optional popularity / fallback weight (keeps API compatible with older calls)
-    MF (PyTorch) removed for demo simplicity.
-    """
-    cb = content_scores_for_user()    # {song_id: score}
-    cf = cf_item_scores()            # {song_id: score}
-    # tiny popularity fallback (rank scaled down so it won't dominate unless gamma large)
-    pop = { s.song_id: (s.rank or 0) / 100000.0 for s in library.bst.inorder() }
-    seen = set(interactions.keys())
-
-    scores: Dict[str, float] = {}
-    for s in library.bst.inorder():
-        sid = s.song_id
-        if sid in seen:
-            continue
-        # combine normalized CB + CF + optional popularity (gamma)
-        score = alpha * cb.get(sid, 0.0) + beta * cf.get(sid, 0.0) + gamma * pop.get(sid, 0.0)
-        scores[sid] = score
 
-    top = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
-    sid2song = { s.song_id: s for s in library.bst.inorder() }
-    return [sid2song[sid] for sid, _ in top if sid in sid2song]
+    Every component is an array aligned to the rows of one content snapshot;
+    the blend and the top-k (argpartition) run over those arrays, only the k
+    winners become Song objects.
+    """
+    snap = _content  # every score below uses this one consistent view
+    if snap.matrix is None:
+        return []
+    candidates = snap.alive.copy()
+    with span("recommend.seeds"):  # the user's interactions, read once for every score below
+        items = interactions_store.user_items(user_id)
+        seeds = _user_seeds(user_id, snap, items)
+        candidates[seeds[0]] = False
+    with span("recommend.content"):
+        cb = content_score_array(user_id, snap, seeds) if alpha else None
+    with span("recommend.cf"):
+        cf = cf_item_score_array(user_id, snap, seeds, items) if beta else None
+    with span("recommend.blend"):
+        top = recommender.hybrid_top_k(k, candidates, alpha, beta, gamma, cb=cb, cf=cf, pop=snap.popularity)
+    with span("recommend.songs"):
+        return library.search_songs(snap.idx_to_id[i] for i in top)
 
 
 # ----------------------------------------------------------------------------
-# Deezer helpers (inline client to avoid extra files)
+# Multi-worker serving: the writer publishes, readers follow (see serve.py and
+# concurrency.py)
 # ----------------------------------------------------------------------------
-DEEZER_BASE = "https://api.deezer.com"
-
-def deezer_search_tracks(query: str, limit: int = 50) -> List[Song]:
-    limit = max(1, min(int(limit), 200))
-    url = f"{DEEZER_BASE}/search"
-    r = requests.get(url, params={"q": query, "limit": limit}, timeout=10)
-    r.raise_for_status()
-    rows = r.json().get("data", [])
-    out: List[Song] = []
-    for row in rows:
-        song_id = str(row.get("id"))
-        title = row.get("title", "")
-        artist = (row.get("artist") or {}).get("name", "")
-        album = (row.get("album") or {}).get("title", "")
-        duration = int(row.get("duration") or 0)
-        rank = int(row.get("rank") or 0)
-        out.append(Song(song_id=song_id, title=title, artist=artist, album=album, genres=[], duration=duration, rank=rank))
-    return out
+_published_version = -1
+
+
+def _publish_content() -> None:
+    """Writer role: write the content rows for the readers to memory-map."""
+    global _published_version
+    with span("content.publish"):
+        _published_version = content_model.publish(SHARED_DIR)
+    _announce("content")
+
+
+def _publish_loop() -> None:
+    # debounced: a burst of adds costs one publish, readers lag at most PUBLISH_S
+    while True:
+        time.sleep(PUBLISH_S)
+        if content_model.version != _published_version:
+            try:
+                _publish_content()
+            except Exception as e:  # readers keep the previous generation
+                print(f"[publish] content publish failed: {e}")
+
+
+def _follow_content() -> None:
+    """Reader role: switch to the content rows the writer last published."""
+    old = _content
+    if not content_model.attach(SHARED_DIR):
+        return
+    _sync_content()
+    snap = _content
+    if similar_table is not None:
+        if similar_table.epoch == snap.epoch:
+            similar_table.patch_async(content_model)  # rows appended since
+        else:
+            similar_table.open(content_model)
+    ann = ann_index
+    if ann is not None and ann.epoch == snap.epoch == old.epoch:
+        _ann_add(snap, range(old.n, snap.n))
+    elif ann is not None or len(content_model) >= ANN_MIN_ROWS:
+        _rebuild_ann()
+
+
+_FOLLOWERS = {
+    "library": library.sync,
+    "playlists": playlists.sync,
+    "interactions": interactions_store.sync,
+    "content": _follow_content,
+    "mf": mf_trainer.reload if mf_trainer is not None else (lambda: None),
+}
+# sources that catch up by reading a few new log lines: cheap enough to do
+# before answering a request, so a write the writer acknowledged is visible
+# from every worker (content and mf are remapped in the background)
+LOG_SOURCES = ("library", "playlists", "interactions")
+_seen_versions: Dict[str, int] = {}
+_follow_locks = {src: threading.Lock() for src in _FOLLOWERS}
+
+
+def _stale(sources) -> bool:
+    return any(shared_versions.get(src) != _seen_versions.get(src) for src in sources)
+
+
+def _follow(sources=tuple(_FOLLOWERS)) -> None:
+    """Reader role: catch up with the sources the writer changed since the last call."""
+    for src in sources:
+        with _follow_locks[src]:
+            version = shared_versions.get(src)
+            if version != _seen_versions.get(src):
+                _seen_versions[src] = version  # first: a bump while we catch up means another round
+                with span(f"follow.{src}"):
+                    _FOLLOWERS[src]()
+                result_cache.bump(src)
+    if similar_table is not None and "content" in sources and similar_table.changed_on_disk(content_model):
+        with _follow_locks["content"]:
+            if similar_table.open(content_model):  # the writer rebuilt it
+                result_cache.bump("content")
+
+
+def _follow_loop() -> None:
+    while True:
+        time.sleep(FOLLOW_S)
+        try:
+            _follow()
+        except Exception as e:  # keep serving what we have
+            print(f"[follow] catching up with the writer failed: {e}")
+
+
+# Reader role: writes — and /trending, whose live counters only the writer
+# keeps — are forwarded to the writer and its reply passed back unchanged;
+# reads first catch up with LOG_SOURCES if the writer changed any
+WRITER_PATHS = ("/trending",)
+LOCAL_PATHS = ("/metrics/profile",)  # per-process, never forwarded
+_HOP_HEADERS = {"host", "content-length", "connection", "keep-alive", "transfer-encoding", "content-encoding"}
+
+if READER:
+    import requests
+
+    _writer_session = requests.Session()
+
+    @app.middleware("http")
+    async def _forward_to_writer(request: Request, call_next):
+        if request.url.path in LOCAL_PATHS:
+            return await call_next(request)
+        if request.method in ("GET", "HEAD", "OPTIONS") and request.url.path not in WRITER_PATHS:
+            if _stale(LOG_SOURCES):
+                await run_in_threadpool(_follow, LOG_SOURCES)
+            return await call_next(request)
+        body = await request.body()  # an NDJSON upload is buffered here, then sent on
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in _HOP_HEADERS}
+        try:
+            r = await run_in_threadpool(
+                _writer_session.request, request.method, WRITER_URL + request.url.path,
+                params=request.query_params.multi_items(), data=body, headers=headers, timeout=60,
+            )
+        except requests.RequestException as e:
+            return JSONResponse({"detail": f"writer unavailable: {e}"}, status_code=503)
+        if request.method not in ("GET", "HEAD"):
+            await run_in_threadpool(_follow)  # this worker sees its own write straight away
+        return Response(r.content, status_code=r.status_code,
+                        headers={k: v for k, v in r.headers.items() if k.lower() not in _HOP_HEADERS})
+
 
 # ----------------------------------------------------------------------------
 # Schemas
@@ -231,29 +754,124 @@ class SongOut(BaseModel):
     plays: int = 0
     rank: int = 0
 
+class SearchHit(SongOut):
+    score: float
+
 class EventIn(BaseModel):
     song_id: str
     kind: str  # like | play | skip
+    user_id: Optional[str] = None  # batch only; defaults to the ?user_id= param
 
 class PlaylistEdit(BaseModel):
     song_id: str
+    name: Optional[str] = DEFAULT_PLAYLIST
 
 # ----------------------------------------------------------------------------
 # Startup
 # ----------------------------------------------------------------------------
 @app.on_event("startup")
 def _startup():
-    # ensure JSONs exist
-    _save_json(INTERACTIONS_PATH, interactions)
-    _save_json(PLAYLIST_PATH, playlist)
-    rebuild_content()
+    if READER:
+        _follow()  # everything the writer has published so far
+        threading.Thread(target=_follow_loop, daemon=True).start()
+        _content_ready.set()
+        _content_settled.set()
+        threading.Thread(target=library.build_search_index, daemon=True).start()
+        return
+    # ensure data files exist (and fold any leftover logs into them); a clean
+    # shutdown left nothing to fold, so nothing is rewritten
+    if PLAYS_CSV and _fresh_interactions:
+        interactions_store.load_csv(PLAYS_CSV)
+    if interactions_store.unsaved:
+        interactions_store.save()
+    if playlists.unsaved:
+        playlists.save()
+    interactions_store.start_flusher(EVENT_FLUSH_S)
+    if mf_trainer is not None:
+        if mf_trainer.stale:
+            threading.Thread(target=mf_trainer.train, daemon=True).start()
+        mf_trainer.start(MF_RETRAIN_S)
+    threading.Thread(target=_load_content_in_background, daemon=True).start()
+
+
+def _load_content_in_background() -> None:
+    global _content_error
+    try:
+        load_content()
+    except Exception as e:  # /ready and song writes answer 503 from now on
+        print(f"[content] loading the content model failed: {e}")
+        _content_error = f"loading the content model failed: {e}"
+        _content_settled.set()
+        raise
+    content_model.start_scheduler(IDF_REFRESH_S)
+    if ROLE == "writer":
+        _publish_content()  # before /ready: serve.py starts the readers after it
+        threading.Thread(target=_publish_loop, daemon=True).start()
+    _content_ready.set()
+    _content_settled.set()
+    library.build_search_index()  # after the content model, which /ready waits for
+
+
+@app.on_event("shutdown")
+def _shutdown():
+    if READER:
+        return  # nothing here is ours to save
+    interactions_store.stop()  # write out buffered events
+    trending.save(TRENDING_PATH)
+    if _content_ready.is_set():
+        _save_content()  # next boot loads this instead of refitting
+    if similar_table is not None:
+        similar_table.save(content_model)  # keep patched rows across restarts
 
 # ----------------------------------------------------------------------------
 # Songs CRUD
 # ----------------------------------------------------------------------------
+def _encode_cursor(key: Tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple:
+    try:
+        return tuple(json.loads(base64.urlsafe_b64decode(cursor.encode())))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="bad cursor")
+
+
 @app.get("/songs", response_model=List[SongOut])
-def list_songs():
-    return [s.__dict__ for s in library.bst.inorder()]
+def list_songs(response: Response, limit: Optional[int] = Query(None, ge=1, le=1000),
+               cursor: Optional[str] = None, sort: str = "id", artist: Optional[str] = None,
+               min_plays: int = 0):
+    """
+    Songs in `sort` order: id | title | artist | plays_desc | rank_desc.
+    Without `limit` everything matching is returned (old behaviour). With it, pass
+    the X-Next-Cursor response header back as `cursor` for the next page.
+    `artist` is a case-insensitive prefix.
+    """
+    after = _decode_cursor(cursor) if cursor else None
+    try:
+        songs, next_key = library.page(sort, limit or len(library), after, artist, min_plays)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except TypeError:  # cursor from a different sort order
+        raise HTTPException(status_code=400, detail="bad cursor")
+    if next_key is not None:
+        response.headers["X-Next-Cursor"] = _encode_cursor(next_key)
+    return [s.to_dict() for s in songs]
+
+@app.get("/search", response_model=List[SearchHit])
+def search_library(q: str = Query(..., min_length=1, max_length=200), k: int = Query(20, ge=1, le=100),
+                   prefix: bool = True, fuzzy: bool = False):
+    """
+    Songs matching the words of `q` in their title, artist, album or genres,
+    best first: songs with more of the words, then by BM25 score. The last word
+    also matches longer words it starts ("beat" → "beatles") unless prefix=false;
+    fuzzy=true lets a word with no match match one a typo away.
+    """
+    def compute():
+        with span("search"):
+            hits = library.search(q, k, prefix=prefix, fuzzy=fuzzy)
+        return [dict(s.to_dict(), score=round(score, 4)) for s, score in hits if s is not None]
+    return result_cache.get_or_compute("search", (q, k, prefix, fuzzy), compute)
 
 @app.post("/songs", response_model=SongOut)
 def add_song(payload: SongIn):
@@ -269,116 +887,377 @@ def add_song(payload: SongIn):
         duration=int(payload.duration or 0),
         rank=int(payload.rank or 0),
     )
+    _require_content()  # before the library write, so a 503 changes nothing
     library.add_song(s)
-    rebuild_content()
-    return s.__dict__
+    _bump("library")
+    content_add(s)
+    return s.to_dict()
 
 @app.delete("/songs/{song_id}")
 def delete_song(song_id: str):
+    _require_content()
     library.delete_song(song_id)
-    interactions.pop(song_id, None)
-    if song_id in playlist:
-        playlist.remove(song_id)
-    _save_json(INTERACTIONS_PATH, interactions)
-    _save_json(PLAYLIST_PATH, playlist)
-    rebuild_content()
+    trending.remove(song_id)
+    _bump("library")
+    if song_id in interactions_store.item_idx:
+        interactions_store.drop_item(song_id)
+        result_cache.bump("interactions")  # readers hear about it when the log is flushed
+    playlists.remove_everywhere(song_id)
+    _announce("playlists")
+    content_remove(song_id)
     return {"ok": True}
 
 # ----------------------------------------------------------------------------
 # Deezer import
 # ----------------------------------------------------------------------------
 @app.post("/import-deezer", response_model=List[SongOut])
-def import_deezer(q: str = Query(..., description="Deezer search query"), limit: int = 5):
-    items = deezer_search_tracks(q, limit=limit)
-    added: List[Song] = []
-    for s in items:
-        if library.search_song(s.song_id):
-            continue  # skip duplicates by song_id
-        library.add_song(s)
-        added.append(s)
-    rebuild_content()
-    return [s.__dict__ for s in added]
+def import_deezer(q: List[str] = Query(..., description="Deezer search query (repeat for several)"),
+                  limit: int = 5):
+    """Search every `q` concurrently (up to `limit` tracks each) and add the new
+    songs in one batch; songs already in the library are skipped."""
+    _require_content()
+    import deezer  # first use pulls in requests
+    try:
+        items = deezer.get_client().search_many(q, limit=limit)
+    except deezer.DeezerError as e:
+        raise HTTPException(status_code=502, detail=f"deezer: {e}")
+    added = library.add_songs(items)  # one log write for the batch
+    content_add_many(added)
+    if added:
+        _bump("library")
+    return [s.to_dict() for s in added]
 
 # ----------------------------------------------------------------------------
 # Events (implicit feedback)
 # ----------------------------------------------------------------------------
 @app.post("/events")
-def add_event(evt: EventIn):
+def add_event(evt: EventIn, user_id: str = DEFAULT_USER):
+    if evt.kind not in EVENT_KINDS:
+        return {"ok": False, "error": "unknown kind"}
     if library.search_song(evt.song_id) is None:
         return {"ok": False, "error": "unknown song_id"}
-    ev = interactions.get(evt.song_id, {"likes": 0, "plays": 0})
-    if evt.kind == "like":
-        ev["likes"] = int(ev.get("likes", 0)) + 1
-    elif evt.kind == "play":
-        ev["plays"] = int(ev.get("plays", 0)) + 1
-    elif evt.kind == "skip":
-        ev["plays"] = max(0, int(ev.get("plays", 0)) - 1)  # tiny negative signal
-    interactions[evt.song_id] = ev
-    _save_json(INTERACTIONS_PATH, interactions)
-    return {"ok": True, "interactions": interactions}
+    user = evt.user_id or user_id
+    interactions_store.add_events([(user, evt.song_id, evt.kind)])
+    metrics.inc("musiclib_events_total", kind=evt.kind)
+    if evt.kind in TRENDING_WEIGHTS:
+        trending.add(evt.song_id, TRENDING_WEIGHTS[evt.kind])
+    result_cache.bump("interactions")
+    likes, plays = interactions_store.get(user, evt.song_id)
+    return {"ok": True, "likes": likes, "plays": plays}
+
+
+EVENT_CHUNK = 10000  # NDJSON lines applied per chunk while the body streams in
+TRENDING_WEIGHTS = {"play": 1.0, "like": LIKE_WEIGHT}  # skips don't count towards trending
+
+
+def _ingest_events(rows: List[Dict[str, Any]], user_id: str, known: Dict[str, bool]) -> Tuple[int, int]:
+    """Validate + apply raw event dicts; returns (accepted, rejected).
+
+    `known` memoises song_id lookups across chunks of one request.
+    """
+    good = []
+    for row in rows:
+        try:
+            sid, kind = str(row["song_id"]), row["kind"]
+        except (KeyError, TypeError):
+            continue
+        if kind not in EVENT_KINDS:
+            continue
+        ok = known.get(sid)
+        if ok is None:
+            ok = known[sid] = library.search_song(sid) is not None
+        if ok:
+            good.append((row.get("user_id") or user_id, sid, kind))
+    if good:
+        interactions_store.add_events(good)
+        for kind, n in Counter(k for _, _, k in good).items():
+            metrics.inc("musiclib_events_total", n, kind=kind)
+        trending.add_many((sid, TRENDING_WEIGHTS[kind]) for _, sid, kind in good if kind in TRENDING_WEIGHTS)
+    return len(good), len(rows) - len(good)
+
+
+@app.post("/events/batch")
+async def add_events_batch(request: Request, user_id: str = DEFAULT_USER):
+    """Bulk implicit feedback.
+
+    Body is either a JSON array of {song_id, kind[, user_id]} or, with
+    Content-Type application/x-ndjson, one such object per line (applied in
+    chunks as the stream arrives). Invalid events are counted, not fatal.
+    Parsing and applying run in the threadpool: applying takes the library
+    lock and may flush/compact the interaction log, which mustn't stall the
+    event loop every other request on this worker shares.
+    """
+    accepted = rejected = 0
+    known: Dict[str, bool] = {}
+    if "ndjson" in request.headers.get("content-type", ""):
+        buf, rows = b"", []
+        async for chunk in request.stream():
+            buf += chunk
+            *lines, buf = buf.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    try:
+                        rows.append(json.loads(line))
+                    except ValueError:
+                        rejected += 1
+            if len(rows) >= EVENT_CHUNK:
+                a, r = await run_in_threadpool(_ingest_events, rows, user_id, known)
+                accepted, rejected, rows = accepted + a, rejected + r, []
+        if buf.strip():
+            try:
+                rows.append(json.loads(buf))
+            except ValueError:
+                rejected += 1
+        a, r = await run_in_threadpool(_ingest_events, rows, user_id, known)
+        accepted, rejected = accepted + a, rejected + r
+    else:
+        try:
+            rows = await run_in_threadpool(json.loads, await request.body())
+        except ValueError:
+            return {"ok": False, "error": "body must be a JSON array or NDJSON"}
+        if not isinstance(rows, list):
+            return {"ok": False, "error": "body must be a JSON array or NDJSON"}
+        accepted, rejected = await run_in_threadpool(_ingest_events, rows, user_id, known)
+    if accepted:
+        result_cache.bump("interactions")
+    return {"ok": True, "accepted": accepted, "rejected": rejected}
 
 # ----------------------------------------------------------------------------
 # Recommendations & Similar
 # ----------------------------------------------------------------------------
 @app.get("/recommendations", response_model=List[SongOut])
-def recommendations(k: int = 10, alpha: float = 0.6, beta: float = 0.3, gamma: float = 0.0):
+def recommendations(k: int = Query(10, ge=1, le=100), alpha: float = 0.6, beta: float = 0.3, gamma: float = 0.0,
+                    user_id: str = DEFAULT_USER):
     """
-    Returns top-k hybrid recommendations.
+    Returns top-k hybrid recommendations for user_id.
     hybrid uses content (alpha) + collaborative (beta) + optional popularity (gamma).
     """
-    recs = hybrid_recommend(k, alpha, beta, gamma)
-    return [s.__dict__ for s in recs]
+    return result_cache.get_or_compute(
+        "recommendations", (user_id, k, alpha, beta, gamma),
+        lambda: [s.to_dict() for s in hybrid_recommend(k, alpha, beta, gamma, user_id=user_id)],
+    )
 
 
 @app.get("/similar", response_model=List[SongOut])
-def similar(song_id: str, k: int = 10):
-    ids = content_similar_ids(song_id, k=k)
-    order = {sid: i for i, sid in enumerate(ids)}
-    songs = [s for s in library.bst.inorder() if s.song_id in order]
-    songs.sort(key=lambda s: order[s.song_id])
-    return [s.__dict__ for s in songs]
+def similar(song_id: str, k: int = Query(10, ge=1, le=100), nprobe: Optional[int] = Query(None, ge=1)):
+    """nprobe (optional) overrides MUSICLIB_ANN_NPROBE: higher = better recall, slower."""
+    def compute():
+        with span("similar.ids"):
+            ids = content_similar_ids(song_id, k=k, nprobe=nprobe)
+        with span("similar.songs"):
+            return [s.to_dict() for s in library.search_songs(ids)]
+    return result_cache.get_or_compute("similar", (song_id, k, nprobe), compute)
+
+
+@app.get("/trending", response_model=List[SongOut])
+def trending_songs(window: str = "24h", k: int = Query(10, ge=1, le=100)):
+    """
+    Top-k songs by time-decayed plays (+ LIKE_WEIGHT per like) over `window`
+    (1h | 24h | 7d). Served from the live top-k, no library scan; padded with
+    the best-ranked songs when too few have been played yet.
+    """
+    if window not in WINDOWS:
+        raise HTTPException(status_code=400, detail=f"window must be one of {', '.join(WINDOWS)}")
+    out = library.search_songs(sid for sid, _ in trending.top(window, k))
+    seen = {s.song_id for s in out}
+    if len(out) < k:
+        out += [s for s in library.get_top_ranked(k + len(seen)) if s.song_id not in seen][:k - len(out)]
+    return [s.to_dict() for s in out]
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    return result_cache.stats()
 
 # ----------------------------------------------------------------------------
 # Stats
 # ----------------------------------------------------------------------------
 @app.get("/stats")
 def stats():
-    songs = library.bst.inorder()
-    artists = {s.artist for s in songs}
-    total_plays = sum(int(s.plays or 0) for s in songs)
+    totals = library.stats()  # running aggregates, no library scan
     return {
-        "songs": len(songs),
-        "artists": len(artists),
-        "plays": total_plays,
-        "interacted": len(interactions),
-        "playlist": len(playlist),
+        "songs": totals["songs"],
+        "artists": totals["artists"],
+        "plays": totals["plays"],
+        "interacted": len(interactions_store.user_items(DEFAULT_USER)[0]),
+        "users": interactions_store.n_users,
+        "playlist": len(playlists),
     }
 
+
+@app.get("/ready")
+def ready():
+    """Readiness probe: 200 once the content model is loaded and served, 503 before."""
+    if not _content_ready.is_set():
+        raise HTTPException(status_code=503, detail=_content_error or "loading the content model")
+    return {"ready": True, "songs": len(content_model), "content_version": _content.version}
+
 # ----------------------------------------------------------------------------
 # Playlist endpoints (backend-managed)
 # ----------------------------------------------------------------------------
+def _playlist_songs(name: str):
+    """The playlist's songs in order: one O(log n) lookup per id, no library scan."""
+    for sid in playlists.ids(name):
+        s = library.search_song(sid)
+        if s is not None:
+            yield s
+
+
 @app.get("/playlist", response_model=List[SongOut])
-def get_playlist():
-    idset = set(playlist)
-    items = [s for s in library.bst.inorder() if s.song_id in idset]
-    # preserve playlist order
-    order = {sid: i for i, sid in enumerate(playlist)}
-    items.sort(key=lambda s: order.get(s.song_id, 1_000_000))
-    return [s.__dict__ for s in items]
+def get_playlist(name: str = DEFAULT_PLAYLIST):
+    return [s.to_dict() for s in _playlist_songs(name)]
 
 @app.post("/playlist/add")
 def playlist_add(item: PlaylistEdit):
     if library.search_song(item.song_id) is None:
         return {"ok": False, "error": "unknown song_id"}
-    if item.song_id not in playlist:
-        playlist.append(item.song_id)
-        _save_json(PLAYLIST_PATH, playlist)
-    return {"ok": True, "count": len(playlist)}
+    count = playlists.add(item.song_id, item.name or DEFAULT_PLAYLIST)
+    _announce("playlists")
+    return {"ok": True, "count": count}
 
 @app.post("/playlist/remove")
 def playlist_remove(item: PlaylistEdit):
-    if item.song_id in playlist:
-        playlist.remove(item.song_id)
-        _save_json(PLAYLIST_PATH, playlist)
-    return {"ok": True, "count": len(playlist)}
+    count = playlists.remove(item.song_id, item.name or DEFAULT_PLAYLIST)
+    _announce("playlists")
+    return {"ok": True, "count": count}
+
+@app.get("/playlists")
+def list_playlists():
+    return [{"name": name, "count": n} for name, n in playlists.counts().items()]
+
+@app.delete("/playlists/{name}")
+def delete_playlist(name: str):
+    if not playlists.drop(name):
+        raise HTTPException(status_code=404, detail=f"no playlist named {name!r}")
+    _announce("playlists")
+    return {"ok": True}
+
+# Export streams the playlist in chunks: memory stays flat however long it is
+EXPORT_CHUNK = 500
+EXPORT_COLUMNS = ["song_id", "title", "artist", "album", "genres", "duration", "plays", "rank", "bpm"]
+
+
+def _export_json(name: str):
+    yield "["
+    first, buf = True, []
+    for s in _playlist_songs(name):
+        buf.append(("" if first else ",") + json.dumps(s.to_dict(), ensure_ascii=False))
+        first = False
+        if len(buf) >= EXPORT_CHUNK:
+            yield "".join(buf)
+            buf = []
+    yield "".join(buf) + "]"
+
+
+def _export_csv(name: str):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(EXPORT_COLUMNS)  # genres joined by "|" (what catalog.songs_from_csv reads)
+    for n, s in enumerate(_playlist_songs(name), 1):
+        d = s.to_dict()
+        d["genres"] = "|".join(d["genres"])
+        writer.writerow(["" if d[c] is None else d[c] for c in EXPORT_COLUMNS])
+        if n % EXPORT_CHUNK == 0:
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+    yield out.getvalue()
+
+
+@app.get("/playlist/export")
+def export_playlist(name: str = DEFAULT_PLAYLIST, format: str = "json"):
+    if format not in ("json", "csv"):
+        raise HTTPException(status_code=400, detail="format must be json or csv")
+    if not playlists.exists(name):
+        raise HTTPException(status_code=404, detail=f"no playlist named {name!r}")
+    body, media = (_export_csv(name), "text/csv") if format == "csv" else (_export_json(name), "application/json")
+    filename = "".join(c if c.isalnum() or c in "-_" else "_" for c in name) or "playlist"
+    return StreamingResponse(body, media_type=f"{media}; charset=utf-8",
+                             headers={"Content-Disposition": f'attachment; filename="{filename}.{format}"'})
+
+# ----------------------------------------------------------------------------
+# Metrics (metrics.py): request latency + the stage spans above, and gauges
+# read at scrape time from counters the stores already keep
+# ----------------------------------------------------------------------------
+metrics.registry.describe("musiclib_request_seconds", "histogram", "Request latency by route")
+metrics.registry.describe("musiclib_responses_total", "counter", "Responses by route and status code")
+metrics.registry.describe("musiclib_events_total", "counter", "Feedback events accepted, by kind")
+metrics.gauge("musiclib_library_songs", lambda: library.stats()["songs"], "Songs in the library")
+metrics.gauge("musiclib_library_artists", lambda: library.stats()["artists"], "Distinct artists")
+metrics.gauge("musiclib_library_plays", lambda: library.stats()["plays"], "Total plays over all songs")
+metrics.gauge("musiclib_users", lambda: interactions_store.n_users, "Users with feedback")
+metrics.gauge("musiclib_playlists", lambda: len(playlists.names()), "Playlists")
+metrics.gauge("musiclib_content_rows", lambda: len(content_model), "Live rows in the content model")
+metrics.gauge("musiclib_content_version", lambda: _content.version, "Content snapshot version being served")
+metrics.gauge("musiclib_cache_entries", lambda: len(result_cache), "Cached /recommendations + /similar results")
+metrics.gauge("musiclib_cache_requests_total{result}",
+              lambda: {"hit": result_cache.hits, "miss": result_cache.misses},
+              "Result cache lookups", kind="counter")
+metrics.gauge("musiclib_cache_evictions_total{reason}",
+              lambda: {"expired": result_cache.evictions, "invalidated": result_cache.invalidations},
+              "Result cache entries dropped", kind="counter")
+metrics.gauge("musiclib_deezer_requests_total", lambda: _deezer_requests(),
+              "Deezer search pages fetched over the network", kind="counter")
+metrics.gauge("musiclib_mf_last_train_seconds",
+              lambda: mf_trainer.last_train_s if mf_trainer is not None else None, "Duration of the last ALS run")
+
+
+def _deezer_requests() -> int:
+    mod = sys.modules.get("deezer")  # not imported before the first /import-deezer
+    return mod._client.requests if mod is not None and mod._client is not None else 0
+
+
+def _route(request: Request) -> str:
+    # the route template ("/songs/{song_id}"), so ids don't become label values;
+    # requests no route matched (404s, or forwarded to the writer) share one
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or ("forwarded" if READER else "unmatched")
+
+
+@app.middleware("http")
+async def _measure(request: Request, call_next):
+    token = metrics.start_profile()
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = _route(request)
+        metrics.observe("musiclib_request_seconds", time.perf_counter() - t0, route=route, method=request.method)
+        metrics.inc("musiclib_responses_total", route=route, code=str(status))
+        if token is not None:
+            metrics.finish_profile(token, request.method, request.url.path, status)
+
+
+@app.get("/metrics")
+def metrics_text():
+    return Response(metrics.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# admin endpoints (the profiler) want this in an X-Admin-Token header; with no
+# token configured they only answer clients on the loopback interface
+ADMIN_TOKEN = os.environ.get("MUSICLIB_ADMIN_TOKEN", "")
+_LOOPBACK = ("127.0.0.1", "::1", "localhost")
+
+
+def _require_admin(request: Request) -> None:
+    if ADMIN_TOKEN:
+        if not hmac.compare_digest(request.headers.get("x-admin-token", ""), ADMIN_TOKEN):
+            raise HTTPException(status_code=403, detail="admin token required")
+    elif request.client is None or request.client.host not in _LOOPBACK:
+        raise HTTPException(status_code=403, detail="admin endpoints are local-only (set MUSICLIB_ADMIN_TOKEN)")
+
+
+@app.get("/metrics/profile", dependencies=[Depends(_require_admin)])
+def profile_recent(limit: int = Query(20, ge=1, le=metrics.PROFILE_KEEP)):
+    """The last `limit` sampled request breakdowns (newest first)."""
+    return {"rate": metrics.profile_rate(), "profiles": list(metrics.recent_profiles)[-limit:][::-1]}
+
 
+@app.post("/metrics/profile", dependencies=[Depends(_require_admin)])
+def profile_toggle(rate: float = Query(..., ge=0.0, le=1.0)):
+    """Profile this fraction of requests from now on (0 turns it off). Per process."""
+    metrics.set_profile_rate(rate)
+    return {"rate": metrics.profile_rate()}
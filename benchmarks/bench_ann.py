@@ -0,0 +1,74 @@
+# bench_ann.py — ANN indexes vs exact cosine search: recall@k and latency
+# Run from the repo root:
+#   python -m benchmarks.bench_ann --n 100000 --nprobe 1 2 4 8
+# recall counts a returned song as a hit when its exact similarity is at least
+# the true k-th best (metadata vectors have many exact ties).
+
+from __future__ import annotations
+import argparse
+import time
+
+import numpy as np
+
+from ann import IVFIndex, TermProbeIndex
+from content import ContentModel
+from benchmarks.synth import make_catalog
+
+
+def exact_kth(matrix, alive, i: int, k: int) -> float:
+    """Similarity of the true k-th nearest neighbour of row i."""
+    sims = np.asarray((matrix @ matrix[i].T).todense()).ravel()
+    sims[~alive] = -2
+    sims[i] = -1
+    return float(np.partition(sims, len(sims) - k)[len(sims) - k])
+
+
+def _pct(xs, q) -> float:
+    return float(np.percentile(np.asarray(xs) * 1000.0, q))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=100000)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--queries", type=int, default=300)
+    ap.add_argument("--dim", type=int, default=48)
+    ap.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    ap.add_argument("--index", choices=["terms", "ivf", "both"], default="both")
+    args = ap.parse_args()
+
+    songs = make_catalog(args.n)
+    model = ContentModel()
+    t0 = time.perf_counter()
+    model.fit((s.song_id, " ".join([s.title, s.artist] + s.genres)) for s in songs)
+    print(f"fit n={args.n}: {time.perf_counter() - t0:.2f}s")
+    X, alive = model.matrix, model.alive
+
+    queries = np.random.default_rng(1).choice(args.n, args.queries, replace=False)
+    kth, lat = {}, []
+    for i in queries:
+        t0 = time.perf_counter()
+        kth[i] = exact_kth(X, alive, i, args.k)
+        lat.append(time.perf_counter() - t0)
+    print(f"exact          p50={_pct(lat, 50):7.2f}ms p99={_pct(lat, 99):7.2f}ms recall@{args.k}=1.000")
+
+    kinds = ["terms", "ivf"] if args.index == "both" else [args.index]
+    for kind in kinds:
+        t0 = time.perf_counter()
+        index = IVFIndex(dim=args.dim) if kind == "ivf" else TermProbeIndex()
+        index.build(X, alive)
+        print(f"{kind} build: {time.perf_counter() - t0:.2f}s")
+        for nprobe in args.nprobe:
+            lat, hits = [], 0
+            for i in queries:
+                t0 = time.perf_counter()
+                _, sims = index.search(X, alive, i, args.k, nprobe=nprobe)
+                lat.append(time.perf_counter() - t0)
+                hits += int(np.sum(sims >= kth[i] - 1e-6))
+            recall = hits / (args.k * len(queries))
+            print(f"{kind:<5} nprobe={nprobe:<3} p50={_pct(lat, 50):7.2f}ms "
+                  f"p99={_pct(lat, 99):7.2f}ms recall@{args.k}={recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
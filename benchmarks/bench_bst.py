@@ -0,0 +1,117 @@
+# bench_bst.py — old recursive SongBST vs the balanced iterative one
+# Run from the repo root:
+#   python -m benchmarks.bench_bst --sizes 1000 10000 100000
+
+from __future__ import annotations
+import argparse
+import random
+import time
+
+from bst import SongBST
+from benchmarks.synth import make_catalog
+from song import Song
+
+
+class RecursiveSongBST:
+    """The original unbalanced, recursive tree (kept here only for comparison)."""
+
+    class _Node:
+        def __init__(self, key, song):
+            self.key = key
+            self.song = song
+            self.left = None
+            self.right = None
+
+    def __init__(self):
+        self.root = None
+
+    def insert(self, song):
+        def rec(node):
+            if node is None:
+                return self._Node(song.song_id, song)
+            if song.song_id < node.key:
+                node.left = rec(node.left)
+            elif song.song_id > node.key:
+                node.right = rec(node.right)
+            else:
+                node.song = song
+            return node
+        self.root = rec(self.root)
+
+    def find(self, key):
+        def rec(node):
+            if node is None:
+                return None
+            if key == node.key:
+                return node.song
+            return rec(node.left) if key < node.key else rec(node.right)
+        return rec(self.root)
+
+    def inorder(self):
+        out = []
+        def rec(node):
+            if node:
+                rec(node.left)
+                out.append(node.song)
+                rec(node.right)
+        rec(self.root)
+        return out
+
+
+def make_ids(n: int, order: str, seed: int = 0) -> list:
+    # Deezer-ish numeric ids, fixed width so string order == numeric order
+    ids = [str(100000000 + i) for i in range(n)]
+    if order == "random":
+        random.Random(seed).shuffle(ids)
+    return ids
+
+
+def _time(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def bench(tree_factory, ids, lookups) -> dict:
+    songs = [Song(sid, f"t{sid}", "a") for sid in ids]
+    tree = tree_factory()
+    try:
+        out = {"insert_s": _time(lambda: [tree.insert(s) for s in songs])}
+        out["find_s"] = _time(lambda: [tree.find(k) for k in lookups])
+        out["inorder_s"] = _time(tree.inorder)
+        if hasattr(tree, "delete"):
+            out["delete_s"] = _time(lambda: [tree.delete(k) for k in lookups])
+    except RecursionError:
+        return {"error": "RecursionError"}
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[500, 5000, 50000])
+    ap.add_argument("--lookups", type=int, default=2000)
+    args = ap.parse_args()
+
+    for n in args.sizes:
+        for order in ("sequential", "random"):
+            ids = make_ids(n, order)
+            lookups = random.Random(1).sample(ids, min(args.lookups, n))
+            for name, factory in (("recursive", RecursiveSongBST), ("avl", SongBST)):
+                res = bench(factory, ids, lookups)
+                cells = " ".join(f"{k}={v:.4f}" if isinstance(v, float) else f"{k}={v}"
+                                 for k, v in res.items())
+                print(f"n={n:<8} {order:<10} {name:<9} {cells}")
+        # bulk load (what SongLibrary.load_library uses now)
+        songs = [Song(sid, f"t{sid}", "a") for sid in make_ids(n, "sequential")]
+        tree = SongBST()
+        print(f"n={n:<8} {'sorted':<10} {'bulk_load':<9} load_s={_time(lambda: tree.bulk_load(songs)):.4f}")
+        # one 50-song page of /songs: secondary index vs the old inorder + sort
+        tree.bulk_load(make_catalog(n))
+        reps = 100
+        page = _time(lambda: [tree.page("title", 50) for _ in range(reps)]) / reps
+        full = _time(lambda: sorted(tree.inorder(), key=lambda s: s.title.casefold())[:50])
+        print(f"n={n:<8} {'page':<10} {'title':<9} index_s={page:.6f} inorder_sort_s={full:.6f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# bench_catalog.py — library snapshot formats: JSON vs the columnar catalog
+# Run from the repo root:
+#   python -m benchmarks.bench_catalog --n 1000000
+# Each load runs in a fresh subprocess so peak RSS is comparable (Linux).
+# "open" = Catalog() + 1000 random find()s (lazy rows, what /songs-style
+# lookups need); "full" = materialising every Song (what SongLibrary does to
+# build the BST and indexes).
+
+from __future__ import annotations
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synth import make_catalog
+from catalog import write_catalog
+
+LOADERS = {
+    "json": """
+import json
+from song import Song
+songs = [Song.from_dict(d) for d in json.load(open(PATH, encoding="utf-8"))]
+""",
+    "catalog open": """
+import random
+from catalog import Catalog
+cat = Catalog(PATH)
+ids = [str(100000000 + random.randrange(len(cat))) for _ in range(1000)]
+found = [cat.find(i) for i in ids]
+""",
+    "catalog full": """
+from catalog import Catalog
+songs = list(Catalog(PATH))
+""",
+}
+
+
+def run(loader: str, path: str):
+    # VmHWM (not ru_maxrss, which can carry over the forking parent's peak)
+    code = (f"import time\nPATH = {path!r}\nt0 = time.perf_counter()\n{loader}\n"
+            "secs = time.perf_counter() - t0\n"
+            "hwm = [l for l in open('/proc/self/status') if l.startswith('VmHWM')][0].split()[1]\n"
+            "print(secs, hwm)")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    secs, rss_kb = out.stdout.split()
+    return float(secs), int(rss_kb) / 1024
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=1000000)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="musiclib-bench-")
+    songs = make_catalog(args.n)
+    paths = {"json": os.path.join(tmp, "library.json"), "cat": os.path.join(tmp, "library.cat")}
+    with open(paths["json"], "w", encoding="utf-8") as f:
+        json.dump([s.to_dict() for s in songs], f, indent=4)
+    t0 = time.perf_counter()
+    write_catalog(paths["cat"], songs)
+    print(f"n={args.n} write catalog {time.perf_counter() - t0:.2f}s")
+    for name, path in paths.items():
+        print(f"  {name:<5s} {os.path.getsize(path) / 2 ** 20:8.1f} MiB")
+    del songs
+
+    for label, loader in LOADERS.items():
+        secs, rss = run(loader, paths["cat" if "catalog" in label else "json"])
+        print(f"{label:<13s} {secs:7.3f}s  peak RSS {rss:7.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# bench_deezer.py — Deezer import: old per-request path vs the pooled/concurrent/cached client
+# Runs against benchmarks/deezer_stub.py on a free local port, so no network needed:
+#   python -m benchmarks.bench_deezer --queries 8 --limit 150 --latency 0.05
+# "old" = one requests.get per page, sequentially, new connection each time,
+# then library.add_song per track; "new" = DeezerClient.search_many + add_songs.
+
+from __future__ import annotations
+import argparse
+import os
+import tempfile
+import time
+
+import requests
+
+from benchmarks.deezer_stub import start_stub
+from deezer import PAGE_SIZE, DeezerClient, track_to_song
+from library import SongLibrary
+
+
+def old_import(base: str, queries, limit: int, library: SongLibrary) -> int:
+    n = 0
+    for q in queries:
+        for index in range(0, limit, PAGE_SIZE):
+            r = requests.get(f"{base}/search", params={"q": q, "index": index,
+                                                        "limit": min(PAGE_SIZE, limit - index)}, timeout=10)
+            r.raise_for_status()
+            for row in r.json().get("data", []):
+                s = track_to_song(row)
+                if library.search_song(s.song_id) is None:
+                    library.add_song(s)
+                    n += 1
+    return n
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--queries", type=int, default=8)
+    ap.add_argument("--limit", type=int, default=150)
+    ap.add_argument("--latency", type=float, default=0.05)
+    args = ap.parse_args()
+
+    server = start_stub(latency=args.latency)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    queries = [f"query{i}" for i in range(args.queries)]
+    tmp = tempfile.mkdtemp(prefix="musiclib-bench-")
+
+    lib = SongLibrary(os.path.join(tmp, "old.json"))
+    t0 = time.perf_counter()
+    n = old_import(base, queries, args.limit, lib)
+    print(f"old  {time.perf_counter() - t0:7.3f}s  {n} songs")
+
+    client = DeezerClient(base=base)
+    for label in ("new", "new (cached)"):
+        lib = SongLibrary(os.path.join(tmp, f"{label[:3]}-{time.time_ns()}.json"))
+        before = client.requests
+        t0 = time.perf_counter()
+        added = lib.add_songs(client.search_many(queries, args.limit))
+        print(f"{label:<13s}{time.perf_counter() - t0:7.3f}s  {len(added)} songs, "
+              f"{client.requests - before} requests")
+    client.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# bench_events.py — event ingestion throughput: store.add_events and /events/batch
+# Run from the repo root:
+#   python -m benchmarks.bench_events --events 200000 --batch 5000
+# Uses a throwaway data dir; the HTTP part goes through FastAPI's TestClient
+# (in-process, so it measures parsing + validation + apply, not the network).
+
+from __future__ import annotations
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=200000)
+    ap.add_argument("--batch", type=int, default=5000)
+    ap.add_argument("--songs", type=int, default=5000)
+    ap.add_argument("--users", type=int, default=10000)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="musiclib-bench-")
+    os.environ["MUSICLIB_DATA"] = tmp
+    os.environ.setdefault("MUSICLIB_MF_FACTORS", "0")
+    from fastapi.testclient import TestClient
+    import api
+    from benchmarks.synth import make_catalog
+    from interactions import InteractionStore
+
+    rng = np.random.default_rng(0)
+    songs = make_catalog(args.songs)
+    users = [f"u{i}" for i in rng.integers(0, args.users, args.events)]
+    items = [songs[i].song_id for i in rng.integers(0, args.songs, args.events)]
+    kinds = [("play", "play", "play", "like", "skip")[i] for i in rng.integers(0, 5, args.events)]
+    events = list(zip(users, items, kinds))
+
+    store = InteractionStore(os.path.join(tmp, "bench.npz"))
+    t0 = time.perf_counter()
+    for s in range(0, len(events), args.batch):
+        store.add_events(events[s:s + args.batch])
+    store.flush()
+    dt = time.perf_counter() - t0
+    print(f"store.add_events  {len(events) / dt:10,.0f} events/s")
+
+    with TestClient(api.app) as c:
+        for s in songs:
+            api.library.add_song(s)
+        rows = [{"song_id": i, "kind": k, "user_id": u} for u, i, k in events]
+        for label, body, ctype in (
+            ("/events/batch json", lambda b: json.dumps(b), "application/json"),
+            ("/events/batch ndjson", lambda b: "\n".join(json.dumps(r) for r in b), "application/x-ndjson"),
+        ):
+            t0 = time.perf_counter()
+            for s in range(0, len(rows), args.batch):
+                r = c.post("/events/batch", content=body(rows[s:s + args.batch]),
+                           headers={"content-type": ctype})
+                assert r.json()["accepted"] == len(rows[s:s + args.batch]), r.text
+            dt = time.perf_counter() - t0
+            print(f"{label:<21s} {len(rows) / dt:10,.0f} events/s")
+
+        t0 = time.perf_counter()
+        n = min(2000, len(rows))
+        for row in rows[:n]:
+            c.post(f"/events?user_id={row['user_id']}", json={"song_id": row["song_id"], "kind": row["kind"]})
+        dt = time.perf_counter() - t0
+        print(f"/events (one by one)  {n / dt:10,.0f} events/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# bench_http.py — HTTP load test of the API, in one process
+# Run from the repo root:
+#   python -m benchmarks.bench_http --songs 20000 --clients 8 --duration 20 --out http.json
+# Seeds a throwaway data dir, starts the app under uvicorn on a loopback port
+# in a background thread, waits for the startup work (content model load,
+# search index, similar table, first MF model) to settle, then runs `--clients`
+# closed-loop client threads against a weighted endpoint mix for `--duration`
+# seconds. Reports
+# p50/p95/p99 latency and throughput per endpoint and overall, errors, and the
+# process's peak RSS as JSON (compare runs with benchmarks/compare.py).
+# Clients and server share one interpreter (and its GIL), so absolute
+# throughput is lower than a separate load generator would see; it's meant for
+# comparing commits, not for capacity planning. --no-cache turns the result
+# cache off to measure the scoring paths instead of cache hits.
+
+from __future__ import annotations
+from typing import Callable, Dict, List, Tuple
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+import requests
+
+from benchmarks.report import dump, environment, free_port, peak_rss_mb, stats_ms
+from benchmarks.synth import seed_data_dir
+
+DEFAULT_MIX = "songs=2,search=2,recommendations=3,similar=3,trending=1,stats=1,events=1"
+
+
+def make_requests(songs: List, user_ids: List[str]) -> Dict[str, Callable[[random.Random], Tuple]]:
+    """Endpoint name → fn(rng) giving (method, path, params, json body)."""
+    sorts = ("id", "title", "plays_desc", "rank_desc")
+    song_ids = [s.song_id for s in songs]
+
+    def typed(r: random.Random) -> str:
+        # what someone is typing: a word or two of a real title/artist, the last one cut short
+        words = r.choice(songs).title.split()[:2] or ["a"]
+        return " ".join(words[:-1] + [words[-1][:max(2, len(words[-1]) - r.randint(0, 2))]])
+
+    return {
+        "songs": lambda r: ("GET", "/songs", {"limit": 50, "sort": r.choice(sorts)}, None),
+        "search": lambda r: ("GET", "/search", {"q": typed(r), "k": 20}, None),
+        "recommendations": lambda r: ("GET", "/recommendations", {"user_id": r.choice(user_ids), "k": 10}, None),
+        "similar": lambda r: ("GET", "/similar", {"song_id": r.choice(song_ids), "k": 10}, None),
+        "trending": lambda r: ("GET", "/trending", {"window": r.choice(("1h", "24h", "7d")), "k": 10}, None),
+        "stats": lambda r: ("GET", "/stats", None, None),
+        "events": lambda r: ("POST", "/events", {"user_id": r.choice(user_ids)},
+                             {"song_id": r.choice(song_ids), "kind": r.choice(("play", "play", "like", "skip"))}),
+    }
+
+
+def settle(api, timeout: float) -> None:
+    """Wait for the background work kicked off at startup, so it doesn't skew the run."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        busy = not api._content_ready.is_set() or api.library._search is None
+        busy = busy or (api.similar_table is not None and api.similar_table._building)
+        busy = busy or (api.mf_trainer is not None and api.mf_trainer.model is None
+                        and api.interactions_store.n_users > 0)
+        if not busy:
+            return
+        time.sleep(0.2)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--songs", type=int, default=20000)
+    ap.add_argument("--users", type=int, default=2000)
+    ap.add_argument("--events", type=int, default=100000, help="interactions seeded before the run")
+    ap.add_argument("--clients", type=int, default=8)
+    ap.add_argument("--duration", type=float, default=20.0)
+    ap.add_argument("--warmup", type=float, default=2.0)
+    ap.add_argument("--mix", default=DEFAULT_MIX, help="endpoint=weight,... (default: %(default)s)")
+    ap.add_argument("--no-cache", action="store_true")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", help="write the JSON report here (default: stdout)")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="musiclib-bench-")
+    songs, _ = seed_data_dir(tmp, args.songs, args.users, args.events, args.seed)
+    os.environ["MUSICLIB_DATA"] = tmp
+    if args.no_cache:
+        os.environ["MUSICLIB_CACHE_SIZE"] = "0"
+    import uvicorn
+    import api
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(api.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    settle(api, timeout=600)
+
+    base = f"http://127.0.0.1:{port}"
+    makers = make_requests(songs, api.interactions_store.users or ["default"])
+    mix = [(name, float(w)) for name, w in (part.split("=") for part in args.mix.split(","))]
+    unknown = [name for name, _ in mix if name not in makers]
+    if unknown:
+        raise SystemExit(f"unknown endpoints in --mix: {', '.join(unknown)}")
+    names, weights = [m[0] for m in mix], [m[1] for m in mix]
+
+    samples: Dict[str, List[float]] = {name: [] for name in names}
+    errors: Dict[str, int] = {name: 0 for name in names}
+    lock = threading.Lock()
+    t_start = time.monotonic() + args.warmup
+    t_stop = t_start + args.duration
+
+    def client(n: int) -> None:
+        rng = random.Random(args.seed * 1000 + n)
+        session = requests.Session()
+        mine: List[Tuple[str, float, bool]] = []
+        while True:
+            name = rng.choices(names, weights)[0]
+            method, path, params, body = makers[name](rng)
+            t0 = time.monotonic()
+            if t0 >= t_stop:
+                break
+            try:
+                ok = session.request(method, base + path, params=params, json=body, timeout=60).ok
+            except requests.RequestException:
+                ok = False
+            if t0 >= t_start:  # warm-up requests aren't counted
+                mine.append((name, time.monotonic() - t0, ok))
+        with lock:
+            for name, secs, ok in mine:
+                samples[name].append(secs)
+                errors[name] += not ok
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(args.clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    server.should_exit = True
+
+    total = sum(len(v) for v in samples.values())
+    endpoints = {}
+    for name in names:
+        endpoints[name] = stats_ms(samples[name])
+        endpoints[name]["requests_per_s"] = len(samples[name]) / args.duration
+        endpoints[name]["errors"] = errors[name]
+    dump({
+        "suite": "http",
+        "env": environment(),
+        "config": {"songs": args.songs, "users": args.users, "events": args.events, "clients": args.clients,
+                   "duration_s": args.duration, "mix": args.mix, "cache": not args.no_cache},
+        "overall": dict(stats_ms(s for v in samples.values() for s in v),
+                        requests_per_s=total / args.duration, errors=sum(errors.values())),
+        "endpoints": endpoints,
+        "peak_rss_mb": peak_rss_mb(),
+    }, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# bench_memory.py — bytes per song: dict-backed Song/BSTNode vs __slots__
+# Run from the repo root:
+#   python -m benchmarks.bench_memory --sizes 100000 1000000
+# Every variant is built from the same freshly json.loads()-ed rows (the way
+# load_library reads library.json) and measured with tracemalloc, so the
+# strings each representation keeps alive are counted too. Secondary indexes
+# are left out: they're the same for both Song classes.
+
+from __future__ import annotations
+import argparse
+import gc
+import json
+import tracemalloc
+
+from benchmarks.synth import make_catalog
+from bst import BSTNode
+from song import Song
+
+
+class DictSong:
+    """song.Song as it was before __slots__ (kept here only for comparison)."""
+
+    def __init__(self, song_id, title, artist, album="", genres=None, duration=0,
+                 plays=0, rank=0, bpm=None):
+        self.song_id = str(song_id)
+        self.title = title or ""
+        self.artist = artist or ""
+        self.album = album or ""
+        self.genres = list(genres) if genres is not None else []
+        self.duration = int(duration)
+        self.plays = int(plays)
+        self.rank = int(rank)
+        self.bpm = int(bpm) if bpm is not None and bpm != "" else None
+
+
+class DictNode:
+    def __init__(self, key, song):
+        self.key = str(key)
+        self.song = song
+        self.left = None
+        self.right = None
+        self.height = 1
+
+
+def legacy(rows):
+    return [DictNode(d["song_id"], DictSong(**d)) for d in rows]
+
+
+def slots(rows):
+    return [BSTNode(d["song_id"], Song(**d)) for d in rows]
+
+
+def measure(build, payload: str, n: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    rows = json.loads(payload)
+    built = build(rows)
+    del rows
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del built
+    # rows were freed, so `used` is what the structure alone keeps alive
+    return used / n
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000])
+    args = ap.parse_args()
+    print(f"{'n':>9s} {'dict Song+node':>15s} {'slots Song+node':>16s}   (bytes/song)")
+    for n in args.sizes:
+        payload = json.dumps([s.to_dict() for s in make_catalog(n)])
+        old, new = (measure(fn, payload, n) for fn in (legacy, slots))
+        print(f"{n:9d} {old:15.0f} {new:16.0f}   ({old / new:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# bench_mf.py — implicit ALS: training throughput and recall@k on a held-out split
+# Run from the repo root:
+#   python -m benchmarks.bench_mf --users 20000 --items 20000 --factors 32 64
+# 20% of each user's items are held out; recall@k = held-out items found in the
+# top-k (training items excluded) / min(k, held-out), averaged over users.
+# A popularity ranking is printed as the baseline to beat.
+
+from __future__ import annotations
+import argparse
+import time
+
+import numpy as np
+from scipy import sparse
+
+from mf import MFModel, train_als
+from recommender import top_k_indices
+from benchmarks.synth import make_interactions
+
+
+def split(R: sparse.csr_matrix, frac: float, rng):
+    """Hold out `frac` of each user's items (users with >= 5 items)."""
+    R = R.tocoo()
+    held = rng.random(R.nnz) < frac
+    counts = np.bincount(R.row, minlength=R.shape[0])
+    held &= counts[R.row] >= 5
+    train = sparse.csr_matrix((R.data[~held], (R.row[~held], R.col[~held])), shape=R.shape)
+    test = sparse.csr_matrix((R.data[held], (R.row[held], R.col[held])), shape=R.shape)
+    return train, test
+
+
+def recall_at_k(score_fn, train: sparse.csr_matrix, test: sparse.csr_matrix, k: int, users) -> float:
+    hits = []
+    for u in users:
+        truth = test.indices[test.indptr[u]:test.indptr[u + 1]]
+        if len(truth) == 0:
+            continue
+        scores = score_fn(u).astype(np.float32, copy=True)
+        scores[train.indices[train.indptr[u]:train.indptr[u + 1]]] = -np.inf
+        top = top_k_indices(scores, k)
+        hits.append(len(np.intersect1d(top, truth)) / min(k, len(truth)))
+    return float(np.mean(hits)) if hits else 0.0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=20000)
+    ap.add_argument("--items", type=int, default=20000)
+    ap.add_argument("--per-user", type=int, default=30)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--factors", type=int, nargs="+", default=[32, 64])
+    ap.add_argument("--iters", type=int, default=10)
+    ap.add_argument("--alpha", type=float, default=10.0)
+    ap.add_argument("--reg", type=float, default=0.1)
+    ap.add_argument("--eval-users", type=int, default=2000)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    u, i, c = make_interactions(args.users, args.items, args.per_user)
+    R = sparse.csr_matrix((c.astype(np.float32), (u, i)), shape=(args.users, args.items))
+    R.sum_duplicates()
+    train, test = split(R, 0.2, rng)
+    print(f"users={args.users} items={args.items} train nnz={train.nnz} test nnz={test.nnz}")
+    users = rng.choice(args.users, min(args.eval_users, args.users), replace=False)
+
+    pop = np.asarray((train > 0).sum(axis=0)).ravel().astype(np.float32)
+    print(f"popularity       recall@{args.k}={recall_at_k(lambda _: pop, train, test, args.k, users):.3f}")
+
+    for f in args.factors:
+        t0 = time.perf_counter()
+        X, Y = train_als(train, factors=f, iters=args.iters, reg=args.reg, alpha=args.alpha)
+        dt = time.perf_counter() - t0
+        rate = train.nnz * args.iters / dt
+        r = recall_at_k(lambda uu: Y @ X[uu], train, test, args.k, users)
+        print(f"als f={f:<4d}       recall@{args.k}={r:.3f}  train {dt:6.2f}s  ({rate / 1e6:.2f}M nnz·iter/s)")
+
+        # fold-in (what the API does for users' newest events) should match the trained vectors
+        model = MFModel([], [], X, Y, reg=args.reg, alpha=args.alpha)
+        t0 = time.perf_counter()
+        for uu in users[:500]:
+            row = train[uu]
+            model.fold_in(row.indices, row.data)
+        per = (time.perf_counter() - t0) / min(500, len(users)) * 1000
+        r_fold = recall_at_k(lambda uu: model.scores(model.fold_in(train[uu].indices, train[uu].data)),
+                             train, test, args.k, users[:500])
+        print(f"  fold-in        recall@{args.k}={r_fold:.3f}  {per:.3f}ms/user")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# bench_similar.py — /similar from the precomputed SimilarTable vs exact scoring
+# Run from the repo root:
+#   python -m benchmarks.bench_similar --n 20000 --workers 4
+# Reports the table build time, per-lookup latency of both paths, and the cost
+# of patching newly added songs into the table.
+
+from __future__ import annotations
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.synth import make_catalog
+from content import ContentModel
+from neighbours import SimilarTable
+from recommender import top_k_indices
+
+
+def text(s) -> str:
+    return " ".join([s.title, s.artist, *s.genres])
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=20000)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--workers", type=int, default=0)
+    ap.add_argument("--queries", type=int, default=1000)
+    ap.add_argument("--adds", type=int, default=200)
+    args = ap.parse_args()
+
+    songs = make_catalog(args.n + args.adds)
+    model = ContentModel(drift=1.0)  # no IDF refresh mid-benchmark
+    model.fit((s.song_id, text(s), 0.0) for s in songs[:args.n])
+    table = SimilarTable(os.path.join(tempfile.mkdtemp(prefix="musiclib-bench-"), "similar"),
+                         workers=args.workers)
+    t0 = time.perf_counter()
+    table.build(model)
+    print(f"n={args.n} build top-{table.k} table: {time.perf_counter() - t0:.1f}s "
+          f"({table.workers} worker{'s' * (table.workers > 1)})")
+
+    M, alive = model.matrix, model.alive
+    seeds = np.random.default_rng(0).integers(0, args.n, args.queries)
+    t0 = time.perf_counter()
+    for i in seeds:
+        sims = (M @ M[i].T).toarray().ravel()
+        sims[i] = -1
+        top_k_indices(sims, args.k)
+    exact = (time.perf_counter() - t0) / len(seeds)
+    t0 = time.perf_counter()
+    for i in seeds:
+        table.lookup(int(i), args.k, alive, model.epoch)
+    lookup = (time.perf_counter() - t0) / len(seeds)
+    print(f"exact   {exact * 1e3:8.3f} ms/query")
+    print(f"table   {lookup * 1e3:8.3f} ms/query  ({exact / lookup:.0f}x)")
+
+    for s in songs[args.n:]:
+        model.add(s.song_id, text(s))
+    t0 = time.perf_counter()
+    table.patch(model)
+    print(f"patch   {(time.perf_counter() - t0) / args.adds * 1e3:8.3f} ms/added song")
+
+
+if __name__ == "__main__":
+    main()
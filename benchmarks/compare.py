@@ -0,0 +1,73 @@
+# compare.py — diff two benchmark reports (suite.py / bench_http.py JSON)
+# Run from the repo root:
+#   python -m benchmarks.compare base.json new.json --threshold 0.15
+# Every numeric metric present in both reports is compared; "_ms"/"_mb" keys
+# are lower-is-better, "_per_s" keys higher-is-better (see report.py), other
+# numbers (counts, config) are ignored. Prints the metrics that moved by more
+# than the threshold and exits 1 if any of them got worse, so it can gate CI.
+
+from __future__ import annotations
+from typing import Any, Iterator, Tuple
+import argparse
+import json
+import sys
+
+LOWER = ("_ms", "_mb")
+HIGHER = ("_per_s",)
+
+
+def metrics(report: Any, prefix: str = "") -> Iterator[Tuple[str, str, float]]:
+    """(dotted path, direction, value) for every comparable number in a report."""
+    if isinstance(report, dict):
+        for key, value in report.items():
+            if key == "env":
+                continue  # metadata, not results
+            path = f"{prefix}{key}"
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                if key.endswith(LOWER):
+                    yield path, "lower", float(value)
+                elif key.endswith(HIGHER):
+                    yield path, "higher", float(value)
+            else:
+                yield from metrics(value, path + ".")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("base")
+    ap.add_argument("new")
+    ap.add_argument("--threshold", type=float, default=0.10, help="relative change to report (default 10%%)")
+    ap.add_argument("--all", action="store_true", help="print every metric, not only the ones that moved")
+    args = ap.parse_args()
+
+    with open(args.base, encoding="utf-8") as f:
+        base = dict((path, (d, v)) for path, d, v in metrics(json.load(f)))
+    with open(args.new, encoding="utf-8") as f:
+        new = dict((path, (d, v)) for path, d, v in metrics(json.load(f)))
+
+    worse = better = 0
+    rows = []
+    for path, (direction, value) in new.items():
+        if path not in base:
+            continue
+        old = base[path][1]
+        change = (value - old) / old if old else 0.0
+        regressed = change > args.threshold if direction == "lower" else change < -args.threshold
+        improved = change < -args.threshold if direction == "lower" else change > args.threshold
+        worse += regressed
+        better += improved
+        if regressed or improved or args.all:
+            mark = "WORSE" if regressed else "better" if improved else ""
+            rows.append(f"{path:<48s} {old:12.3f} {value:12.3f} {change:+8.1%}  {mark}")
+    if rows:
+        print(f"{'metric':<48s} {'base':>12s} {'new':>12s} {'change':>8s}")
+        print("\n".join(rows))
+    missing = sorted(set(base) - set(new))
+    if missing:
+        print(f"{len(missing)} metric(s) only in {args.base}: {', '.join(missing[:5])}{' ...' if len(missing) > 5 else ''}")
+    print(f"{worse} worse, {better} better (threshold {args.threshold:.0%}, {len(set(base) & set(new))} compared)")
+    sys.exit(1 if worse else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# deezer_stub.py — local stand-in for api.deezer.com's /search
+# Deterministic fake tracks per query (ids derived from the query + position),
+# honours `index`/`limit` paging and can add artificial latency.
+#   python -m benchmarks.deezer_stub --port 8765 --latency 0.05
+#   DEEZER_BASE=http://127.0.0.1:8765 uvicorn api:app
+# Importable too: start_stub() runs it on a background thread.
+
+from __future__ import annotations
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import argparse
+import hashlib
+import json
+import threading
+import time
+
+TOTAL = 300  # results per query
+
+
+def fake_track(query: str, pos: int) -> dict:
+    h = int(hashlib.md5(f"{query}:{pos}".encode()).hexdigest()[:10], 16)
+    return {
+        "id": 10 ** 9 + h % 10 ** 9,
+        "title": f"{query} track {pos}",
+        "artist": {"name": f"{query} artist {pos % 7}"},
+        "album": {"title": f"{query} album {pos % 3}"},
+        "duration": 120 + h % 240,
+        "rank": h % 1000000,
+    }
+
+
+def make_handler(latency: float):
+    class Handler(BaseHTTPRequestHandler):
+        calls = 0
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != "/search":
+                self.send_error(404)
+                return
+            Handler.calls += 1
+            params = parse_qs(url.query)
+            q = params.get("q", [""])[0]
+            index = int(params.get("index", ["0"])[0])
+            limit = min(int(params.get("limit", ["25"])[0]), 100)
+            if latency:
+                time.sleep(latency)
+            rows = [fake_track(q, i) for i in range(index, min(index + limit, TOTAL))]
+            body = json.dumps({"data": rows, "total": TOTAL}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):  # quiet
+            pass
+
+    return Handler
+
+
+def start_stub(port: int = 0, latency: float = 0.0) -> ThreadingHTTPServer:
+    """Serve on 127.0.0.1:port (0 = any free port) in a daemon thread."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(latency))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.05)
+    args = ap.parse_args()
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args.latency))
+    print(f"deezer stub on http://127.0.0.1:{args.port} (latency {args.latency}s)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
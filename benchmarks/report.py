@@ -0,0 +1,110 @@
+# report.py — shared bits of the benchmark suite: timing stats, peak RSS, run metadata
+# Results are plain JSON so runs can be kept and diffed (benchmarks/compare.py).
+# Conventions compare.py relies on: keys ending in "_ms" or "_mb" are lower-is-
+# better, keys ending in "_per_s" higher-is-better.
+
+from __future__ import annotations
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+
+def stats_ms(samples_s: Iterable[float]) -> Dict[str, float]:
+    """Latency summary of per-call timings given in seconds."""
+    ms = np.asarray(list(samples_s), dtype=np.float64) * 1000.0
+    if not len(ms):
+        return {"n": 0}
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"n": int(len(ms)), "mean_ms": float(ms.mean()), "p50_ms": float(p50),
+            "p95_ms": float(p95), "p99_ms": float(p99), "max_ms": float(ms.max())}
+
+
+def time_calls(fn: Callable[..., Any], args: Iterable[tuple]) -> Dict[str, float]:
+    """Call fn(*a) for every a in args; latency summary plus calls per second."""
+    samples: List[float] = []
+    clock = time.perf_counter
+    start = clock()
+    for a in args:
+        t0 = clock()
+        fn(*a)
+        samples.append(clock() - t0)
+    out = stats_ms(samples)
+    out["calls_per_s"] = len(samples) / max(clock() - start, 1e-12)
+    return out
+
+
+def best_of(samples_s: List[float]) -> Dict[str, float]:
+    """Best-of / median summary of a few timings of a bulk operation (seconds)."""
+    ms = sorted(s * 1000.0 for s in samples_s)
+    return {"n": len(ms), "min_ms": ms[0], "p50_ms": ms[len(ms) // 2]}
+
+
+def time_once(fn: Callable[[], Any], repeat: int = 3) -> Dict[str, float]:
+    """Best-of / median of `repeat` runs of a bulk operation."""
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return best_of(samples)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process (VmHWM on Linux, ru_maxrss elsewhere)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024  # bytes on macOS, KiB on Linux
+
+
+def environment() -> Dict[str, Any]:
+    """What the numbers were measured on: commit, interpreter, libraries, machine."""
+    import scipy
+    import sklearn
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit or None,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "sklearn": sklearn.__version__,
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def dump(result: Dict[str, Any], path: Optional[str]) -> None:
+    """Write the result as JSON to `path`, or to stdout when no path is given."""
+    text = json.dumps(result, indent=2, sort_keys=False)
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"wrote {path}", file=sys.stderr)
+    else:
+        print(text)
@@ -0,0 +1,151 @@
+# suite.py — micro-benchmarks of the hot paths, one JSON report per run
+# Run from the repo root:
+#   python -m benchmarks.suite --sizes 10000 100000 --out bench.json
+#   python -m benchmarks.compare old.json bench.json
+# Each catalog size runs in a fresh subprocess (clean module state, and a peak
+# RSS that belongs to that size alone) on a seeded synthetic data dir:
+#   bst.*           SongBST insert (shuffled ids) / find / delete / inorder
+#   library.*       SongLibrary load of library.json, save_library
+#   startup.*       `import api` in a fresh interpreter; server spawn → /ready 200
+#                   on the first boot (fits + saves the content model) and on
+#                   later boots (loads it); MF training is off for these so a
+#                   background ALS run doesn't compete with the load
+#   content.*       api.rebuild_content; content_similar_ids through the
+#                   precomputed table and through scoring (ANN/exact)
+#   cf / hybrid     api.cf_item_scores, api.hybrid_recommend for sampled users
+#                   (after a synchronous MF training run, also reported)
+
+from __future__ import annotations
+from typing import Any, Dict
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.report import best_of, dump, environment, free_port, peak_rss_mb, time_calls, time_once
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def boot_s(data_dir: str, timeout: float = 600.0) -> float:
+    """Seconds from spawning a server on data_dir until /ready answers 200."""
+    import requests
+
+    port = free_port()
+    env = dict(os.environ, MUSICLIB_DATA=data_dir, MUSICLIB_MF_FACTORS="0")
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "api:app", "--port", str(port),
+                             "--log-level", "warning"], cwd=ROOT, env=env)
+    try:
+        while time.perf_counter() - t0 < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"server exited with code {proc.returncode}")
+            try:
+                if requests.get(f"http://127.0.0.1:{port}/ready", timeout=1).ok:
+                    return time.perf_counter() - t0
+            except requests.RequestException:
+                pass
+            time.sleep(0.01)
+        raise RuntimeError(f"not ready after {timeout:.0f}s")
+    finally:
+        proc.terminate()  # shutdown saves whatever changed
+        proc.wait()
+
+
+def run_size(n: int, users: int, events: int, queries: int, seed: int) -> Dict[str, Any]:
+    """Every benchmark for one catalog size (call in a fresh process: imports api)."""
+    from benchmarks.synth import seed_data_dir
+    from bst import SongBST
+
+    tmp = tempfile.mkdtemp(prefix="musiclib-bench-")
+    songs, _ = seed_data_dir(tmp, n, users, events, seed)
+    rng = random.Random(seed)
+    ids = [s.song_id for s in songs]
+    probe = [(rng.choice(ids),) for _ in range(queries)]
+    out: Dict[str, Any] = {"songs": n, "users": users, "events": events}
+
+    # ---- SongBST ------------------------------------------------------------
+    order = songs[:]
+    rng.shuffle(order)
+    tree = SongBST()
+    out["bst.insert"] = time_calls(tree.insert, ((s,) for s in order))
+    out["bst.find"] = time_calls(tree.find, probe)
+    out["bst.inorder"] = time_once(tree.inorder)
+    victims = rng.sample(ids, min(queries, n // 10 or 1))
+    out["bst.delete"] = time_calls(tree.delete, ((sid,) for sid in victims))
+    del tree
+
+    # ---- SongLibrary persistence ----------------------------------------------
+    from library import SongLibrary
+
+    lib_path = os.path.join(tmp, "library.json")
+    out["library.load"] = time_once(lambda: SongLibrary(lib_path))
+    lib = SongLibrary(lib_path)
+    out["library.save"] = time_once(lib.save_library)
+    del lib
+
+    # ---- cold start -------------------------------------------------------------
+    env = dict(os.environ, MUSICLIB_DATA=tmp)
+    out["startup.import"] = time_once(lambda: subprocess.run([sys.executable, "-c", "import api"],
+                                                             cwd=ROOT, env=env, check=True))
+    out["startup.first_boot"] = best_of([boot_s(tmp)])
+    out["startup.warm_boot"] = best_of([boot_s(tmp) for _ in range(3)])
+
+    # ---- API scoring paths ------------------------------------------------------
+    os.environ["MUSICLIB_DATA"] = tmp
+    os.environ.setdefault("MUSICLIB_IDF_REFRESH_S", "0")
+    import api
+
+    out["content.rebuild"] = time_once(api.rebuild_content, repeat=1)
+    table = api.similar_table
+    deadline = time.monotonic() + 600
+    while table is not None and table._building and time.monotonic() < deadline:
+        time.sleep(0.1)  # the table is built in the background after a rebuild
+    out["content.similar.table"] = time_calls(api.content_similar_ids, probe)
+    api.similar_table = None
+    out["content.similar.scored"] = time_calls(api.content_similar_ids, probe)
+    api.similar_table = table
+
+    user_ids = api.interactions_store.users
+    sample = [(rng.choice(user_ids),) for _ in range(min(queries, 200))] if user_ids else []
+    if api.mf_trainer is not None and user_ids:
+        out["mf.train"] = time_once(api.mf_trainer.train, repeat=1)
+    out["cf_item_scores"] = time_calls(api.cf_item_scores, sample)
+    out["hybrid_recommend"] = time_calls(lambda u: api.hybrid_recommend(10, 0.6, 0.3, 0.1, user_id=u), sample)
+    out["peak_rss_mb"] = peak_rss_mb()
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    ap.add_argument("--users", type=int, default=2000)
+    ap.add_argument("--events", type=int, default=100000)
+    ap.add_argument("--queries", type=int, default=1000, help="calls per lookup benchmark")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", help="write the JSON report here (default: stdout)")
+    ap.add_argument("--child", type=int, help=argparse.SUPPRESS)  # internal: run one size, print JSON
+    args = ap.parse_args()
+
+    if args.child:
+        print(json.dumps(run_size(args.child, args.users, args.events, args.queries, args.seed)))
+        return
+    runs = {}
+    for n in args.sizes:
+        print(f"n={n} ...", file=sys.stderr)
+        cmd = [sys.executable, "-m", "benchmarks.suite", "--child", str(n), "--users", str(args.users),
+               "--events", str(args.events), "--queries", str(args.queries), "--seed", str(args.seed)]
+        proc = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+        if proc.returncode:
+            sys.stderr.write(proc.stderr)
+            raise SystemExit(f"benchmark for n={n} failed")
+        runs[str(n)] = json.loads(proc.stdout.strip().splitlines()[-1])
+    dump({"suite": "micro", "env": environment(), "runs": runs}, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# synth.py — seeded synthetic catalogs, interactions and event streams for the benchmarks
+# Everything is a pure function of its arguments and `seed`, so two runs (or two
+# commits) benchmark exactly the same data.
+
+from __future__ import annotations
+from typing import List, Sequence, Tuple
+import json
+import os
+
+import numpy as np
+
+from song import Song
+
+GENRES = ["pop", "rock", "indie", "hip hop", "jazz", "electronic", "classical",
+          "metal", "folk", "soul", "reggae", "country", "blues", "latin", "house"]
+
+
+def _zipf_choice(rng, n_items: int, size: int, a: float = 1.1) -> np.ndarray:
+    # Zipf-distributed picks over [0, n_items)
+    weights = 1.0 / np.arange(1, n_items + 1) ** a
+    return rng.choice(n_items, size=size, p=weights / weights.sum())
+
+
+def make_catalog(n: int, seed: int = 0, vocab: int = 20000) -> List[Song]:
+    """n songs with Zipfian title words, artists and genres; ids are sequential Deezer-like."""
+    rng = np.random.default_rng(seed)
+    n_artists = max(10, n // 20)
+    words = _zipf_choice(rng, vocab, n * 3)
+    artists = _zipf_choice(rng, n_artists, n)
+    genres = _zipf_choice(rng, len(GENRES), n, a=0.8)
+    ranks = rng.integers(1000, 1000000, n)
+    durations = rng.integers(90, 420, n)
+    return [
+        Song(
+            song_id=str(100000000 + i),
+            title=f"w{words[3 * i]} w{words[3 * i + 1]} w{words[3 * i + 2]}",
+            artist=f"artist{artists[i]}",
+            genres=[GENRES[genres[i]]],
+            duration=int(durations[i]),
+            rank=int(ranks[i]),
+        )
+        for i in range(n)
+    ]
+
+
+def make_interactions(n_users: int, n_items: int, per_user: int = 30, clusters: int = 50,
+                      seed: int = 0):
+    """Clustered implicit feedback: each user mostly plays items from 1-3 favourite
+    clusters (Zipfian inside a cluster), plus some globally popular items.
+
+    Returns (user_rows, item_cols, play_counts) as int arrays; pairs may repeat.
+    """
+    rng = np.random.default_rng(seed)
+    item_cluster = rng.integers(0, clusters, n_items)
+    members = [np.flatnonzero(item_cluster == c) for c in range(clusters)]
+    n = n_users * per_user
+    users = np.repeat(np.arange(n_users), per_user)
+    favs = rng.integers(0, clusters, (n_users, 3))
+    n_favs = rng.integers(1, 4, n_users)
+    pick = favs[users, rng.integers(0, n_favs[users])]
+    items = np.empty(n, dtype=np.int64)
+    for c in range(clusters):
+        at = np.flatnonzero(pick == c)
+        if len(at) and len(members[c]):
+            items[at] = members[c][_zipf_choice(rng, len(members[c]), len(at), a=0.9)]
+    noise = rng.random(n) < 0.2
+    items[noise] = _zipf_choice(rng, n_items, int(noise.sum()))
+    counts = rng.geometric(0.5, n)
+    return users, items, counts
+
+
+EVENT_KINDS = ("play", "like", "skip")
+EVENT_MIX = (0.80, 0.12, 0.08)  # share of plays / likes / skips
+
+
+def make_events(song_ids: Sequence[str], n_users: int, n_events: int, seed: int = 0,
+                clusters: int = 50) -> List[Tuple[str, str, str]]:
+    """A stream of (user_id, song_id, kind) events in arrival order.
+
+    Users have make_interactions' clustered, Zipfian tastes; events of all
+    users are interleaved at random and each is a play, like or skip with
+    EVENT_MIX probabilities. User ids are "u<n>".
+    """
+    rng = np.random.default_rng(seed)
+    per_user = max(1, -(-n_events // max(n_users, 1)))
+    users, items, _ = make_interactions(n_users, len(song_ids), per_user, clusters, seed)
+    order = rng.permutation(len(users))[:n_events]
+    kinds = rng.choice(len(EVENT_KINDS), size=len(order), p=EVENT_MIX)
+    return [(f"u{users[i]}", song_ids[items[i]], EVENT_KINDS[k]) for i, k in zip(order, kinds)]
+
+
+def seed_data_dir(path: str, n_songs: int, n_users: int = 0, n_events: int = 0,
+                  seed: int = 0) -> Tuple[List[Song], List[Tuple[str, str, str]]]:
+    """Write library.json (+ interactions.npz if there are events) for the API to start from.
+
+    Point MUSICLIB_DATA at `path` before importing api. Returns (songs, events).
+    """
+    from interactions import InteractionStore
+
+    os.makedirs(path, exist_ok=True)
+    songs = make_catalog(n_songs, seed)
+    with open(os.path.join(path, "library.json"), "w", encoding="utf-8") as f:
+        json.dump([s.to_dict() for s in songs], f)
+    events: List[Tuple[str, str, str]] = []
+    if n_users and n_events:
+        events = make_events([s.song_id for s in songs], n_users, n_events, seed)
+        store = InteractionStore(os.path.join(path, "interactions.npz"))
+        for start in range(0, len(events), 50000):
+            store.add_events(events[start:start + 50000])
+        store.save()
+    return songs, events
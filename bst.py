@@ -1,114 +1,261 @@
-# bst.py — BST keyed by song.song_id (string)
-# Same structure as before, but comparisons now use song_id instead of title.
+# bst.py — balanced BST keyed by song.song_id (string)
+# Same public API as before (insert/find/delete/inorder/...), but the tree is now
+# an AVL tree and every operation is iterative, so near-sorted Deezer ids can't
+# degrade it into a linked list or blow Python's recursion limit.
+# Secondary indexes (sort orders, artist → ids; see indexes.py) ride along and
+# are updated by insert/delete/bulk_load.
 
 import json
+from bisect import bisect_right
 from song import Song  # make sure song.py is in your module path
+from indexes import SORT_KEYS, SongIndexes
 
 class BSTNode:
+    __slots__ = ("key", "song", "left", "right", "height")
+
     def __init__(self, key, song):
         self.key = str(key)   # song_id (string)
         self.song = song      # the actual Song object
         self.left = None
         self.right = None
+        self.height = 1       # AVL height (leaf = 1)
+
+
+def _height(node):
+    return node.height if node is not None else 0
+
+
+def _update(node):
+    node.height = 1 + max(_height(node.left), _height(node.right))
+
+
+def _rotate_right(node):
+    pivot = node.left
+    node.left = pivot.right
+    pivot.right = node
+    _update(node)
+    _update(pivot)
+    return pivot
+
+
+def _rotate_left(node):
+    pivot = node.right
+    node.right = pivot.left
+    pivot.left = node
+    _update(node)
+    _update(pivot)
+    return pivot
+
+
+def _balance(node):
+    """Fix a node whose children differ in height by 2; returns the new subtree root."""
+    _update(node)
+    bf = _height(node.left) - _height(node.right)
+    if bf > 1:
+        if _height(node.left.left) < _height(node.left.right):
+            node.left = _rotate_left(node.left)
+        return _rotate_right(node)
+    if bf < -1:
+        if _height(node.right.right) < _height(node.right.left):
+            node.right = _rotate_right(node.right)
+        return _rotate_left(node)
+    return node
+
 
 class SongBST:
     def __init__(self, filename="library.json"):
         self.root = None
         self.filename = filename
+        self.size = 0
+        self.indexes = SongIndexes()
+
+    def __len__(self):
+        return self.size
 
-    # INSERT (recursive)
+    def _rebalance(self, path):
+        # walk back up the search path, fixing heights/rotations on the way
+        for i in range(len(path) - 1, -1, -1):
+            node = path[i]
+            old_height = node.height
+            new_root = _balance(node)
+            if new_root is not node:
+                if i == 0:
+                    self.root = new_root
+                elif path[i - 1].left is node:
+                    path[i - 1].left = new_root
+                else:
+                    path[i - 1].right = new_root
+            elif node.height == old_height:
+                break  # nothing above this point can change
+
+    # INSERT (iterative, O(log n))
     def insert(self, song):
         # key is song_id; we store the Song
-        def rec_insert(node, song):
-            if node is None:
-                return BSTNode(song.song_id, song)
-            if song.song_id < node.key:
-                node.left = rec_insert(node.left, song)
-            elif song.song_id > node.key:
-                node.right = rec_insert(node.right, song)
-            else:
-                # same id → replace existing song record
-                node.song = song
-            return node
-        self.root = rec_insert(self.root, song)
+        key = str(song.song_id)
+        path = []
+        node = self.root
+        while node is not None:
+            if key == node.key:
+                node.song = song  # same id → replace existing song record
+                self.indexes.add(song)  # re-file (plays/title may have changed)
+                return
+            path.append(node)
+            node = node.left if key < node.key else node.right
+        new = BSTNode(key, song)
+        self.size += 1
+        self.indexes.add(song)
+        if not path:
+            self.root = new
+            return
+        parent = path[-1]
+        if key < parent.key:
+            parent.left = new
+        else:
+            parent.right = new
+        self._rebalance(path)
 
-    # SEARCH (recursive, by key = song_id)
+    # SEARCH (iterative, by key = song_id)
     def find(self, song_id):
         key = str(song_id)
-        def rec_search(node, key):
-            if node is None:
-                return None
+        node = self.root
+        while node is not None:
             if key == node.key:
                 return node.song
-            elif key < node.key:
-                return rec_search(node.left, key)
-            else:
-                return rec_search(node.right, key)
-        return rec_search(self.root, key)
+            node = node.left if key < node.key else node.right
+        return None
 
-    # DELETE (recursive, by key = song_id)
+    # DELETE (iterative, by key = song_id)
     def delete(self, song_id):
         key = str(song_id)
-        def rec_delete(node, key):
-            if node is None:
-                return None, False
-            # compare key vs node.key in the same direction as search
-            if key < node.key:
-                node.left, removed = rec_delete(node.left, key)
-                return node, removed
-            elif key > node.key:
-                node.right, removed = rec_delete(node.right, key)
-                return node, removed
-            else:
-                # found node to delete
-                if node.left is None and node.right is None:
-                    return None, True
-                if node.left is None:
-                    return node.right, True
-                if node.right is None:
-                    return node.left, True
-                # Node has two children: find inorder successor
-                succ_parent = node
-                succ = node.right
-                while succ.left:
-                    succ_parent = succ
-                    succ = succ.left
-                # copy successor's data into current node
-                node.key = succ.key
-                node.song = succ.song
-                # delete successor from right subtree
-                if succ_parent.left is succ:
-                    succ_parent.left, _ = rec_delete(succ_parent.left, succ.key)
-                else:
-                    succ_parent.right, _ = rec_delete(succ_parent.right, succ.key)
-                return node, True
-        self.root, _ = rec_delete(self.root, key)
+        path = []
+        node = self.root
+        while node is not None and key != node.key:
+            path.append(node)
+            node = node.left if key < node.key else node.right
+        if node is None:
+            return False
+        self.indexes.remove(key)
+        if node.left is not None and node.right is not None:
+            # two children: copy the inorder successor up, then unlink the successor
+            path.append(node)
+            succ = node.right
+            while succ.left is not None:
+                path.append(succ)
+                succ = succ.left
+            node.key = succ.key
+            node.song = succ.song
+            node = succ
+        child = node.left if node.left is not None else node.right
+        if not path:
+            self.root = child
+        elif path[-1].left is node:
+            path[-1].left = child
+        else:
+            path[-1].right = child
+        self.size -= 1
+        self._rebalance(path)
+        return True
+
+    # BULK LOAD (from a list of songs; replaces the current contents)
+    def bulk_load(self, songs):
+        """Build a perfectly balanced tree in O(n) from songs (sorted input is cheapest)."""
+        by_id = {}
+        for song in songs:
+            by_id[str(song.song_id)] = song  # later duplicates win, same as insert
+        keys = sorted(by_id)  # timsort: ~linear when ids already arrive sorted
+
+        def build(lo, hi):  # recursion depth is only log2(n) here
+            if lo > hi:
+                return None
+            mid = (lo + hi) // 2
+            node = BSTNode(keys[mid], by_id[keys[mid]])
+            node.left = build(lo, mid - 1)
+            node.right = build(mid + 1, hi)
+            _update(node)
+            return node
+
+        self.root = build(0, len(keys) - 1)
+        self.size = len(keys)
+        self.indexes.rebuild(by_id.values())
 
     def inorder(self):  # sorting by song_id
         result = []
-        def rec_inorder(node):
-            if node:
-                rec_inorder(node.left)
-                result.append(node.song)  # Or node.key if you only want ids
-                rec_inorder(node.right)
-        rec_inorder(self.root)
+        stack = []
+        node = self.root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            result.append(node.song)  # Or node.key if you only want ids
+            node = node.right
         return result
 
+    def iter_from(self, after=None):
+        """Songs in song_id order with id > after (all when after is None), lazily."""
+        stack = []
+        node = self.root
+        while node is not None:  # seed the stack with the path to the first key > after
+            if after is None or node.key > after:
+                stack.append(node)
+                node = node.left
+            else:
+                node = node.right
+        while stack:
+            node = stack.pop()
+            yield node.song
+            node = node.right
+            while node is not None:
+                stack.append(node)
+                node = node.left
+
+    def page(self, sort="id", limit=50, after=None, artist=None, min_plays=0):
+        """One page of songs in `sort` order ("id" or a key of indexes.SORT_KEYS).
+
+        `after` is the sort key of the last song of the previous page (a cursor),
+        `artist` a case-insensitive artist prefix. Returns (songs, next_key) where
+        next_key is None on the last page.
+        """
+        if sort != "id" and sort not in SORT_KEYS:
+            raise ValueError(f"unknown sort: {sort!r}")
+        key_of = (lambda s: (s.song_id,)) if sort == "id" else SORT_KEYS[sort]
+        if artist:
+            # usually a handful of songs: sort just those
+            ids = self.indexes.artist_ids(artist)
+            keys = sorted((s.song_id,) if sort == "id" else self.indexes.key(sort, s.song_id) for s in
+                          (self.find(i) for i in ids))
+            start = 0 if after is None else bisect_right(keys, tuple(after))
+            songs = (self.find(k[-1]) for k in keys[start:])
+        elif sort == "id":
+            songs = self.iter_from(None if after is None else after[0])
+        else:
+            songs = (self.find(k[-1]) for k in self.indexes.orders[sort].irange(
+                None if after is None else tuple(after)))
+        out = []
+        for song in songs:
+            if min_plays and int(song.plays or 0) < min_plays:
+                if sort == "plays_desc":
+                    break  # everything after this has fewer plays
+                continue
+            out.append(song)
+            if len(out) > limit:
+                break
+        if len(out) > limit:
+            return out[:limit], key_of(out[limit - 1])
+        return out, None
+
     def get_all_by_artist(self, artist_name):
-        ans = []
-        def rec_get_all_by_artist(node):
-            if node:
-                rec_get_all_by_artist(node.left)
-                if node.song.artist == artist_name:
-                    ans.append(node.song)
-                rec_get_all_by_artist(node.right)
-        rec_get_all_by_artist(self.root)
-        return ans
+        ids = self.indexes.artist_ids(artist_name, prefix=False)
+        return [song for song in (self.find(i) for i in sorted(ids)) if song.artist == artist_name]
+
+    def get_all_by_genre(self, genre):
+        return [self.find(i) for i in sorted(self.indexes.genre_ids(genre))]
 
     def most_played(self, n):
-        all_songs = self.inorder()
-        all_songs.sort(key=lambda song: song.plays, reverse=True)
-        return all_songs[:n]
+        return self.page("plays_desc", n)[0]
+
+    def top_ranked(self, n):
+        return self.page("rank_desc", n)[0]
 
     # persistence automated
     '''
@@ -124,7 +271,6 @@ class SongBST:
         try:
             with open(self.filename, "r", encoding="utf-8") as f:  # open json and reverse the process
                 data = json.load(f)
-            for song_data in data:
-                self.insert(Song.from_dict(song_data))
+            self.bulk_load([Song.from_dict(song_data) for song_data in data])
         except FileNotFoundError:
             print("No library file found, starting with an empty BST.")
@@ -0,0 +1,83 @@
+# cache.py — memoised endpoint results keyed by data versions
+# Every data source (library, content model, interactions, ...) carries a
+# monotonically increasing version. An endpoint declares which sources it
+# reads; its results are cached under (endpoint, params, those versions) with
+# LRU + TTL eviction. Bumping a source drops only the endpoints that read it,
+# so e.g. a play event leaves /similar results alone.
+
+from __future__ import annotations
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, Hashable, Tuple
+import threading
+import time
+
+
+class VersionedCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.versions: Dict[str, int] = defaultdict(int)
+        self._deps: Dict[str, Tuple[str, ...]] = {}
+        self._data: "OrderedDict[tuple, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0       # LRU/TTL
+        self.invalidations = 0   # dropped because a source they read changed
+
+    def depends(self, endpoint: str, *sources: str) -> None:
+        """Declare the data sources an endpoint's results are derived from."""
+        self._deps[endpoint] = tuple(sources)
+
+    def bump(self, *sources: str) -> None:
+        """Mark sources as changed and evict every cached result that read them."""
+        with self._lock:
+            for src in sources:
+                self.versions[src] += 1
+            stale = {ep for ep, deps in self._deps.items() if any(src in deps for src in sources)}
+            for key in [k for k in self._data if k[0] in stale]:
+                del self._data[key]
+                self.invalidations += 1
+
+    def get_or_compute(self, endpoint: str, params: Hashable, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            key = (endpoint, params, tuple(self.versions[s] for s in self._deps.get(endpoint, ())))
+            hit = self._data.get(key)
+            if hit is not None and hit[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return hit[1]
+            if hit is not None:
+                del self._data[key]
+                self.evictions += 1
+            self.misses += 1
+        value = compute()  # outside the lock; concurrent misses may compute twice, that's fine
+        with self._lock:
+            if key[2] == tuple(self.versions[s] for s in self._deps.get(endpoint, ())):
+                self._data[key] = (time.monotonic() + self.ttl, value)
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "versions": dict(self.versions),
+        }
@@ -0,0 +1,215 @@
+# catalog.py — compact columnar song catalog, memory-mapped on load
+# One file, read with a single np.memmap; opening it only parses a small
+# header, so it's O(1) no matter how many songs it holds. Rows are sorted by
+# song_id (find() is a binary search) and a Song object is only built when a
+# row is actually accessed.
+#
+# Layout:
+#   b"MLCAT001" | uint64 header length | JSON header | columns (64-byte aligned)
+# Header: {"n": rows, "columns": {name: {"dtype", "offset", "count"}}}
+# Numeric columns: duration/plays/rank (int64), bpm (int32, -1 = None).
+# String columns (song_id, title, artist, album, genres) are a uint8 UTF-8 blob
+# "<name>" plus int64 "<name>.off" offsets (n + 1); genres are joined by \x1f.
+#
+# Converters:
+#   python -m catalog library.json library.cat     (JSON list of songs)
+#   python -m catalog data:songs.csv songs.cat     (CSV with a header row)
+
+from __future__ import annotations
+from typing import Dict, Iterable, Iterator, List, Optional
+import csv
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+
+from song import Song
+from storage import atomic_replace
+
+MAGIC = b"MLCAT001"
+ALIGN = 64
+GENRE_SEP = "\x1f"
+STRING_COLUMNS = ("song_id", "title", "artist", "album", "genres")
+INT_COLUMNS = {"duration": np.int64, "plays": np.int64, "rank": np.int64, "bpm": np.int32}
+
+
+def _string_column(values: List[str]):
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def write_catalog(path: str, songs: Iterable[Song], atomic: bool = True) -> int:
+    """Write songs (sorted by song_id, last duplicate wins), atomically unless the
+    caller already writes to a temp file. Returns the row count."""
+    by_id: Dict[str, Song] = {}
+    for s in songs:
+        by_id[str(s.song_id)] = s
+    rows = [by_id[k] for k in sorted(by_id)]
+    arrays: Dict[str, np.ndarray] = {}
+    for name in STRING_COLUMNS:
+        if name == "genres":
+            values = [GENRE_SEP.join(str(g) for g in (s.genres or ())) for s in rows]
+        else:
+            values = [str(getattr(s, name) or "") for s in rows]
+        arrays[name], arrays[name + ".off"] = _string_column(values)
+    for name, dtype in INT_COLUMNS.items():
+        if name == "bpm":
+            arrays[name] = np.array([-1 if s.bpm is None else s.bpm for s in rows], dtype=dtype)
+        else:
+            arrays[name] = np.array([int(getattr(s, name) or 0) for s in rows], dtype=dtype)
+
+    # lay the columns out after the header, each 64-byte aligned
+    columns, offset = {}, 0
+    for name, arr in arrays.items():
+        columns[name] = {"dtype": arr.dtype.str, "offset": offset, "count": int(arr.size)}
+        offset += -(-arr.nbytes // ALIGN) * ALIGN
+    header = json.dumps({"n": len(rows), "columns": columns}).encode()
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGN) * ALIGN
+
+    def write(tmp):
+        with open(tmp, "wb") as f:
+            f.write(MAGIC + struct.pack("<Q", len(header)) + header)
+            for name, arr in arrays.items():
+                f.seek(data_start + columns[name]["offset"])
+                f.write(arr.tobytes())
+            f.truncate(data_start + offset)
+            f.flush()
+            os.fsync(f.fileno())
+
+    if atomic:
+        atomic_replace(write, path)
+    else:
+        write(path)
+    return len(rows)
+
+
+class Catalog:
+    """Read-only, memory-mapped view of a catalog file. Rows are in song_id order."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a song catalog")
+            (hlen,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(hlen))
+        data_start = -(-(len(MAGIC) + 8 + hlen) // ALIGN) * ALIGN
+        self.n = header["n"]
+        if os.path.getsize(path) > data_start:
+            mm = np.memmap(path, dtype=np.uint8, mode="r")
+        else:
+            mm = np.zeros(0, dtype=np.uint8)  # empty catalog: nothing to map
+        self.columns: Dict[str, np.ndarray] = {}
+        for name, c in header["columns"].items():
+            dtype = np.dtype(c["dtype"])
+            start = data_start + c["offset"]
+            self.columns[name] = mm[start:start + c["count"] * dtype.itemsize].view(dtype)
+
+    def __len__(self) -> int:
+        return self.n
+
+    def string(self, name: str, i: int) -> str:
+        off = self.columns[name + ".off"]
+        return self.columns[name][off[i]:off[i + 1]].tobytes().decode("utf-8")
+
+    def __getitem__(self, i: int) -> Song:
+        """Materialise row i as a Song."""
+        if not 0 <= i < self.n:
+            raise IndexError(i)
+        genres = self.string("genres", i)
+        bpm = int(self.columns["bpm"][i])
+        return Song(
+            song_id=self.string("song_id", i),
+            title=self.string("title", i),
+            artist=self.string("artist", i),
+            album=self.string("album", i),
+            genres=genres.split(GENRE_SEP) if genres else [],
+            duration=int(self.columns["duration"][i]),
+            plays=int(self.columns["plays"][i]),
+            rank=int(self.columns["rank"][i]),
+            bpm=None if bpm < 0 else bpm,
+        )
+
+    def row_of(self, song_id: str) -> int:
+        """Row index of song_id, or -1 (binary search over the sorted id column)."""
+        song_id = str(song_id)
+        lo, hi = 0, self.n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.string("song_id", mid) < song_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.n and self.string("song_id", lo) == song_id else -1
+
+    def find(self, song_id: str) -> Optional[Song]:
+        i = self.row_of(song_id)
+        return self[i] if i >= 0 else None
+
+    def strings(self, name: str, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        """Rows start..stop of a string column in one decode (cheaper than string() per row)."""
+        stop = self.n if stop is None else min(stop, self.n)
+        if start >= stop:
+            return []
+        off = self.columns[name + ".off"][start:stop + 1].tolist()
+        base = off[0]
+        blob = self.columns[name][base:off[-1]].tobytes()
+        return [blob[a - base:b - base].decode("utf-8") for a, b in zip(off[:-1], off[1:])]
+
+    def ids(self) -> List[str]:
+        return self.strings("song_id")
+
+    def __iter__(self) -> Iterator[Song]:
+        """All rows in id order, decoded a chunk of columns at a time."""
+        chunk = 65536
+        for start in range(0, self.n, chunk):
+            stop = min(start + chunk, self.n)
+            cols = {name: self.strings(name, start, stop) for name in STRING_COLUMNS}
+            nums = {name: self.columns[name][start:stop].tolist() for name in INT_COLUMNS}
+            for j in range(stop - start):
+                genres = cols["genres"][j]
+                bpm = nums["bpm"][j]
+                yield Song(
+                    song_id=cols["song_id"][j], title=cols["title"][j], artist=cols["artist"][j],
+                    album=cols["album"][j], genres=genres.split(GENRE_SEP) if genres else [],
+                    duration=nums["duration"][j], plays=nums["plays"][j], rank=nums["rank"][j],
+                    bpm=None if bpm < 0 else bpm,
+                )
+
+
+# ---- converters ---------------------------------------------------------------
+def songs_from_json(path: str) -> List[Song]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [Song.from_dict(d) for d in json.load(f)]
+
+
+def songs_from_csv(path: str) -> List[Song]:
+    """CSV with a header row: song_id,title,artist[,album,genre|genres,duration,plays,rank,bpm].
+    Multiple genres in one cell are separated by | or ;."""
+    out = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            cell = row.get("genres") or row.get("genre") or ""
+            genres = [g.strip() for g in cell.replace(";", "|").split("|") if g.strip()]
+            out.append(Song(
+                song_id=row["song_id"], title=row.get("title", ""), artist=row.get("artist", ""),
+                album=row.get("album", ""), genres=genres, duration=int(row.get("duration") or 0),
+                plays=int(row.get("plays") or 0), rank=int(row.get("rank") or 0), bpm=row.get("bpm") or None,
+            ))
+    return out
+
+
+def convert(src: str, dst: str) -> int:
+    songs = songs_from_csv(src) if src.lower().endswith(".csv") else songs_from_json(src)
+    return write_catalog(dst, songs)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("usage: python -m catalog <library.json | songs.csv> <out.cat>")
+        sys.exit(2)
+    print(f"wrote {convert(sys.argv[1], sys.argv[2])} songs to {sys.argv[2]}")
@@ -0,0 +1,128 @@
+# concurrency.py — how shared state is shared between request threads
+# FastAPI runs sync endpoints on a thread pool, so every structure the API
+# touches must tolerate concurrent readers and writers. Two patterns are used:
+#
+# 1. Immutable snapshots swapped by reference (models). Writers build a new
+#    object off to the side and publish it with one attribute store; readers
+#    read the reference once per request and keep using that object, so they
+#    never block and never see half an update. Used for the content matrix
+#    (content.ContentSnapshot), MF factors (mf.MFModel), the neighbour tables.
+#
+# 2. A reader-writer lock (mutable indexes). The library's AVL tree and its
+#    secondary indexes are updated in place — copying them per write would
+#    cost O(n) — so many readers may walk them at once while writers get
+#    exclusive access for the few microseconds an insert takes.
+#
+# Everything else keeps its own small mutex (InteractionStore, Trending,
+# Playlists, VersionedCache, the ANN indexes).
+#
+# 3. Across processes (serve.py): one writer process owns every file; reader
+#    workers follow its append-only logs (storage.LogFollower) and memory-map
+#    the arrays it publishes (ContentModel.publish/attach). SharedVersions is
+#    the doorbell: a few counters in a memory-mapped file that the writer bumps
+#    after each change is on disk, so readers know what to re-read.
+
+from __future__ import annotations
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Sequence
+import os
+import threading
+
+import numpy as np
+
+
+class RWLock:
+    """Many readers or one writer. Writers are preferred (new readers wait while
+    a writer is queued), so a steady stream of reads can't starve updates.
+
+    Re-entrant where it's safe: a reader may nest reads, the writer may nest
+    writes or read its own state. Upgrading a read to a write raises, since
+    two threads doing that would deadlock each other.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer: Optional[int] = None
+        self._write_depth = 0
+        self._waiting_writers = 0
+        self._local = threading.local()
+
+    def _read_depth(self) -> int:
+        return getattr(self._local, "depth", 0)
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        depth = self._read_depth()
+        if depth or self._writer == threading.get_ident():
+            self._local.depth = depth + 1  # nested read / writer reading: already safe
+            try:
+                yield
+            finally:
+                self._local.depth = depth
+            return
+        with self._cond:
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        self._local.depth = 1
+        try:
+            yield
+        finally:
+            self._local.depth = 0
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._write_depth += 1
+            else:
+                if self._read_depth():
+                    raise RuntimeError("can't upgrade a read lock to a write lock")
+                self._waiting_writers += 1
+                try:
+                    while self._writer is not None or self._readers:
+                        self._cond.wait()
+                finally:
+                    self._waiting_writers -= 1
+                self._writer, self._write_depth = me, 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._write_depth -= 1
+                if not self._write_depth:
+                    self._writer = None
+                    self._cond.notify_all()
+
+
+class SharedVersions:
+    """Named int64 change counters in a small memory-mapped file.
+
+    The writer opens it with create=True and bump()s; any number of reader
+    processes get() — a plain memory read, cheap enough to do per request.
+    Counters only grow, so "changed" is just "differs from the value I saw".
+    """
+
+    def __init__(self, path: str, names: Sequence[str], create: bool = False):
+        self.path = path
+        self.names = tuple(names)
+        self._slot: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+        size = 8 * len(self.names)
+        if create and (not os.path.exists(path) or os.path.getsize(path) != size):
+            with open(path, "wb") as f:
+                f.write(bytes(size))
+        self._counts = np.memmap(path, dtype=np.int64, mode="r+" if create else "r", shape=(len(self.names),))
+        self._lock = threading.Lock()
+
+    def bump(self, name: str) -> None:
+        with self._lock:  # one writer process; the lock covers its threads
+            self._counts[self._slot[name]] += 1
+
+    def get(self, name: str) -> int:
+        return int(self._counts[self._slot[name]])
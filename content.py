@@ -0,0 +1,517 @@
+# content.py — incremental TF-IDF content features for the recommender
+# Replaces the "refit a TfidfVectorizer on every write" approach in api.py.
+#
+# - terms are hashed (HashingVectorizer), so the vocabulary never changes and a
+#   new song can be vectorized on its own
+# - rows live in growable CSR buffers: add = append one row, delete = tombstone
+# - document frequencies are kept live; the IDF weights are only recomputed when
+#   enough rows changed (drift) or on a timer, in a background thread
+# - publish() writes the rows as .npy files; attach() points another process's
+#   (read-only) model at them, memory-mapped, so N reader workers share one copy
+# - save()/load() persist the whole model (rows, raw counts, df, IDF, ids) across
+#   restarts in the same .npy layout; diff() says which songs changed since, so
+#   boot applies those instead of refitting the library. Terms are hashed, so
+#   there is no vocabulary to store: n_features (checked on load) defines it.
+# - sklearn is imported on the first vectorize, not with the module: a boot that
+#   loads a saved model and finds nothing new never imports it
+
+from __future__ import annotations
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import glob
+import os
+import threading
+import time
+import uuid
+import zlib
+
+import numpy as np
+from scipy import sparse
+
+from storage import atomic_replace, load_json, write_json
+
+N_FEATURES = 2 ** 18
+SHARED_PARTS = ("data", "indices", "indptr", "alive", "pop", "ids")
+MODEL_PARTS = SHARED_PARTS + ("tf", "hash", "df", "idf")
+MODEL_FORMAT = 1  # bump when MODEL_PARTS or the vectorizer settings change
+
+
+def _grow(buf: np.ndarray, need: int) -> np.ndarray:
+    """Return buf (or a doubled copy of it) with room for at least `need` items."""
+    if need <= len(buf):
+        return buf
+    out = np.zeros(max(need, 2 * len(buf), 16), dtype=buf.dtype)
+    out[:len(buf)] = buf
+    return out
+
+
+def _npy_writer(arr: np.ndarray) -> Callable[[str], None]:
+    def write(path: str) -> None:
+        with open(path, "wb") as f:
+            np.save(f, arr)
+    return write
+
+
+def _write_generation(directory: str, stem: str, name: str, parts: Dict[str, np.ndarray], meta: dict) -> str:
+    """Write `parts` as <name>.<uid>.<part>.npy, point <stem>.json at them, delete
+    older generations; returns the generation's name.
+
+    The random <uid> means a generation never overwrites the files <stem>.json
+    currently points at, even when a restarted process reaches the same
+    epoch/version again: a crash mid-write leaves the old generation intact.
+    """
+    name = f"{name}.{uuid.uuid4().hex[:8]}"
+    for part, arr in parts.items():
+        atomic_replace(_npy_writer(arr), os.path.join(directory, f"{name}.{part}.npy"))
+    atomic_replace(lambda tmp: write_json(tmp, dict(meta, name=name), indent=None),
+                   os.path.join(directory, f"{stem}.json"))
+    for path in glob.glob(os.path.join(directory, f"{stem}.*.*.npy")):
+        if not os.path.basename(path).startswith(name + "."):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    return name
+
+
+def text_hash(text: str) -> int:
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def song_text(s) -> str:
+    """The text a song's row is built from."""
+    # simple concatenation of text features
+    parts = [s.title, s.artist] + list(getattr(s, "genres", []) or [])
+    return " ".join(str(x) for x in parts if x)
+
+
+def song_popularity(s) -> float:
+    # tiny popularity fallback (rank scaled down so it won't dominate unless gamma large)
+    return (s.rank or 0) / 100000.0
+
+
+class ContentSnapshot:
+    """Read-only view of a ContentModel at one version (see concurrency.py).
+
+    Within an epoch rows never move and the buffers are only appended to, so the
+    matrix, ids and popularity share memory with the model; `alive` is copied
+    because deletes flip it in place. The one thing a snapshot can still see
+    change: a row deleted after it was taken reads as all zeros (scores 0).
+    """
+
+    __slots__ = ("matrix", "alive", "popularity", "idx_to_id", "_id_to_idx", "n", "version", "epoch")
+
+    def __init__(self, matrix: Optional[sparse.csr_matrix], alive: np.ndarray, popularity: np.ndarray,
+                 idx_to_id: List[str], id_to_idx: Dict[str, int], version: int, epoch: int):
+        self.matrix = matrix
+        self.alive = alive
+        self.popularity = popularity
+        self.idx_to_id = idx_to_id  # only [:n] belongs to this snapshot
+        self._id_to_idx = id_to_idx
+        self.n = len(alive)
+        self.version = version
+        self.epoch = epoch
+
+    def row(self, song_id: str) -> Optional[int]:
+        """Row of song_id in this snapshot (None if unknown or added later)."""
+        i = self._id_to_idx.get(song_id)
+        return i if i is not None and i < self.n else None
+
+    def __contains__(self, song_id: str) -> bool:
+        return self.row(song_id) is not None
+
+
+EMPTY_SNAPSHOT = ContentSnapshot(None, np.zeros(0, dtype=bool), np.zeros(0, dtype=np.float32), [], {}, -1, -1)
+
+
+class ContentModel:
+    """Append/tombstone TF-IDF matrix with stable (hashed) columns."""
+
+    def __init__(self, n_features: int = N_FEATURES, drift: float = 0.05):
+        self.n_features = n_features
+        self.drift = drift  # refresh IDF once this fraction of rows changed
+        self._vectorizer = None
+        self.listeners: List[Callable[[], None]] = []  # called after a background refresh
+        self._lock = threading.RLock()
+        self._refreshing = False
+        self._scheduler: Optional[threading.Thread] = None
+        self.version = 0
+        self.epoch = 0  # bumped whenever row indices are renumbered (fit/compaction)
+        self.source = uuid.uuid4().hex  # tells this process's publish()ed generations apart
+        self._attached: Optional[Tuple[str, str]] = None  # (source, name) attach() last read
+        self._reset()
+
+    # ---- state ------------------------------------------------------------
+    def _reset(self) -> None:
+        self.idx_to_id: List[str] = []
+        self.id_to_idx: Dict[str, int] = {}
+        self._n = 0
+        self._nnz = 0
+        self._indptr = np.zeros(1, dtype=np.int32)
+        self._indices = np.zeros(0, dtype=np.int32)
+        self._tf = np.zeros(0, dtype=np.float32)    # raw term counts
+        self._data = np.zeros(0, dtype=np.float32)  # l2-normalised tf*idf
+        self._alive = np.zeros(0, dtype=bool)
+        self._pop = np.zeros(0, dtype=np.float32)   # per-row popularity prior
+        self._hash = np.zeros(0, dtype=np.uint32)   # per-row text_hash, for diff()
+        self.df = np.zeros(self.n_features, dtype=np.int64)
+        self.n_docs = 0
+        self.idf = np.ones(self.n_features, dtype=np.float32)
+        self._dirty = 0  # rows added/removed since the last IDF refresh
+        self._matrix: Optional[sparse.csr_matrix] = None
+
+    def __len__(self) -> int:
+        return self.n_docs
+
+    @property
+    def vectorizer(self):
+        if self._vectorizer is None:
+            from sklearn.feature_extraction.text import HashingVectorizer  # ~1s import, only when needed
+            self._vectorizer = HashingVectorizer(
+                n_features=self.n_features, alternate_sign=False, norm=None,
+                stop_words="english", dtype=np.float32,
+            )
+        return self._vectorizer
+
+    @property
+    def matrix(self) -> Optional[sparse.csr_matrix]:
+        """CSR view over the live buffers (no copy); None while empty."""
+        with self._lock:
+            if self.n_docs == 0:
+                return None
+            if self._matrix is None:
+                n, nnz = self._n, self._nnz
+                self._matrix = sparse.csr_matrix(
+                    (self._data[:nnz], self._indices[:nnz], self._indptr[:n + 1]),
+                    shape=(n, self.n_features), copy=False,
+                )
+            return self._matrix
+
+    def snapshot(self) -> ContentSnapshot:
+        """Consistent read-only view of the current state (matrix, ids, alive mask)."""
+        with self._lock:
+            return ContentSnapshot(self.matrix, self.alive.copy(), self.popularity, self.idx_to_id,
+                                   self.id_to_idx, self.version, self.epoch)
+
+    @property
+    def alive(self) -> np.ndarray:
+        """Boolean mask of non-tombstoned rows, aligned with idx_to_id."""
+        return self._alive[:self._n]
+
+    @property
+    def popularity(self) -> np.ndarray:
+        """Per-row popularity prior passed to fit/add, aligned with idx_to_id."""
+        return self._pop[:self._n]
+
+    # ---- helpers ----------------------------------------------------------
+    def _compute_idf(self) -> np.ndarray:
+        # same formula as TfidfVectorizer(smooth_idf=True)
+        n = self.n_docs
+        return (np.log((1.0 + n) / (1.0 + self.df)) + 1.0).astype(np.float32)
+
+    @staticmethod
+    def _weigh(tf, indices, indptr, idf) -> np.ndarray:
+        """tf*idf per stored entry, then l2-normalise each row."""
+        data = tf * idf[indices]
+        if len(data) == 0:
+            return data
+        counts = np.diff(indptr)
+        norms = np.sqrt(np.add.reduceat(data * data, indptr[:-1][counts > 0]))
+        scale = np.zeros(len(counts), dtype=np.float32)
+        scale[counts > 0] = 1.0 / np.maximum(norms, 1e-12)
+        return (data * np.repeat(scale, counts)).astype(np.float32)
+
+    # ---- bulk fit -------------------------------------------------------------
+    def fit(self, items: Iterable[Tuple]) -> None:
+        """Rebuild everything from (song_id, text[, popularity]) tuples."""
+        items = list(items)
+        if not items:
+            with self._lock:
+                self._reset()
+                self.version += 1
+                self.epoch += 1
+            return
+        X = self.vectorizer.transform([it[1] for it in items]).tocsr()
+        X.sort_indices()
+        with self._lock:
+            self._reset()
+            self.idx_to_id = [it[0] for it in items]
+            self.id_to_idx = {sid: i for i, sid in enumerate(self.idx_to_id)}
+            self._n = X.shape[0]
+            self._nnz = X.nnz
+            self._indptr = X.indptr.astype(np.int32)
+            self._indices = X.indices.astype(np.int32)
+            self._tf = X.data.astype(np.float32)
+            self._alive = np.ones(self._n, dtype=bool)
+            self._pop = np.array([it[2] if len(it) > 2 else 0.0 for it in items], dtype=np.float32)
+            self._hash = np.array([text_hash(it[1]) for it in items], dtype=np.uint32)
+            self.df = np.bincount(self._indices, minlength=self.n_features).astype(np.int64)
+            self.n_docs = self._n
+            self.idf = self._compute_idf()
+            self._data = self._weigh(self._tf, self._indices, self._indptr, self.idf)
+            self.version += 1
+            self.epoch += 1
+
+    # ---- incremental updates -------------------------------------------------
+    def add(self, song_id: str, text: str, popularity: float = 0.0) -> int:
+        """Append one row (replacing an existing row for the same id); returns its index."""
+        row = self.vectorizer.transform([text]).tocsr()
+        row.sort_indices()
+        tf = row.data.astype(np.float32)
+        cols = row.indices.astype(np.int32)
+        data = self._weigh(tf, cols, np.array([0, len(cols)]), self.idf)
+        with self._lock:
+            if song_id in self.id_to_idx:
+                self._tombstone(self.id_to_idx[song_id])
+            i, start, end = self._n, self._nnz, self._nnz + len(cols)
+            self._indptr = _grow(self._indptr, i + 2)
+            self._indices = _grow(self._indices, end)
+            self._tf = _grow(self._tf, end)
+            self._data = _grow(self._data, end)
+            self._alive = _grow(self._alive, i + 1)
+            self._pop = _grow(self._pop, i + 1)
+            self._hash = _grow(self._hash, i + 1)
+            self._indices[start:end] = cols
+            self._tf[start:end] = tf
+            self._data[start:end] = data
+            self._indptr[i + 1] = end
+            self._alive[i] = True
+            self._pop[i] = popularity
+            self._hash[i] = text_hash(text)
+            self._n, self._nnz = i + 1, end
+            self.idx_to_id.append(song_id)
+            self.id_to_idx[song_id] = i
+            self.df[cols] += 1
+            self.n_docs += 1
+            self._dirty += 1
+            self._matrix = None
+            self.version += 1
+        self.maybe_refresh()
+        return i
+
+    def remove(self, song_id: str) -> bool:
+        with self._lock:
+            i = self.id_to_idx.get(song_id)
+            if i is None:
+                return False
+            self._tombstone(i)
+            self._matrix = None
+            self.version += 1
+        self.maybe_refresh()
+        return True
+
+    def _tombstone(self, i: int) -> None:
+        start, end = self._indptr[i], self._indptr[i + 1]
+        self.df[self._indices[start:end]] -= 1
+        self._data[start:end] = 0.0  # dead rows score 0 even for callers ignoring `alive`
+        self._alive[i] = False
+        del self.id_to_idx[self.idx_to_id[i]]
+        self.n_docs -= 1
+        self._dirty += 1
+
+    # ---- IDF refresh -------------------------------------------------------------
+    def refresh(self) -> None:
+        """Recompute IDF and re-weigh all rows; compacts tombstones when they pile up."""
+        with self._lock:
+            if self._n - self.n_docs > max(self.n_docs, 1) // 4:
+                self._compact(np.flatnonzero(self._alive[:self._n]))
+                self._dirty = 0
+                return
+            n, nnz, dirty = self._n, self._nnz, self._dirty
+            tf, indices, indptr = self._tf, self._indices, self._indptr[:n + 1].copy()
+            idf = self._compute_idf()
+        # the expensive part runs without the lock; rows appended meanwhile are patched below
+        data = self._weigh(tf[:nnz], indices[:nnz], indptr, idf)
+        with self._lock:
+            buf = np.zeros(len(self._data), dtype=np.float32)
+            buf[:nnz] = data
+            if self._nnz > nnz:
+                tail = self._indptr[n:self._n + 1] - nnz
+                buf[nnz:self._nnz] = self._weigh(self._tf[nnz:self._nnz],
+                                                 self._indices[nnz:self._nnz], tail, idf)
+            counts = np.diff(self._indptr[:self._n + 1])
+            buf[:self._nnz] *= np.repeat(self._alive[:self._n], counts)  # keep dead rows at 0
+            self._data = buf
+            self.idf = idf
+            self._dirty = max(0, self._dirty - dirty)
+            self._matrix = None
+            self.version += 1
+
+    def _compact(self, keep: np.ndarray) -> None:
+        # drop tombstoned rows; ids get new, dense indices
+        X = sparse.csr_matrix((self._tf[:self._nnz], self._indices[:self._nnz],
+                               self._indptr[:self._n + 1]), shape=(self._n, self.n_features))[keep]
+        self.idx_to_id = [self.idx_to_id[i] for i in keep]
+        self._pop = self._pop[keep]
+        self._hash = self._hash[keep]
+        self.id_to_idx = {sid: i for i, sid in enumerate(self.idx_to_id)}
+        self._n, self._nnz = X.shape[0], X.nnz
+        self._indptr = X.indptr.astype(np.int32)
+        self._indices = X.indices.astype(np.int32)
+        self._tf = X.data.astype(np.float32)
+        self._alive = np.ones(self._n, dtype=bool)
+        self.idf = self._compute_idf()
+        self._data = self._weigh(self._tf, self._indices, self._indptr, self.idf)
+        self._matrix = None
+        self.version += 1
+        self.epoch += 1
+
+    # ---- sharing between processes ------------------------------------------------
+    def publish(self, directory: str) -> int:
+        """Write the current rows to `directory` for attach() in other processes.
+
+        Each call writes a new generation of files named after the version, then
+        swaps content.json to point at it; older generations are deleted (on
+        POSIX a process that still maps one keeps its pages). Returns the version.
+        """
+        with self._lock:
+            n, nnz, version, epoch = self._n, self._nnz, self.version, self.epoch
+            parts = {"data": self._data[:nnz], "indices": self._indices[:nnz],
+                     "indptr": self._indptr[:n + 1], "alive": self._alive[:n].copy(),
+                     "pop": self._pop[:n], "ids": np.array(self.idx_to_id[:n], dtype=str)}
+        # buffers only grow within an epoch and are swapped (not rewritten) by
+        # refresh/compaction, so the views stay valid without holding the lock
+        _write_generation(directory, "content", f"content.{epoch}.{version}", parts,
+                          {"version": version, "epoch": epoch, "n_features": self.n_features,
+                           "source": self.source})
+        return version
+
+    def attach(self, directory: str) -> bool:
+        """Serve the rows another process last publish()ed; False if nothing newer.
+
+        Arrays are memory-mapped read-only. Within an epoch rows are only
+        appended, so the id maps are extended rather than rebuilt; a generation
+        from another publisher process (the writer restarted) is read in full
+        even if its epoch matches. A model used this way is read-only:
+        add/remove/refresh are the publisher's job.
+        """
+        meta = load_json(os.path.join(directory, "content.json"), None)
+        if meta is None:
+            return False
+        seen = self._attached
+        generation = (meta.get("source", ""), meta["name"])
+        if generation == seen:
+            return False
+        prefix = os.path.join(directory, meta["name"])
+        try:
+            data, indices, indptr, alive, pop, ids = (np.load(f"{prefix}.{part}.npy", mmap_mode="r")
+                                                      for part in SHARED_PARTS)
+        except (OSError, ValueError):
+            return False  # superseded while we read; the next call gets the newer one
+        n = len(alive)
+        with self._lock:
+            old_n = self._n
+            if seen is not None and seen[0] == generation[0] and meta["epoch"] == self.epoch and old_n <= n:
+                for i in np.flatnonzero(self._alive[:old_n] & ~alive[:old_n]):  # deleted since
+                    sid = self.idx_to_id[i]
+                    if self.id_to_idx.get(sid) == i:
+                        del self.id_to_idx[sid]
+                new = ids[old_n:].tolist()
+                self.idx_to_id.extend(new)
+                for i in np.flatnonzero(alive[old_n:]):
+                    self.id_to_idx[new[i]] = old_n + int(i)
+            else:
+                self.idx_to_id = ids.tolist()
+                self.id_to_idx = {self.idx_to_id[i]: int(i) for i in np.flatnonzero(alive)}
+            self.n_features = meta["n_features"]
+            self._data, self._indices, self._indptr = data, indices, indptr
+            self._alive, self._pop = alive, pop
+            self._n, self._nnz = n, len(data)
+            self.n_docs = int(alive.sum())
+            self.version, self.epoch = meta["version"], meta["epoch"]
+            self._attached = generation
+            self._matrix = None
+        return True
+
+    # ---- persistence across restarts ------------------------------------------------
+    def save(self, directory: str) -> int:
+        """Write everything load() needs to `directory` (a new generation per call,
+        like publish); returns the version saved."""
+        with self._lock:
+            n, nnz, version, epoch = self._n, self._nnz, self.version, self.epoch
+            parts = {"data": self._data[:nnz], "indices": self._indices[:nnz],
+                     "indptr": self._indptr[:n + 1], "alive": self._alive[:n].copy(),
+                     "pop": self._pop[:n], "ids": np.array(self.idx_to_id[:n], dtype=str),
+                     "tf": self._tf[:nnz], "hash": self._hash[:n], "df": self.df.copy(), "idf": self.idf}
+            dirty = self._dirty
+        _write_generation(directory, "model", f"model.{epoch}.{version}", parts,
+                          {"format": MODEL_FORMAT, "n_features": self.n_features, "dirty": dirty,
+                           "version": version, "epoch": epoch})
+        return version
+
+    def load(self, directory: str) -> bool:
+        """Replace the model with the one save() last wrote; False (model untouched)
+        if there is none or it was written in another format.
+
+        Arrays are memory-mapped copy-on-write: boot doesn't read them up front,
+        and tombstones/appends stay private to this process.
+        """
+        meta = load_json(os.path.join(directory, "model.json"), None)
+        if not meta or meta.get("format") != MODEL_FORMAT or meta.get("n_features") != self.n_features:
+            return False
+        prefix = os.path.join(directory, meta["name"])
+        try:
+            arrays = {part: np.load(f"{prefix}.{part}.npy", mmap_mode="c") for part in MODEL_PARTS}
+        except (OSError, ValueError):
+            return False
+        ids = arrays["ids"].tolist()
+        alive = arrays["alive"]
+        with self._lock:
+            self._reset()
+            self.idx_to_id = ids
+            self.id_to_idx = {ids[i]: int(i) for i in np.flatnonzero(alive)}
+            self._n, self._nnz = len(alive), len(arrays["data"])
+            self._data, self._indices, self._indptr = arrays["data"], arrays["indices"], arrays["indptr"]
+            self._tf, self._alive, self._pop, self._hash = arrays["tf"], alive, arrays["pop"], arrays["hash"]
+            self.df, self.idf = arrays["df"], arrays["idf"]
+            self.n_docs = len(self.id_to_idx)
+            self._dirty = int(meta.get("dirty", 0))
+            # carry on from the saved counters: they name generations, and a
+            # restart must not hand out the ones already on disk again
+            self.version = max(self.version, int(meta.get("version", 0))) + 1
+            self.epoch = max(self.epoch, int(meta.get("epoch", 0))) + 1
+        return True
+
+    def diff(self, items: Iterable[Tuple]) -> Tuple[List[Tuple], List[str]]:
+        """Compare against (song_id, text[, popularity]) tuples: returns (items that
+        are new or whose text/popularity changed, ids that are no longer there)."""
+        changed, seen = [], set()
+        with self._lock:
+            for it in items:
+                sid = it[0]
+                seen.add(sid)
+                i = self.id_to_idx.get(sid)
+                pop = np.float32(it[2] if len(it) > 2 else 0.0)
+                if i is None or self._hash[i] != text_hash(it[1]) or self._pop[i] != pop:
+                    changed.append(it)
+            gone = [sid for sid in self.id_to_idx if sid not in seen]
+        return changed, gone
+
+    def maybe_refresh(self) -> None:
+        """Kick off a background refresh once drift passes the threshold."""
+        if self._refreshing or self._dirty <= self.drift * max(self.n_docs, 1):
+            return
+        self._refreshing = True
+        threading.Thread(target=self._refresh_and_notify, daemon=True).start()
+
+    def _refresh_and_notify(self) -> None:
+        try:
+            self.refresh()
+        finally:
+            self._refreshing = False
+        for fn in self.listeners:
+            fn()
+
+    def start_scheduler(self, interval_s: float) -> None:
+        """Also refresh every `interval_s` seconds if anything changed."""
+        if self._scheduler is not None or interval_s <= 0:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval_s)
+                if self._dirty and not self._refreshing:
+                    self._refreshing = True
+                    self._refresh_and_notify()
+
+        self._scheduler = threading.Thread(target=loop, daemon=True)
+        self._scheduler.start()
@@ -0,0 +1,118 @@
+# deezer.py — Deezer search client for /import-deezer (no API key needed)
+# - one pooled requests.Session (keep-alive, retries on 429/5xx) per client
+# - pages of a search, and several searches, are fetched concurrently on a
+#   small thread pool
+# - raw result pages are cached per (query, offset, page size) with a TTL, so
+#   repeating an import doesn't hit the network
+# DEEZER_BASE can point the client at a local stub (benchmarks/deezer_stub.py).
+
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from cache import VersionedCache
+from metrics import span
+from song import Song
+
+DEEZER_BASE = os.environ.get("DEEZER_BASE", "https://api.deezer.com")
+PAGE_SIZE = 50     # rows per /search request
+MAX_LIMIT = 500    # cap per query
+
+
+class DeezerError(RuntimeError):
+    """Deezer answered with an error payload or the request failed."""
+
+
+def track_to_song(row: Dict[str, Any]) -> Song:
+    return Song(
+        song_id=str(row.get("id")),
+        title=row.get("title", ""),
+        artist=(row.get("artist") or {}).get("name", ""),
+        album=(row.get("album") or {}).get("title", ""),
+        genres=[],
+        duration=int(row.get("duration") or 0),
+        rank=int(row.get("rank") or 0),
+    )
+
+
+class DeezerClient:
+    def __init__(self, base: str = DEEZER_BASE, workers: int = 8, timeout: float = 10.0,
+                 cache_ttl: float = 600.0, cache_size: int = 512):
+        self.base = base.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(total=2, backoff_factor=0.2, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=("GET",))
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="deezer")
+        self.cache = VersionedCache(maxsize=cache_size, ttl=cache_ttl)
+        self.requests = 0  # network calls made (cache misses)
+        self._lock = threading.Lock()  # the counter is bumped from pool threads
+
+    # ---- raw pages --------------------------------------------------------------
+    def _fetch_page(self, query: str, index: int, size: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            self.requests += 1
+        try:
+            with span("deezer.fetch"):
+                r = self.session.get(f"{self.base}/search", params={"q": query, "index": index, "limit": size},
+                                     timeout=self.timeout)
+                r.raise_for_status()
+                payload = r.json()
+        except (requests.RequestException, ValueError) as e:
+            raise DeezerError(str(e)) from e
+        if "error" in payload:  # Deezer reports quota/query errors with HTTP 200
+            raise DeezerError(str((payload["error"] or {}).get("message", payload["error"])))
+        return payload.get("data", [])
+
+    def page(self, query: str, index: int = 0, size: int = PAGE_SIZE) -> List[Dict[str, Any]]:
+        """One page of raw /search rows (cached)."""
+        return self.cache.get_or_compute("search", (query, index, size),
+                                         lambda: self._fetch_page(query, index, size))
+
+    # ---- searches ---------------------------------------------------------------
+    def search(self, query: str, limit: int = 50) -> List[Song]:
+        return self.search_many([query], limit)
+
+    def search_many(self, queries: Iterable[str], limit: int = 50) -> List[Song]:
+        """Up to `limit` tracks per query; all pages of all queries are fetched
+        concurrently. Songs are de-duplicated by id, in query order."""
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        queries = [q for q in dict.fromkeys(q.strip() for q in queries) if q]
+        jobs = [(q, index, min(PAGE_SIZE, limit - index))
+                for q in queries for index in range(0, limit, PAGE_SIZE)]
+        with span("deezer.search"):
+            pages = list(self.pool.map(lambda job: self.page(*job), jobs))
+        out: Dict[str, Song] = {}
+        for rows in pages:
+            for row in rows:
+                if row.get("id") is not None:
+                    s = track_to_song(row)
+                    out.setdefault(s.song_id, s)
+        return list(out.values())
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=False)
+        self.session.close()
+
+
+_client: Optional[DeezerClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> DeezerClient:
+    """Process-wide client (created on first use; concurrent imports share one)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = DeezerClient()
+    return _client
@@ -0,0 +1,199 @@
+# indexes.py — secondary indexes over the library, maintained by SongBST
+# The BST answers "song by id"; these answer "songs in title / artist / plays /
+# rank order", "songs by artist / genre" and the /stats totals without walking
+# the whole tree, so a page of /songs costs O(log n + page), an artist lookup
+# O(result) and /stats O(1).
+#
+# Each sort order is a SortedKeyList of tuples ending in song_id (ties break by
+# id, so every key is unique and a key doubles as a stable pagination cursor).
+
+from __future__ import annotations
+from bisect import bisect_left, bisect_right, insort
+from typing import Callable, Dict, Iterable, Iterator, List, Set, Tuple
+
+
+# sort name → key for one song; every key ends with song_id
+SORT_KEYS: Dict[str, Callable] = {
+    "title": lambda s: (s.title.casefold(), s.song_id),
+    "artist": lambda s: (s.artist.casefold(), s.title.casefold(), s.song_id),
+    "plays_desc": lambda s: (-int(s.plays or 0), s.song_id),
+    "rank_desc": lambda s: (-int(s.rank or 0), s.song_id),
+}
+
+
+class SortedKeyList:
+    """Sorted list split into sublists of ~`load` keys (the sortedcontainers trick):
+    add/remove touch one short list, lookups bisect the sublist maxima."""
+
+    def __init__(self, load: int = 500):
+        self._load = load
+        self._lists: List[list] = []
+        self._maxes: list = []
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def load_sorted(self, keys: Iterable) -> None:
+        """Replace the contents with already-sorted keys."""
+        keys = list(keys)
+        self._lists = [keys[i:i + self._load] for i in range(0, len(keys), self._load)]
+        self._maxes = [lst[-1] for lst in self._lists]
+        self._len = len(keys)
+
+    def add(self, key) -> None:
+        if not self._lists:
+            self._lists, self._maxes = [[key]], [key]
+            self._len = 1
+            return
+        pos = bisect_left(self._maxes, key)
+        if pos == len(self._maxes):
+            pos -= 1
+            self._lists[pos].append(key)
+            self._maxes[pos] = key
+        else:
+            insort(self._lists[pos], key)
+        self._len += 1
+        lst = self._lists[pos]
+        if len(lst) > 2 * self._load:  # split an overgrown sublist
+            self._lists.insert(pos + 1, lst[self._load:])
+            del lst[self._load:]
+            self._maxes.insert(pos, lst[-1])
+
+    def remove(self, key) -> bool:
+        pos = bisect_left(self._maxes, key)
+        if pos == len(self._maxes):
+            return False
+        lst = self._lists[pos]
+        i = bisect_left(lst, key)
+        if i == len(lst) or lst[i] != key:
+            return False
+        del lst[i]
+        self._len -= 1
+        if lst:
+            self._maxes[pos] = lst[-1]
+        else:
+            del self._lists[pos], self._maxes[pos]
+        return True
+
+    def irange(self, start=None, inclusive: bool = False) -> Iterator:
+        """Keys from `start` onwards (all keys when start is None)."""
+        if start is None:
+            pos, i = 0, 0
+        else:
+            pos = bisect_left(self._maxes, start)
+            if pos == len(self._maxes):
+                return
+            lst = self._lists[pos]
+            i = bisect_left(lst, start) if inclusive else bisect_right(lst, start)
+        for p in range(pos, len(self._lists)):
+            lst = self._lists[p]
+            yield from lst[i:] if i else lst
+            i = 0
+
+
+class SongIndexes:
+    """Sort orders, artist/genre → ids and running totals for the songs in a SongBST."""
+
+    def __init__(self):
+        self.orders: Dict[str, SortedKeyList] = {name: SortedKeyList() for name in SORT_KEYS}
+        self.by_artist: Dict[str, Set[str]] = {}  # casefolded artist → song ids
+        self.by_genre: Dict[str, Set[str]] = {}   # casefolded genre → song ids
+        self.artist_names = SortedKeyList()        # distinct casefolded artists (prefix lookups)
+        # running aggregates for /stats
+        self.artist_counts: Dict[str, int] = {}   # exact artist name → songs
+        self.total_plays = 0
+        # song_id → what it's filed under, so updates can remove the old entries:
+        # (casefolded artist, sort keys, artist, casefolded genres, plays)
+        self._entries: Dict[str, Tuple[str, Tuple, str, Tuple[str, ...], int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def n_artists(self) -> int:
+        return len(self.artist_counts)
+
+    @staticmethod
+    def _entry(song) -> Tuple[str, Tuple, str, Tuple[str, ...], int]:
+        genres = tuple(dict.fromkeys(str(g).casefold() for g in (song.genres or ()) if g))
+        return (song.artist.casefold(), tuple(fn(song) for fn in SORT_KEYS.values()),
+                song.artist, genres, int(song.plays or 0))
+
+    def _file_sets(self, song_id: str, entry) -> bool:
+        """Add to the artist/genre sets and totals; True if the casefolded artist is new."""
+        artist_cf, _, artist, genres, plays = entry
+        self.artist_counts[artist] = self.artist_counts.get(artist, 0) + 1
+        self.total_plays += plays
+        for g in genres:
+            self.by_genre.setdefault(g, set()).add(song_id)
+        ids = self.by_artist.get(artist_cf)
+        if ids is None:
+            self.by_artist[artist_cf] = {song_id}
+            return True
+        ids.add(song_id)
+        return False
+
+    def rebuild(self, songs: Iterable) -> None:
+        self._entries = {}
+        self.by_artist, self.by_genre, self.artist_counts = {}, {}, {}
+        self.total_plays = 0
+        for s in songs:
+            entry = self._entries[s.song_id] = self._entry(s)
+            self._file_sets(s.song_id, entry)
+        for n, name in enumerate(SORT_KEYS):
+            self.orders[name].load_sorted(sorted(e[1][n] for e in self._entries.values()))
+        self.artist_names.load_sorted(sorted(self.by_artist))
+
+    def add(self, song) -> None:
+        """File a new song, or re-file one whose fields changed."""
+        self.remove(song.song_id)
+        entry = self._entries[song.song_id] = self._entry(song)
+        for name, key in zip(SORT_KEYS, entry[1]):
+            self.orders[name].add(key)
+        if self._file_sets(song.song_id, entry):
+            self.artist_names.add(entry[0])
+
+    def remove(self, song_id: str) -> None:
+        old = self._entries.pop(song_id, None)
+        if old is None:
+            return
+        artist_cf, keys, artist, genres, plays = old
+        for name, key in zip(SORT_KEYS, keys):
+            self.orders[name].remove(key)
+        self.total_plays -= plays
+        if self.artist_counts.get(artist, 0) <= 1:
+            self.artist_counts.pop(artist, None)
+        else:
+            self.artist_counts[artist] -= 1
+        for g in genres:
+            ids = self.by_genre.get(g)
+            if ids is not None:
+                ids.discard(song_id)
+                if not ids:
+                    del self.by_genre[g]
+        ids = self.by_artist.get(artist_cf)
+        if ids is not None:
+            ids.discard(song_id)
+            if not ids:
+                del self.by_artist[artist_cf]
+                self.artist_names.remove(artist_cf)
+
+    def key(self, sort: str, song_id: str) -> Tuple:
+        return self._entries[song_id][1][list(SORT_KEYS).index(sort)]
+
+    def artist_ids(self, artist: str, prefix: bool = True) -> Set[str]:
+        """Ids of songs whose artist equals (or starts with) `artist`, case-insensitive."""
+        artist = artist.casefold()
+        if not prefix:
+            return set(self.by_artist.get(artist, ()))
+        out: Set[str] = set()
+        for name in self.artist_names.irange(artist, inclusive=True):
+            if not name.startswith(artist):
+                break
+            out |= self.by_artist[name]
+        return out
+
+    def genre_ids(self, genre: str) -> Set[str]:
+        """Ids of songs tagged with `genre` (case-insensitive)."""
+        return set(self.by_genre.get(genre.casefold(), ()))
@@ -0,0 +1,378 @@
+# interactions.py — multi-user implicit feedback store
+# likes/plays live in two sparse user×item CSR matrices with compact integer ids
+# (user_id/song_id strings → row/column numbers). Recent changes sit in a small
+# delta dict and get merged into the CSR matrices in bulk, so an event is O(1)
+# and memory is O(nnz) — no Python dict per user.
+#
+# Persistence: "<path>" is an .npz snapshot, "<path>.log" an append-only log of
+# absolute {u, s, l, p} values (see storage.py), so replays are idempotent.
+# Log records are buffered in memory and written in batches (every
+# `flush_every` records or by the background flusher), so a burst of events
+# costs one write; a crash loses at most the unflushed tail.
+# With follow=True the store is a read-only replica of one another process
+# writes; sync() applies that process's flushed log records.
+
+from __future__ import annotations
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import csv
+import os
+import threading
+
+import numpy as np
+from scipy import sparse
+
+from metrics import span
+from storage import AppendLog, DEFAULT_COMPACT_EVERY, LogFollower, atomic_replace
+
+LIKE_WEIGHT = 3.0  # implicit-feedback weight of a like vs one play
+EVENT_KINDS = ("like", "play", "skip")
+
+
+def _apply_kind(likes: int, plays: int, kind: str) -> Tuple[int, int]:
+    if kind == "like":
+        return likes + 1, plays
+    if kind == "play":
+        return likes, plays + 1
+    if kind == "skip":
+        return likes, max(0, plays - 1)  # tiny negative signal
+    raise ValueError(f"unknown event kind: {kind!r}")
+
+
+def _csr_get(m: sparse.csr_matrix, u: int, i: int) -> int:
+    # scalar lookup without scipy's (slow) fancy indexing; indices are kept sorted
+    lo, hi = m.indptr[u], m.indptr[u + 1]
+    j = lo + np.searchsorted(m.indices[lo:hi], i)
+    return int(m.data[j]) if j < hi and m.indices[j] == i else 0
+
+
+class InteractionStore:
+    def __init__(self, path: Optional[str] = None, compact_every: int = DEFAULT_COMPACT_EVERY,
+                 merge_every: int = 50000, flush_every: int = 5000, follow: bool = False):
+        self.path = path
+        self.merge_every = merge_every  # delta size that triggers a CSR merge
+        self.flush_every = flush_every  # buffered log records that trigger a write
+        self._unlogged: List[dict] = []
+        self._stop = threading.Event()
+        self.users: List[str] = []
+        self.user_idx: Dict[str, int] = {}
+        self.items: List[str] = []
+        self.item_idx: Dict[str, int] = {}
+        self._likes = sparse.csr_matrix((0, 0), dtype=np.int32)
+        self._plays = sparse.csr_matrix((0, 0), dtype=np.int32)
+        # recent writes, grouped by user: u → {i: absolute (likes, plays)}
+        self._delta: Dict[int, Dict[int, Tuple[int, int]]] = {}
+        self._delta_n = 0
+        self.version = 0
+        self._lock = threading.RLock()  # events vs. background readers (MF trainer)
+        self.listeners: List[Callable[[], None]] = []  # called once changes are on disk
+        self.follower = LogFollower(path + ".log") if path and follow else None
+        self.log = AppendLog(path + ".log", compact_every=compact_every) if path and not follow else None
+        if path:
+            self._load()
+
+    # ---- ids --------------------------------------------------------------
+    def _uid(self, user: str) -> int:
+        u = self.user_idx.get(user)
+        if u is None:
+            u = self.user_idx[user] = len(self.users)
+            self.users.append(user)
+        return u
+
+    def _iid(self, item: str) -> int:
+        i = self.item_idx.get(item)
+        if i is None:
+            i = self.item_idx[item] = len(self.items)
+            self.items.append(item)
+        return i
+
+    @property
+    def n_users(self) -> int:
+        return len(self.users)
+
+    @property
+    def n_items(self) -> int:
+        return len(self.items)
+
+    @property
+    def nnz(self) -> int:
+        return self.matrices()[0].nnz
+
+    # ---- reads ----------------------------------------------------------------
+    def get(self, user: str, item: str) -> Tuple[int, int]:
+        """(likes, plays) for one user/song pair."""
+        with self._lock:  # a merge (MF trainer thread) empties _delta into the matrices
+            u, i = self.user_idx.get(user), self.item_idx.get(item)
+            if u is None or i is None:
+                return 0, 0
+            pending = self._delta.get(u, {}).get(i)
+            if pending is not None:
+                return pending
+            if u >= self._likes.shape[0] or i >= self._likes.shape[1]:
+                return 0, 0
+            return _csr_get(self._likes, u, i), _csr_get(self._plays, u, i)
+
+    def user_items(self, user: str) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """(song_ids, likes, plays) the user has any interaction with."""
+        u = self.user_idx.get(user)
+        if u is None:
+            return [], np.zeros(0, np.int32), np.zeros(0, np.int32)
+        row: Dict[int, Tuple[int, int]] = {}
+        with self._lock:
+            if u < self._likes.shape[0]:
+                lk, pl = self._likes[u], self._plays[u]
+                for i, v in zip(lk.indices, lk.data):
+                    row[i] = (int(v), 0)
+                for i, v in zip(pl.indices, pl.data):
+                    row[i] = (row.get(i, (0, 0))[0], int(v))
+            row.update(self._delta.get(u, {}))
+        row = {i: v for i, v in row.items() if v != (0, 0)}
+        ids = [self.items[i] for i in row]
+        likes = np.fromiter((v[0] for v in row.values()), np.int32, len(row))
+        plays = np.fromiter((v[1] for v in row.values()), np.int32, len(row))
+        return ids, likes, plays
+
+    def matrices(self) -> Tuple[sparse.csr_matrix, sparse.csr_matrix]:
+        """Merged (likes, plays) user×item CSR matrices."""
+        with self._lock:
+            self._merge()
+            return self._likes, self._plays
+
+    def weights(self) -> sparse.csr_matrix:
+        """Implicit-feedback strength per user×item: LIKE_WEIGHT*likes + plays."""
+        likes, plays = self.matrices()
+        return (likes.astype(np.float32) * LIKE_WEIGHT + plays.astype(np.float32)).tocsr()
+
+    # ---- writes ------------------------------------------------------------------
+    def set(self, user: str, item: str, likes: int, plays: int, log: bool = True) -> None:
+        """Set absolute counts for one pair (0/0 removes it)."""
+        with self._lock:
+            pending = self._delta.setdefault(self._uid(user), {})
+            i = self._iid(item)
+            self._delta_n += i not in pending
+            pending[i] = (int(likes), int(plays))
+            self.version += 1
+            if log and self.log is not None:
+                self._buffer({"u": user, "s": item, "l": int(likes), "p": int(plays)})
+            if self._delta_n >= self.merge_every:
+                self._merge()
+
+    def add_events(self, events: Iterable[Tuple[str, str, str]]) -> int:
+        """Apply (user, song_id, kind) events in order; kind is like | play | skip.
+
+        Events on the same pair are folded together first, so each pair is read
+        (one vectorised CSR lookup for the whole batch), written and logged once.
+        Returns the number of events applied.
+        """
+        pairs: Dict[Tuple[str, str], List[str]] = {}
+        for user, item, kind in events:
+            if kind not in EVENT_KINDS:
+                raise ValueError(f"unknown event kind: {kind!r}")
+            pairs.setdefault((user, item), []).append(kind)
+        if not pairs:
+            return 0
+        with self._lock:
+            keys = list(pairs)
+            base = self._get_many(keys)
+            for (user, item), (likes, plays), kinds in zip(keys, base, pairs.values()):
+                if "skip" in kinds:
+                    for kind in kinds:
+                        likes, plays = _apply_kind(likes, plays, kind)
+                else:
+                    likes += kinds.count("like")
+                    plays += len(kinds) - kinds.count("like")
+                self.set(user, item, likes, plays)
+        return sum(len(k) for k in pairs.values())
+
+    def _get_many(self, keys: List[Tuple[str, str]]) -> List[Tuple[int, int]]:
+        """get() for many pairs; the CSR part is one fancy-indexing call."""
+        out = [(0, 0)] * len(keys)
+        rows, cols, at = [], [], []
+        n_u, n_i = self._likes.shape
+        for n, (user, item) in enumerate(keys):
+            u, i = self.user_idx.get(user), self.item_idx.get(item)
+            if u is None or i is None:
+                continue
+            pending = self._delta.get(u)
+            if pending is not None and i in pending:
+                out[n] = pending[i]
+            elif u < n_u and i < n_i:
+                rows.append(u)
+                cols.append(i)
+                at.append(n)
+        if at:
+            likes = np.asarray(self._likes[rows, cols]).ravel()
+            plays = np.asarray(self._plays[rows, cols]).ravel()
+            for n, l, p in zip(at, likes.tolist(), plays.tolist()):
+                out[n] = (l, p)
+        return out
+
+    def drop_item(self, item: str, log: bool = True) -> None:
+        """Forget every interaction with a (deleted) song."""
+        i = self.item_idx.get(item)
+        if i is None:
+            return
+        with self._lock:
+            self._merge()
+            if i < self._likes.shape[1]:
+                keep = np.ones(self._likes.shape[1], dtype=np.int32)
+                keep[i] = 0
+                scale = sparse.diags(keep, dtype=np.int32)
+                self._likes = (self._likes @ scale).tocsr()
+                self._plays = (self._plays @ scale).tocsr()
+                self._likes.eliminate_zeros()
+                self._plays.eliminate_zeros()
+                self._likes.sort_indices()
+                self._plays.sort_indices()
+            self.version += 1
+            if log and self.log is not None:
+                self._buffer({"drop": item})
+
+    def _shape(self) -> Tuple[int, int]:
+        return self.n_users, self.n_items
+
+    def _resize(self, m: sparse.csr_matrix) -> sparse.csr_matrix:
+        m = m.tocsr()
+        m.resize(self._shape())
+        return m
+
+    def _merge(self) -> None:
+        if not self._delta and self._likes.shape == self._shape():
+            return
+        likes, plays = self._resize(self._likes), self._resize(self._plays)
+        if self._delta:
+            u = np.fromiter((u for u, row in self._delta.items() for _ in row), np.int64, self._delta_n)
+            i = np.fromiter((i for row in self._delta.values() for i in row), np.int64, self._delta_n)
+            vals = np.array([v for row in self._delta.values() for v in row.values()],
+                            dtype=np.int32).reshape(-1, 2)
+            # overwrite: subtract the old values, add the new ones
+            old_l = np.asarray(likes[u, i]).ravel()
+            old_p = np.asarray(plays[u, i]).ravel()
+            shape = self._shape()
+            likes = likes + sparse.csr_matrix((vals[:, 0] - old_l, (u, i)), shape=shape)
+            plays = plays + sparse.csr_matrix((vals[:, 1] - old_p, (u, i)), shape=shape)
+            likes.eliminate_zeros()
+            plays.eliminate_zeros()
+        self._likes, self._plays = likes.astype(np.int32), plays.astype(np.int32)
+        self._likes.sort_indices()
+        self._plays.sort_indices()
+        self._delta.clear()
+        self._delta_n = 0
+
+    # ---- bulk load -----------------------------------------------------------------
+    def load_csv(self, path: str, user_col: str = "user_id", item_col: str = "song_id",
+                 plays_col: Optional[str] = None) -> int:
+        """Add rows of a user/song CSV (e.g. data:plays.csv); each row counts as one play
+        unless `plays_col` gives a count. Returns the number of rows read."""
+        us, its, counts = [], [], []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                us.append(self._uid(row[user_col]))
+                its.append(self._iid(row[item_col]))
+                counts.append(int(row[plays_col]) if plays_col else 1)
+        with self._lock:
+            self._merge()
+            added = sparse.csr_matrix((np.asarray(counts, np.int32), (us, its)), shape=self._shape())
+            self._plays = (self._plays + added).astype(np.int32).tocsr()
+            self._plays.sort_indices()
+            self.version += 1
+        if self.path:
+            self.save()  # too many rows to log one by one
+        return len(us)
+
+    def load_dict(self, user: str, data: Dict[str, Dict[str, int]]) -> None:
+        """Import the old single-user {song_id: {likes, plays}} format."""
+        for sid, ev in data.items():
+            self.set(user, sid, ev.get("likes", 0), ev.get("plays", 0), log=False)
+
+    # ---- persistence -----------------------------------------------------------------
+    def _buffer(self, rec: dict) -> None:
+        self._unlogged.append(rec)
+        if len(self._unlogged) >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write buffered log records (and compact if the log got long)."""
+        with self._lock:
+            recs, self._unlogged = self._unlogged, []
+            if self.log is None:
+                return
+            with span("interactions.flush"):
+                self.log.append_many(recs)
+            if self.log.due:
+                self.save()
+        if recs:
+            self._notify()
+
+    def _notify(self) -> None:
+        for fn in self.listeners:
+            fn()
+
+    def start_flusher(self, interval_s: float) -> None:
+        """Flush the log buffer every `interval_s` seconds in a daemon thread."""
+        if interval_s <= 0:
+            return
+
+        def loop():
+            while not self._stop.wait(interval_s):
+                if self._unlogged:
+                    self.flush()
+
+        threading.Thread(target=loop, daemon=True).start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.flush()
+
+    @property
+    def unsaved(self) -> bool:
+        """Events not folded into the .npz snapshot yet (logged or buffered), or no snapshot."""
+        return self.log is not None and bool(self.log.pending or self._unlogged or not os.path.exists(self.path))
+
+    def save(self) -> None:
+        """Write the .npz snapshot and truncate the log (buffered records included)."""
+        with self._lock, span("interactions.save"):
+            self._unlogged = []  # the snapshot covers them
+            likes, plays = self.matrices()
+
+            def write(tmp):
+                with open(tmp, "wb") as f:
+                    np.savez(f, users=np.array(self.users, dtype=str), items=np.array(self.items, dtype=str),
+                             indptr=likes.indptr, indices=likes.indices, likes=likes.data,
+                             p_indptr=plays.indptr, p_indices=plays.indices, plays=plays.data)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            if self.log is not None:
+                self.log.compact(write, self.path)
+            else:
+                atomic_replace(write, self.path)
+        self._notify()
+
+    def _load(self) -> None:
+        if os.path.exists(self.path):
+            with np.load(self.path) as z:
+                self.users = [str(x) for x in z["users"]]
+                self.items = [str(x) for x in z["items"]]
+                shape = (len(self.users), len(self.items))
+                self._likes = sparse.csr_matrix((z["likes"], z["indices"], z["indptr"]), shape=shape)
+                self._plays = sparse.csr_matrix((z["plays"], z["p_indices"], z["p_indptr"]), shape=shape)
+                self._likes.sort_indices()
+                self._plays.sort_indices()
+            self.user_idx = {u: i for i, u in enumerate(self.users)}
+            self.item_idx = {s: i for i, s in enumerate(self.items)}
+        for rec in (self.follower.poll() if self.follower is not None else self.log.replay()):
+            self._apply(rec)
+
+    def _apply(self, rec: dict) -> None:
+        if "drop" in rec:
+            self.drop_item(rec["drop"], log=False)
+        else:
+            self.set(rec["u"], rec["s"], rec["l"], rec["p"], log=False)
+
+    def sync(self) -> int:
+        """Follower mode: apply records the writer flushed since the last call."""
+        recs = self.follower.poll()
+        with self._lock:
+            for rec in recs:
+                self._apply(rec)
+        return len(recs)
@@ -1,24 +1,64 @@
 # song_library.py — wrapper around BST keyed by song_id + JSON persistence
 # Switched API to use song_id everywhere (more stable than titles).
+# Persistence: library.json is a snapshot, every change since then is one line
+# in library.json.log (see storage.py), so a play no longer rewrites the file.
+# A storage_file ending in ".cat" keeps the snapshot in the memory-mapped
+# columnar format instead (see catalog.py); the log works the same way.
+# Thread-safe: reads share `self.lock`, writes take it exclusively (see concurrency.py).
+# follow=True opens a read-only replica of a library another process writes
+# (multi-worker serving): sync() applies the writer's new log records.
+# search() is full-text search over title/artist/album/genres (search.py). The
+# index is built on first use (or early, by build_search_index() in a thread)
+# and then kept current by every mutation below.
 
 import json
 import os
+import threading
 from bst import SongBST        # this BST should be keyed by song.song_id
+from catalog import Catalog, write_catalog
+from concurrency import RWLock
+from metrics import span
+from search import SearchIndex
 from song import Song
+from storage import AppendLog, DEFAULT_COMPACT_EVERY, LogFollower, write_json
 
 class SongLibrary:
-    def __init__(self, storage_file="library.json"):
+    def __init__(self, storage_file="library.json", compact_every=DEFAULT_COMPACT_EVERY, follow=False):
         self.storage_file = storage_file
+        self.columnar = storage_file.endswith(".cat")
+        self.follow = follow
         # ensure parent folder exists (e.g., data/library.json)
         parent = os.path.dirname(self.storage_file)
-        if parent and not os.path.exists(parent):
+        if parent and not os.path.exists(parent) and not follow:
             os.makedirs(parent, exist_ok=True)
         self.bst = SongBST()
+        self.lock = RWLock()
+        self._search = None          # SearchIndex once built
+        self._search_pending = None  # changes made while it's being built
+        self._search_build = threading.Lock()
+        # a follower opens the log before reading the snapshot (see LogFollower)
+        self.follower = LogFollower(self.storage_file + ".log") if follow else None
+        self.log = None if follow else AppendLog(self.storage_file + ".log", compact_every=compact_every)
         self.load_library()  # if already saved data it fills it in
 
+    def _records(self):
+        return self.follower.poll() if self.follow else self.log.replay()
+
     def load_library(self): #same fn as bst but with error handling and insert w/o saving each time
-        """Load songs from JSON to the BST"""
-        if os.path.exists(self.storage_file):
+        """Load the snapshot, replay the mutation log on top, then build the BST."""
+        by_id = {}
+        if self.columnar and self.follow and not os.path.exists(self.storage_file):
+            records = self._records()  # nothing written yet
+        elif self.columnar:
+            if not os.path.exists(self.storage_file):
+                write_catalog(self.storage_file, [])
+            base = Catalog(self.storage_file)  # memory-mapped, sorted + unique already
+            records = list(self._records())
+            if not records:
+                self.bst.bulk_load(base)
+                return
+            by_id = {s.song_id: s for s in base}
+        elif os.path.exists(self.storage_file):
             with open(self.storage_file, "r", encoding="utf-8") as f:
                 try:
                     data = json.load(f)
@@ -29,49 +69,184 @@ class SongLibrary:
                 try:
                     song = Song.from_dict(song_data)
                     if song and song.song_id is not None:
-                        self.bst.insert(song)  # keyed by song_id under the hood
+                        by_id[song.song_id] = song
                 except Exception:
                     continue
+            records = self._records()
+        elif self.follow:
+            records = self._records()  # the writer hasn't created it yet
         else:
             # Create empty file if it doesn't exist
             with open(self.storage_file, "w", encoding="utf-8") as f:
                 json.dump([], f, indent=4, ensure_ascii=False)
+            records = self.log.replay()
+        for rec in records:
+            try:
+                if rec["op"] == "put":
+                    song = Song.from_dict(rec["song"])
+                    by_id[song.song_id] = song
+                elif rec["op"] == "del":
+                    by_id.pop(str(rec["song_id"]), None)
+            except Exception:
+                continue
+        self.bst.bulk_load(by_id.values())  # one balanced build instead of n inserts
 
     def save_library(self):
-        """Save all songs from BST to JSON."""
-        songs = self.bst.inorder()  # List of Song objects (sorted by song_id)
-        data = [song.to_dict() for song in songs]
-        with open(self.storage_file, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        """Write a full snapshot of all songs (atomically) and truncate the log."""
+        with span("library.save"):
+            with self.lock.read():
+                songs = self.bst.inorder()  # sorted by song_id
+            if self.columnar:
+                self.log.compact(lambda tmp: write_catalog(tmp, songs, atomic=False), self.storage_file)
+                return
+            data = [song.to_dict() for song in songs]
+            self.log.compact(lambda tmp: write_json(tmp, data, indent=4), self.storage_file)
+
+    def sync(self):
+        """Follower mode: apply the writer's log records since the last call; returns how many."""
+        records = self.follower.poll()
+        if records:
+            with self.lock.write():
+                for rec in records:
+                    try:
+                        if rec["op"] == "put":
+                            song = Song.from_dict(rec["song"])
+                            self.bst.insert(song)
+                            self._reindex(song.song_id, song)
+                        elif rec["op"] == "del":
+                            self.bst.delete(str(rec["song_id"]))
+                            self._reindex(str(rec["song_id"]), None)
+                    except Exception:
+                        continue
+        return len(records)
+
+    def _reindex(self, song_id, song):
+        """Keep the search index current (caller holds the write lock); song=None deletes."""
+        if self._search is not None:
+            if song is None:
+                self._search.remove(song_id)
+            else:
+                self._search.add(song)  # no-op when only the play count changed
+        elif self._search_pending is not None:
+            self._search_pending.append((song_id, song))
+
+    def _record(self, rec):
+        self.log.append(rec)
+        if self.log.due:
+            self.save_library()  # fold the log back into library.json
 
     def add_song(self, song: Song):
-        self.bst.insert(song)
-        self.save_library()
+        with self.lock.write():
+            self.bst.insert(song)
+            self._reindex(song.song_id, song)
+            self._record({"op": "put", "song": song.to_dict()})
+
+    def add_songs(self, songs, replace=False):
+        """Bulk insert; one log write for the whole batch. Songs whose id is already
+        in the library are skipped unless `replace`. Returns the songs inserted."""
+        added = []
+        with self.lock.write():
+            for song in songs:
+                if not replace and self.bst.find(song.song_id) is not None:
+                    continue
+                self.bst.insert(song)
+                self._reindex(song.song_id, song)
+                added.append(song)
+            if added:
+                self.log.append_many({"op": "put", "song": s.to_dict()} for s in added)
+                if self.log.due:
+                    self.save_library()
+        return added
 
     def delete_song(self, song_id: str):
-        self.bst.delete(str(song_id))
-        self.save_library()
+        with self.lock.write():
+            if self.bst.delete(str(song_id)):
+                self._reindex(str(song_id), None)
+                self._record({"op": "del", "song_id": str(song_id)})
 
     def search_song(self, song_id: str):
-        return self.bst.find(str(song_id))
+        with self.lock.read():
+            return self.bst.find(str(song_id))
+
+    def search_songs(self, song_ids):
+        """Songs for many ids under one lock acquisition (unknown ids are skipped)."""
+        with self.lock.read():
+            found = (self.bst.find(str(sid)) for sid in song_ids)
+            return [s for s in found if s is not None]
+
+    def all_songs(self):
+        """Every song, sorted by song_id (a list, safe to use after the lock is released)."""
+        with self.lock.read():
+            return self.bst.inorder()
+
+    def __len__(self):
+        return len(self.bst)
+
+    # ---- full-text search (search.py) ----
+    def build_search_index(self):
+        """Build the search index if it isn't yet. Tokenizing is the slow part, so
+        it runs off the lock on a snapshot; writes landing meanwhile are queued
+        and applied at the end. Concurrent callers wait for the one build."""
+        with self._search_build:
+            if self._search is not None:
+                return
+            with span("search.build"):
+                with self.lock.read():
+                    songs = self.bst.inorder()
+                    self._search_pending = []
+                index = SearchIndex()
+                index.rebuild(songs)
+                with self.lock.write():
+                    for song_id, song in self._search_pending:
+                        if song is None:
+                            index.remove(song_id)
+                        else:
+                            index.add(song)
+                    self._search, self._search_pending = index, None
+
+    def search(self, query: str, k: int = 20, prefix=True, fuzzy=False):
+        """[(song, score)] best first; see SearchIndex.search."""
+        if self._search is None:
+            self.build_search_index()
+        with self.lock.read():
+            hits = self._search.search(query, k, prefix=prefix, fuzzy=fuzzy)
+            return [(self.bst.find(song_id), score) for song_id, score in hits]
 
     # convenience helpers staying the same
     def get_all_by_artist(self, artist_name: str):
-        return self.bst.inorder() if artist_name == "*" else [
-            s for s in self.bst.inorder() if s.artist == artist_name
-        ]
+        with self.lock.read():
+            return self.bst.inorder() if artist_name == "*" else self.bst.get_all_by_artist(artist_name)
+
+    def get_all_by_genre(self, genre: str):
+        with self.lock.read():
+            return self.bst.get_all_by_genre(genre)
 
     def get_most_played(self, n: int):
-        all_songs = self.bst.inorder()
-        all_songs.sort(key=lambda song: song.plays, reverse=True)
-        return all_songs[:n]
+        with self.lock.read():
+            return self.bst.most_played(n)  # plays index, no full sort
+
+    def get_top_ranked(self, n: int):
+        with self.lock.read():
+            return self.bst.top_ranked(n)
+
+    def stats(self):
+        """Song / artist / play totals, kept up to date by the indexes (O(1))."""
+        with self.lock.read():
+            idx = self.bst.indexes
+            return {"songs": len(self.bst), "artists": idx.n_artists, "plays": idx.total_plays}
+
+    def page(self, sort="id", limit=50, after=None, artist=None, min_plays=0):
+        with self.lock.read():
+            return self.bst.page(sort, limit, after, artist, min_plays)
 
     def play_song(self, song_id: str):
-        song = self.bst.find(str(song_id))
-        if song:
-            song.plays = int(song.plays) + 1  # increments for a 'play'
-            # replace stored node value to be safe (same key)
-            self.bst.insert(song)
-            self.save_library()
-            return song
-        return None
+        with self.lock.write():
+            song = self.bst.find(str(song_id))
+            if song:
+                song.plays = int(song.plays) + 1  # increments for a 'play'
+                # replace stored node value to be safe (same key)
+                self.bst.insert(song)
+                # log the whole (small) record so replay stays idempotent
+                self._record({"op": "put", "song": song.to_dict()})
+                return song
+            return None
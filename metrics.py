@@ -0,0 +1,203 @@
+# metrics.py — in-process timings and counters, exported as Prometheus text
+# - span("stage") times a block into a histogram (musiclib_stage_seconds{stage=});
+#   inc() counts things; gauge() registers a callback read at scrape time, so
+#   sizes and counters other modules already keep (cache hits, library size)
+#   cost nothing until /metrics is asked for.
+# - Recording is a bisect and a few additions under one lock: cheap enough to
+#   leave on everywhere, including per-request hot paths.
+# - Profiler (off by default): MUSICLIB_PROFILE=<rate> or set_profile_rate()
+#   samples that fraction of requests; every span a sampled request passes
+#   through is also collected into its own breakdown, kept in a ring buffer
+#   (recent_profiles) and printed as one "[profile] {...}" line. While off a
+#   span does one extra contextvar read.
+# Numbers are per process: under serve.py every worker exports its own.
+
+from __future__ import annotations
+from bisect import bisect_left
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import json
+import os
+import random
+import threading
+import time
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "n")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last one is +Inf
+        self.total = 0.0
+        self.n = 0
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}  # name → (type, help)
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._hists: Dict[str, Dict[Labels, Histogram]] = {}
+        self._gauges: List[Tuple[str, str, Callable[[], Any]]] = []
+
+    def describe(self, name: str, kind: str, help: str) -> None:
+        self._help[name] = (kind, help)
+
+    def inc(self, name: str, n: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + n
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        i = bisect_left(BUCKETS, seconds)
+        with self._lock:
+            h = self._hists.setdefault(name, {}).get(key)
+            if h is None:
+                h = self._hists[name][key] = Histogram()
+            h.counts[i] += 1
+            h.total += seconds
+            h.n += 1
+
+    def gauge(self, name: str, fn: Callable[[], Any], help: str = "", kind: str = "gauge") -> None:
+        """Register a value read at scrape time: a number, or {label value: number}
+        for one label named after the part of `name` after the last "{"."""
+        self._gauges.append((name, kind, fn))
+        self._help[name.split("{")[0]] = (kind, help)
+
+    # ---- export -------------------------------------------------------------------
+    def render(self) -> str:
+        """Everything in the Prometheus text exposition format."""
+        out: List[str] = []
+        seen = set()
+
+        def header(name: str, default: str) -> None:
+            if name not in seen:
+                seen.add(name)
+                kind, text = self._help.get(name, (default, ""))
+                if text:
+                    out.append(f"# HELP {name} {text}")
+                out.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            hists = {name: {k: (list(h.counts), h.total, h.n) for k, h in series.items()}
+                     for name, series in self._hists.items()}
+        for name, series in sorted(counters.items()):
+            header(name, "counter")
+            for key, value in sorted(series.items()):
+                out.append(f"{name}{_labels(key)} {_num(value)}")
+        for name, series in sorted(hists.items()):
+            header(name, "histogram")
+            for key, (counts, total, n) in sorted(series.items()):
+                cum = 0
+                for bound, c in zip(BUCKETS + (float("inf"),), counts):
+                    cum += c
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    out.append(f"{name}_bucket{_labels(key + (('le', le),))} {cum}")
+                out.append(f"{name}_sum{_labels(key)} {_num(total)}")
+                out.append(f"{name}_count{_labels(key)} {n}")
+        for spec, kind, fn in self._gauges:
+            name, _, label = spec.partition("{")
+            try:
+                value = fn()
+            except Exception:
+                continue  # a broken callback shouldn't take the whole scrape down
+            if value is None:
+                continue
+            header(name, kind)
+            if isinstance(value, dict):
+                label = label.rstrip("}")
+                for k, v in sorted(value.items()):
+                    out.append(f"{name}{_labels(((label, str(k)),))} {_num(v)}")
+            else:
+                out.append(f"{name} {_num(value)}")
+        return "\n".join(out) + "\n"
+
+
+def _labels(key: Labels) -> str:
+    if not key:
+        return ""
+    esc = (str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, v in key)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(key, esc)) + "}"
+
+
+def _num(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+registry = Metrics()
+registry.describe("musiclib_stage_seconds", "histogram", "Time spent per instrumented stage")
+inc = registry.inc
+observe = registry.observe
+gauge = registry.gauge
+
+# ----------------------------------------------------------------------------
+# Spans + sampling profiler
+# ----------------------------------------------------------------------------
+PROFILE_KEEP = 200
+_profile_rate = float(os.environ.get("MUSICLIB_PROFILE", "0") or 0)
+_trace: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("musiclib_trace", default=None)
+recent_profiles: "deque[Dict[str, Any]]" = deque(maxlen=PROFILE_KEEP)
+
+
+class span:
+    """`with span("recommend.cf"):` — time the block into musiclib_stage_seconds."""
+    __slots__ = ("stage", "t0")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self) -> "span":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        dt = time.perf_counter() - self.t0
+        registry.observe("musiclib_stage_seconds", dt, stage=self.stage)
+        trace = _trace.get()
+        if trace is not None:
+            trace.append((self.stage, dt))
+
+
+def profile_rate() -> float:
+    return _profile_rate
+
+
+def set_profile_rate(rate: float) -> None:
+    """Fraction of requests to profile (0 = off, 1 = every request)."""
+    global _profile_rate
+    _profile_rate = min(max(float(rate), 0.0), 1.0)
+
+
+def start_profile() -> Optional[Any]:
+    """Per request: maybe start collecting spans; returns a token for finish_profile."""
+    if not _profile_rate or random.random() >= _profile_rate:
+        return None
+    return _trace.set([]), time.perf_counter()
+
+
+def finish_profile(token: Any, method: str, path: str, status: int) -> None:
+    ctx, t0 = token
+    total = time.perf_counter() - t0
+    trace = _trace.get() or []
+    _trace.reset(ctx)
+    stages: Dict[str, List[float]] = {}
+    for stage, dt in trace:
+        acc = stages.setdefault(stage, [0, 0.0])
+        acc[0] += 1
+        acc[1] += dt
+    entry = {
+        "time": time.time(), "method": method, "path": path, "status": status,
+        "total_ms": round(total * 1000, 3),
+        # spans can nest (recommend.cf contains recommend.mf), so these needn't sum to total
+        "stages": {s: {"calls": c, "ms": round(dt * 1000, 3)} for s, (c, dt) in stages.items()},
+    }
+    recent_profiles.append(entry)
+    print(f"[profile] {json.dumps(entry)}")
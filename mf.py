@@ -0,0 +1,235 @@
+# mf.py — implicit-feedback matrix factorisation (CPU, NumPy/SciPy only)
+# Implicit ALS (Hu, Koren & Volinsky): every user×item cell has preference
+# p = 1 if the user touched the item else 0, with confidence c = 1 + alpha*w
+# (w = LIKE_WEIGHT*likes + plays). Each half-step solves, for all users (or all
+# items) at once,
+#     (YᵀY + Yᵤᵀ(Cᵤ - I)Yᵤ + λI) xᵤ = Yᵤᵀ Cᵤ pᵤ
+# with a few steps of batched conjugate gradient. The products only ever touch
+# the nonzeros, so an iteration is O(nnz·f) with no Python loop per user.
+#
+# MFTrainer retrains in a background thread whenever the interaction store's
+# version moves, and publishes immutable MFModel snapshots. Readers grab
+# `trainer.model` once per request; swapping it is a single attribute store.
+
+from __future__ import annotations
+from typing import Callable, Dict, List, Optional, Tuple
+import os
+import threading
+import time
+
+import numpy as np
+from scipy import sparse
+
+from metrics import span
+from storage import atomic_replace
+
+
+def _expand_rows(indptr: np.ndarray) -> np.ndarray:
+    return np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+
+
+def _solve_side(C: sparse.csr_matrix, Y: np.ndarray, X: np.ndarray, reg: float,
+                cg_steps: int = 3, block_nnz: int = 1 << 20) -> np.ndarray:
+    """One ALS half-step: new X for the rows of confidence matrix C (data = c - 1), Y fixed."""
+    YtY = Y.T @ Y + reg * np.eye(Y.shape[1], dtype=np.float32)
+    X = X.copy()
+    n = C.shape[0]
+    # rows in blocks so the per-nonzero (nnz_block x f) temporaries stay bounded
+    start = 0
+    while start < n:
+        stop = int(np.searchsorted(C.indptr, C.indptr[start] + block_nnz, side="right")) - 1
+        stop = min(n, max(stop, start + 1))
+        Cb = C[start:stop]
+        rows = _expand_rows(Cb.indptr)
+        Yi = Y[Cb.indices]                                   # (nnz_b, f)
+        conf1 = Cb.data                                      # c - 1
+
+        def matvec(P):
+            # A p = (YᵀY + λI) p + Σ_i (c_i - 1) y_i (y_i · p)
+            dots = np.einsum("ij,ij->i", Yi, P[rows]) * conf1
+            W = sparse.csr_matrix((dots, Cb.indices, Cb.indptr), shape=Cb.shape)
+            return P @ YtY + W @ Y
+
+        # b = Σ_i c_i y_i  (preference is 1 on every stored cell)
+        B = sparse.csr_matrix((conf1 + 1.0, Cb.indices, Cb.indptr), shape=Cb.shape) @ Y
+        x = X[start:stop]
+        r = B - matvec(x)
+        p = r.copy()
+        rs = np.einsum("ij,ij->i", r, r)
+        for _ in range(cg_steps):
+            Ap = matvec(p)
+            a = rs / np.maximum(np.einsum("ij,ij->i", p, Ap), 1e-12)
+            x += a[:, None] * p
+            r -= a[:, None] * Ap
+            rs_new = np.einsum("ij,ij->i", r, r)
+            p = r + (rs_new / np.maximum(rs, 1e-12))[:, None] * p
+            rs = rs_new
+        X[start:stop] = x
+        start = stop
+    return X
+
+
+def train_als(weights: sparse.csr_matrix, factors: int = 32, iters: int = 10, reg: float = 0.1,
+              alpha: float = 10.0, seed: int = 0, init=None):
+    """Factorise a user×item implicit-weight matrix. Returns (user_factors, item_factors).
+
+    `init` = (user_factors, item_factors) warm-starts from a previous model
+    (rows beyond the old shape are initialised randomly).
+    """
+    rng = np.random.default_rng(seed)
+    n_users, n_items = weights.shape
+    X = (rng.standard_normal((n_users, factors)) * 0.01).astype(np.float32)
+    Y = (rng.standard_normal((n_items, factors)) * 0.01).astype(np.float32)
+    if init is not None:
+        u0, i0 = init
+        if u0.shape[1] == factors:
+            X[:len(u0)] = u0[:n_users]
+            Y[:len(i0)] = i0[:n_items]
+    Cu = weights.tocsr().astype(np.float32)
+    Cu.data = alpha * Cu.data          # stored as c - 1
+    Cu.eliminate_zeros()
+    Ci = Cu.T.tocsr()
+    for _ in range(iters):
+        X = _solve_side(Cu, Y, X, reg)
+        Y = _solve_side(Ci, X, Y, reg)
+    return X, Y
+
+
+class MFModel:
+    """Immutable factor snapshot, trained on interactions version `version`."""
+
+    def __init__(self, users: List[str], items: List[str], user_factors: np.ndarray,
+                 item_factors: np.ndarray, version: int = 0, reg: float = 0.1, alpha: float = 10.0):
+        self.users = users
+        self.items = items
+        self.user_idx: Dict[str, int] = {u: i for i, u in enumerate(users)}
+        self.item_idx: Dict[str, int] = {s: i for i, s in enumerate(items)}
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.version = version
+        self.reg = reg
+        self.alpha = alpha
+        self.trained_at = time.time()
+        self._YtY = item_factors.T @ item_factors
+
+    @property
+    def factors(self) -> int:
+        return self.item_factors.shape[1]
+
+    def fold_in(self, item_rows: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """Exact ALS user vector for a set of (item row, weight) pairs, items held fixed.
+
+        Lets a user's newest events count before the next retrain.
+        """
+        Yu = self.item_factors[item_rows]
+        c1 = (self.alpha * np.asarray(weights, dtype=np.float32))[:, None]
+        A = self._YtY + Yu.T @ (c1 * Yu) + self.reg * np.eye(self.factors, dtype=np.float32)
+        b = ((c1 + 1.0) * Yu).sum(axis=0)
+        return np.linalg.solve(A, b).astype(np.float32)
+
+    def scores(self, user_vector: np.ndarray) -> np.ndarray:
+        """Dot product of a user vector with every item factor (aligned to self.items)."""
+        return self.item_factors @ user_vector
+
+    def align(self, row: Callable[[str], Optional[int]]) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, factor rows) of the items `row` (song id → row, e.g.
+        ContentSnapshot.row) knows: one lookup per factor row, not per song."""
+        pairs = [(r, f) for f, r in enumerate(map(row, self.items)) if r is not None]
+        rows = np.fromiter((p[0] for p in pairs), np.int64, len(pairs))
+        cols = np.fromiter((p[1] for p in pairs), np.int64, len(pairs))
+        return rows, cols
+
+    # ---- persistence ---------------------------------------------------------
+    def save(self, path: str) -> None:
+        def write(tmp):
+            with open(tmp, "wb") as f:
+                np.savez(f, users=np.array(self.users, dtype=str), items=np.array(self.items, dtype=str),
+                         user_factors=self.user_factors, item_factors=self.item_factors,
+                         meta=np.array([self.version, self.reg, self.alpha], dtype=np.float64))
+                f.flush()
+                os.fsync(f.fileno())
+        atomic_replace(write, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["MFModel"]:
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as z:
+            version, reg, alpha = z["meta"]
+            return cls([str(u) for u in z["users"]], [str(s) for s in z["items"]],
+                       z["user_factors"], z["item_factors"], int(version), float(reg), float(alpha))
+
+
+class MFTrainer:
+    """Background retraining over an InteractionStore; publishes MFModel snapshots."""
+
+    def __init__(self, store, factors: int = 32, iters: int = 10, reg: float = 0.1,
+                 alpha: float = 10.0, path: Optional[str] = None):
+        self.store = store
+        self.factors = factors
+        self.iters = iters
+        self.reg = reg
+        self.alpha = alpha
+        self.path = path  # optional .npz so restarts don't start cold
+        self.model: Optional[MFModel] = MFModel.load(path) if path else None
+        self.listeners: List[Callable[[], None]] = []  # called after each swap
+        self.last_train_s = 0.0
+        self.trained_version = -1  # store.version of the last train() in this process
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    @property
+    def stale(self) -> bool:
+        return self.trained_version != self.store.version
+
+    def train(self) -> Optional[MFModel]:
+        """Retrain now (warm-started from the current snapshot) and swap it in."""
+        with self._lock:
+            version = self.store.version
+            weights = self.store.weights()
+            # ids are append-only; slice to the matrix in case events landed meanwhile
+            users = self.store.users[:weights.shape[0]]
+            items = self.store.items[:weights.shape[1]]
+            self.trained_version = version
+            if weights.nnz == 0:
+                return self.model
+            t0 = time.perf_counter()
+            old = self.model
+            init = None
+            if old is not None and old.users == users[:len(old.users)] and old.items == items[:len(old.items)]:
+                init = (old.user_factors, old.item_factors)  # same ids → rows line up
+            with span("mf.train"):
+                X, Y = train_als(weights, self.factors, self.iters, self.reg, self.alpha, init=init)
+            self.last_train_s = time.perf_counter() - t0
+            model = MFModel(users, items, X, Y, version, self.reg, self.alpha)
+            self.model = model
+            if self.path:
+                model.save(self.path)
+        for fn in self.listeners:
+            fn()
+        return model
+
+    def start(self, interval_s: float) -> None:
+        """Retrain every `interval_s` seconds while the interactions keep changing."""
+        if interval_s <= 0:
+            return
+
+        def loop():
+            while not self._stop.wait(interval_s):
+                if self.stale:
+                    try:
+                        self.train()
+                    except Exception as e:  # keep serving the old snapshot
+                        print(f"[mf] training failed: {e}")
+
+        threading.Thread(target=loop, daemon=True).start()
+
+    def reload(self) -> None:
+        """Swap in the model another process last saved to `path` (reader workers
+        don't train, they follow the writer's mf.npz)."""
+        model = MFModel.load(self.path) if self.path else None
+        if model is not None:
+            self.model = model
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,421 @@
+# neighbours.py — item-item neighbour tables (top-M most similar songs per song)
+# Built from the content matrix in row blocks so the dense similarity block
+# (block_rows x n_songs floats) stays under a memory budget.
+#
+# - NeighbourCache: in-memory sparse table for CF scoring
+# - SimilarTable: on-disk (memory-mapped) top-K per song for /similar, built by
+#   a process pool and patched in place as songs are added
+
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+import json
+import multiprocessing
+import os
+import threading
+
+import numpy as np
+from scipy import sparse
+
+from storage import atomic_replace, write_json
+
+
+def block_rows_for(n_items: int, budget_mb: float) -> int:
+    """How many rows of dense similarities fit in `budget_mb` MiB."""
+    return max(1, int(budget_mb * 2 ** 20 // (4 * max(n_items, 1))))
+
+
+def topm_block(matrix: sparse.csr_matrix, alive: np.ndarray, start: int, stop: int, m: int):
+    """Top-m neighbours for rows [start, stop): returns (idx, sims), each (stop-start, m)."""
+    sims = (matrix[start:stop] @ matrix.T).toarray().astype(np.float32)
+    sims[:, ~alive] = -1.0
+    sims[np.arange(stop - start), np.arange(start, stop)] = -1.0  # not your own neighbour
+    m = min(m, sims.shape[1])
+    idx = np.argpartition(-sims, m - 1, axis=1)[:, :m]
+    top = np.take_along_axis(sims, idx, axis=1)
+    order = np.argsort(-top, axis=1)
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(top, order, axis=1)
+
+
+def build_neighbour_table(matrix: sparse.csr_matrix, alive: np.ndarray, m: int = 50,
+                          budget_mb: float = 256.0) -> sparse.csr_matrix:
+    """Sparse (n x n) table with T[i, j] = cos(i, j) for j in the top-m of i (positive sims only)."""
+    n = matrix.shape[0]
+    step = block_rows_for(n, budget_mb)
+    rows, cols, vals = [], [], []
+    for start in range(0, n, step):
+        stop = min(n, start + step)
+        idx, top = topm_block(matrix, alive, start, stop, m)
+        keep = (top > 0) & alive[start:stop, None]
+        r = np.broadcast_to(np.arange(start, stop)[:, None], idx.shape)
+        rows.append(r[keep])
+        cols.append(idx[keep])
+        vals.append(top[keep])
+    if not rows:
+        return sparse.csr_matrix((n, n), dtype=np.float32)
+    return sparse.csr_matrix(
+        (np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(n, n), dtype=np.float32,
+    )
+
+
+class NeighbourCache:
+    """Holds a neighbour table for one content-model version; rebuilds in the background."""
+
+    def __init__(self, m: int = 50, budget_mb: float = 256.0):
+        self.m = m
+        self.budget_mb = budget_mb
+        self.table: Optional[sparse.csr_matrix] = None
+        self.version = -1  # ContentModel.version the table matches
+        self._building = False
+
+    def get(self, version: int) -> Optional[sparse.csr_matrix]:
+        """The table if it matches `version`, else None (caller falls back to exact scoring)."""
+        return self.table if self.version == version else None
+
+    def refresh_async(self, model) -> None:
+        """Rebuild for the model's current version unless already fresh/in progress."""
+        if self._building or self.version == model.version:
+            return
+        self._building = True
+
+        def run():
+            try:
+                for _ in range(3):  # content changed mid-build → retry with the newer matrix
+                    version, matrix = model.version, model.matrix
+                    if matrix is None:
+                        return
+                    table = build_neighbour_table(matrix, model.alive.copy(), self.m, self.budget_mb)
+                    if version == model.version:
+                        self.table, self.version = table, version
+                        return
+            finally:
+                self._building = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+
+# ---- on-disk top-K table for /similar ------------------------------------------
+# Files: <path>.idx.npy (n x K int32 rows; -1 = empty, -2 = dropped), <path>.sim.npy (n x K
+# float32, best first) and <path>.json ({"k", "ids"}: the content rows the table
+# was built for). Opened with mmap_mode="r", so a lookup reads one row.
+
+_pool_matrix: Optional[sparse.csr_matrix] = None
+_pool_alive: Optional[np.ndarray] = None
+
+
+def _pool_init(matrix: sparse.csr_matrix, alive: np.ndarray) -> None:
+    global _pool_matrix, _pool_alive
+    _pool_matrix, _pool_alive = matrix, alive
+
+
+def _pool_block(span: Tuple[int, int], k: int):
+    idx, top = topm_block(_pool_matrix, _pool_alive, span[0], span[1], k)
+    return span, idx, top
+
+
+def build_topk(matrix: sparse.csr_matrix, alive: np.ndarray, k: int, out_idx: np.ndarray,
+               out_sim: np.ndarray, budget_mb: float = 256.0, workers: int = 1) -> None:
+    """Fill out_idx/out_sim (n x k) with each row's top-k neighbours.
+
+    Row blocks are spread over `workers` processes, each block sized so all
+    workers together stay within `budget_mb` of dense similarities.
+    """
+    n = matrix.shape[0]
+    step = block_rows_for(n, budget_mb / max(workers, 1))
+    spans = [(start, min(n, start + step)) for start in range(0, n, step)]
+
+    def store(span, idx, top):
+        start, stop = span
+        bad = ~alive[idx] | (top < 0)  # dead rows / self
+        out_idx[start:stop, :idx.shape[1]] = np.where(bad, -1, idx)
+        out_sim[start:stop, :idx.shape[1]] = np.where(bad, -1.0, top)
+
+    if workers <= 1 or len(spans) == 1:
+        for span in spans:
+            store(span, *topm_block(matrix, alive, span[0], span[1], k))
+        return
+    # spawn, not fork: the API process has live threads
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=ctx, initializer=_pool_init,
+                             initargs=(matrix, alive)) as pool:
+        for span, idx, top in pool.map(_pool_block, spans, [k] * len(spans)):
+            store(span, idx, top)
+
+
+class SimilarTable:
+    """Precomputed top-K similar songs per content row, memory-mapped from disk.
+
+    New rows are patched into a small in-memory overlay (their own list, plus
+    any existing list they now belong to); deleted rows are filtered out on
+    lookup. Lookups return None when the table can't answer exactly, so the
+    caller falls back to scoring.
+
+    A `read_only` table (reader workers) only maps files another process wrote:
+    it patches new rows in memory but never writes or rebuilds.
+    """
+
+    def __init__(self, path: str, k: int = 50, budget_mb: float = 256.0, workers: int = 0,
+                 read_only: bool = False):
+        self.path = path
+        self.k = k
+        self.budget_mb = budget_mb
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.read_only = read_only
+        self._opened_mtime = 0.0  # of the .json we last open()ed
+        self._tried = (0.0, -1)     # (.json mtime, model version) of the last open() attempt
+        self.epoch = -1    # ContentModel.epoch the rows line up with
+        self.version = -1  # ContentModel.version it was built from
+        self._idx: Optional[np.ndarray] = None
+        self._sim: Optional[np.ndarray] = None
+        self._kth = np.zeros(0, dtype=np.float32)  # weakest kept sim per row (patch threshold)
+        self._rows = 0  # rows covered (file rows + patched-in new rows)
+        self._patched: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        self._lock = threading.RLock()
+        self._building = False
+        self._patch_lock = threading.Lock()  # one patch() at a time
+        self._patching = False      # a patch_async() thread is running
+        self._patch_wanted = False  # ... and should go round once more
+        self.listeners: List[Callable[[], None]] = []  # called after a background patch added rows
+
+    def __len__(self) -> int:
+        return self._rows
+
+    # ---- files ------------------------------------------------------------------
+    def _tmp_arrays(self, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Fresh n x K arrays, memory-mapped onto temp files next to the table."""
+        idx = np.lib.format.open_memmap(self.path + ".idx.npy.tmp", mode="w+", dtype=np.int32,
+                                        shape=(n, self.k))
+        sim = np.lib.format.open_memmap(self.path + ".sim.npy.tmp", mode="w+", dtype=np.float32,
+                                        shape=(n, self.k))
+        idx[:], sim[:] = -1, -1.0
+        return idx, sim
+
+    def _commit(self, idx: np.ndarray, sim: np.ndarray, ids: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Move the temp arrays into place; returns read-only maps of the new files."""
+        idx.flush()
+        sim.flush()
+        del idx, sim
+        # data files first, meta last: a crash in between leaves a table open() rejects
+        os.replace(self.path + ".idx.npy.tmp", self.path + ".idx.npy")
+        os.replace(self.path + ".sim.npy.tmp", self.path + ".sim.npy")
+        atomic_replace(lambda tmp: write_json(tmp, {"k": self.k, "ids": ids}, indent=None),
+                       self.path + ".json")
+        return (np.load(self.path + ".idx.npy", mmap_mode="r"),
+                np.load(self.path + ".sim.npy", mmap_mode="r"))
+
+    def open(self, model) -> bool:
+        """Use the saved table if it covers every song in the model (or all but a
+        few appended since, which are patched in).
+
+        A table saved from a model with tombstones (or different row order) is
+        renumbered to the model's rows once and written back; neighbours that
+        no longer exist become -2 ("was here", so lookups know the list is cut).
+        """
+        try:
+            mtime = os.path.getmtime(self.path + ".json")
+            with open(self.path + ".json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            idx = np.load(self.path + ".idx.npy", mmap_mode="r")
+            sim = np.load(self.path + ".sim.npy", mmap_mode="r")
+        except (OSError, ValueError):
+            return False
+        self._tried = (mtime, model.version)
+        saved = meta.get("ids") or []
+        if meta.get("k") != self.k or idx.shape != sim.shape or idx.shape != (len(saved), self.k):
+            return False
+        with model._lock:
+            ids, epoch, version = list(model.idx_to_id), model.epoch, model.version
+        # a few rows appended since the save are cheaper to patch in (below) than to rebuild
+        appended = bool(saved) and saved == ids[:len(saved)] and len(ids) - len(saved) <= max(1024, len(saved) // 10)
+        if saved != ids and not appended:
+            if self.read_only:
+                return False
+            pos = {sid: i for i, sid in enumerate(saved)}  # a replaced song's newest row wins
+            old_rows = np.array([pos.get(sid, -1) for sid in ids], dtype=np.int64)
+            if not len(ids) or (old_rows < 0).any():
+                return False  # songs the table never saw: rebuild
+            new_of_old = np.full(len(saved), -2, dtype=np.int32)
+            new_of_old[old_rows] = np.arange(len(ids), dtype=np.int32)
+            old_idx = np.asarray(idx)[old_rows]
+            out_idx, out_sim = self._tmp_arrays(len(ids))
+            out_idx[:] = np.where(old_idx >= 0, new_of_old[old_idx], old_idx)
+            out_sim[:] = np.asarray(sim)[old_rows]
+            idx, sim = self._commit(out_idx, out_sim, ids)
+        with model._lock:
+            if model.epoch != epoch or model.idx_to_id[:len(ids)] != ids:
+                return False
+            self._swap(idx, sim, epoch, version)
+            self._opened_mtime = mtime
+        self.patch(model)
+        return True
+
+    def changed_on_disk(self, model) -> bool:
+        """True if another process wrote a table we haven't opened yet, and haven't
+        already failed to open against this version of the model (a table built
+        from rows we haven't seen yet opens once we have)."""
+        try:
+            mtime = os.path.getmtime(self.path + ".json")
+        except OSError:
+            return False
+        return mtime != self._opened_mtime and (mtime, model.version) != self._tried
+
+    def _swap(self, idx: np.ndarray, sim: np.ndarray, epoch: int, version: int) -> None:
+        with self._lock:
+            self._idx, self._sim = idx, sim
+            self._kth = np.array(sim[:, -1], dtype=np.float32) if len(sim) else np.zeros(0, np.float32)
+            self._rows = len(self._kth)
+            self._patched = {}
+            self.epoch, self.version = epoch, version
+
+    def build(self, model) -> bool:
+        """Recompute the whole table from the model's matrix and write it to disk."""
+        with model._lock:
+            version, epoch = model.version, model.epoch
+            matrix, alive, ids = model.matrix, model.alive.copy(), list(model.idx_to_id)
+            if matrix is None:
+                return False
+            matrix = matrix.copy()  # the model's buffers keep changing under us
+        out_idx, out_sim = self._tmp_arrays(matrix.shape[0])
+        build_topk(matrix, alive, self.k, out_idx, out_sim, self.budget_mb, self.workers)
+        idx, sim = self._commit(out_idx, out_sim, ids)
+        with model._lock:
+            if model.epoch != epoch:
+                return False  # rows renumbered meanwhile; the next refresh rebuilds
+            self._swap(idx, sim, epoch, version)
+        self.patch(model)  # rows appended during the build
+        return True
+
+    def save(self, model) -> None:
+        """Write patched rows back to disk so a restart can open() instead of rebuilding."""
+        with model._lock, self._lock:
+            if self.read_only or self._idx is None or not self._patched or model.epoch != self.epoch:
+                return
+            n, n_file = self._rows, len(self._idx)
+            out_idx, out_sim = self._tmp_arrays(n)
+            out_idx[:n_file], out_sim[:n_file] = self._idx, self._sim
+            for i, (row_idx, row_sim) in self._patched.items():
+                out_idx[i], out_sim[i] = row_idx, row_sim
+            idx, sim = self._commit(out_idx, out_sim, list(model.idx_to_id[:n]))
+            self._idx, self._sim, self._patched = idx, sim, {}
+
+    def refresh_async(self, model) -> None:
+        """Rebuild in a background thread unless fresh or already building."""
+        if self.read_only or self._building or self.version == model.version:
+            return
+        self._building = True
+
+        def run():
+            try:
+                self.build(model)
+            except Exception as e:  # keep serving the old table / exact scoring
+                print(f"[similar] table build failed: {e}")
+            finally:
+                self._building = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    # ---- incremental updates ------------------------------------------------------
+    def _row(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        got = self._patched.get(i)
+        if got is not None:
+            return got
+        return np.asarray(self._idx[i]), np.asarray(self._sim[i])
+
+    def patch(self, model) -> int:
+        """Fold content rows appended since the last build/patch into the table;
+        returns how many rows were added.
+
+        Similarities of the new rows against everything come from one sparse
+        product per chunk of rows; each new row gets its own top-K list and is
+        inserted into the existing lists it now beats the K-th entry of. The
+        products run without the model's lock (rows never move within an
+        epoch); each chunk is applied under the table's lock, and dropped if
+        the table was swapped meanwhile.
+        """
+        with self._patch_lock:
+            with model._lock:
+                if self._idx is None or model.epoch != self.epoch or self._rows >= model._n:
+                    return 0
+                matrix, alive, epoch = model.matrix, model.alive.copy(), model.epoch
+            n, first = matrix.shape[0], self._rows
+            step = block_rows_for(n, self.budget_mb)
+            for start in range(first, n, step):
+                stop = min(n, start + step)
+                block = (matrix @ matrix[start:stop].T).toarray().astype(np.float32)  # (n, rows)
+                block[~alive] = -1.0
+                with self._lock:
+                    if self.epoch != epoch or self._rows != start:
+                        return start - first  # swapped by open()/build()
+                    if len(self._kth) < n:
+                        kth = np.full(n, -1.0, dtype=np.float32)
+                        kth[:start] = self._kth[:start]
+                        self._kth = kth
+                    for c, r in enumerate(range(start, stop)):
+                        self._add_row(r, block[:, c], alive)
+            return n - first
+
+    def patch_async(self, model) -> None:
+        """patch() in a background thread, so a song write doesn't wait for a
+        product over the whole library. Calls made while one runs fold into a
+        single extra pass; rows not patched in yet make lookup() return None,
+        and the caller scores them from the live model."""
+        with self._lock:
+            self._patch_wanted = True
+            if self._patching:
+                return
+            self._patching = True
+
+        def run():
+            while True:
+                with self._lock:
+                    if not self._patch_wanted:
+                        self._patching = False
+                        return
+                    self._patch_wanted = False
+                try:
+                    added = self.patch(model)
+                except Exception as e:  # lookups keep falling back to scoring
+                    print(f"[similar] patch failed: {e}")
+                    added = 0
+                if added:
+                    for fn in self.listeners:
+                        fn()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _add_row(self, r: int, sims: np.ndarray, alive: np.ndarray) -> None:
+        # rows after r aren't in the table yet; they'll insert themselves into r's list
+        sims = sims[:r]
+        own_idx = np.full(self.k, -1, dtype=np.int32)
+        own_sim = np.full(self.k, -1.0, dtype=np.float32)
+        if alive[r] and r:
+            k = min(self.k, r)
+            idx = np.argpartition(-sims, k - 1)[:k]
+            idx = idx[np.argsort(-sims[idx], kind="stable")]
+            idx = idx[sims[idx] >= 0]
+            own_idx[:len(idx)], own_sim[:len(idx)] = idx, sims[idx]
+            # existing lists r now belongs in
+            for j in np.flatnonzero((sims > self._kth[:r]) & alive[:r]):
+                j_idx, j_sim = self._row(j)
+                at = int(np.searchsorted(-j_sim, -sims[j], side="right"))
+                self._patched[int(j)] = (np.insert(j_idx, at, r)[:self.k].astype(np.int32),
+                                         np.insert(j_sim, at, sims[j])[:self.k].astype(np.float32))
+                self._kth[j] = self._patched[int(j)][1][-1]
+        self._patched[r] = (own_idx, own_sim)
+        self._kth[r] = own_sim[-1]
+        self._rows = r + 1
+
+    # ---- lookups ---------------------------------------------------------------------
+    def lookup(self, row: int, k: int, alive: np.ndarray, epoch: int) -> Optional[List[int]]:
+        """Top-k live neighbour rows of `row`, or None if the table can't tell."""
+        with self._lock:
+            if self._idx is None or epoch != self.epoch or k > self.k or row >= self._rows:
+                return None
+            idx, _ = self._row(row)
+        cut = (idx != -1).all()  # a full list (or one that lost entries) may have more beyond it
+        idx = idx[idx >= 0]
+        idx = idx[alive[idx]]
+        if len(idx) < k and cut:
+            return None  # deletions ate into the list; beyond it we don't know
+        return idx[:k].tolist()
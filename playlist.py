@@ -0,0 +1,117 @@
+# playlist.py — named playlists as ordered sets, persisted as snapshot + log
+# Each playlist is a dict used as an ordered set (song_id → None): membership,
+# add and remove are O(1) and iteration keeps insertion order. The snapshot is
+# {name: [song_id, ...]}; the old single-playlist file ([song_id, ...]) loads
+# as the DEFAULT playlist, and old log records without a playlist name apply to
+# it too.
+
+from __future__ import annotations
+from typing import Any, Dict, List
+import threading
+
+from storage import DEFAULT_COMPACT_EVERY, JsonStore
+
+DEFAULT = "default"
+
+
+def _decode(raw: Any) -> Dict[str, Dict[str, None]]:
+    if isinstance(raw, list):  # legacy single playlist
+        raw = {DEFAULT: raw}
+    out = {name: dict.fromkeys(ids) for name, ids in (raw or {}).items()}
+    out.setdefault(DEFAULT, {})
+    return out
+
+
+def _encode(data: Dict[str, Dict[str, None]]) -> Dict[str, List[str]]:
+    return {name: list(ids) for name, ids in data.items()}
+
+
+def _apply(data: Dict[str, Dict[str, None]], rec: Dict[str, Any]) -> None:
+    op, name = rec.get("op"), rec.get("p", DEFAULT)
+    if op == "add":
+        data.setdefault(name, {})[rec["k"]] = None
+    elif op == "remove":
+        data.get(name, {}).pop(rec["k"], None)
+    elif op == "drop":  # delete a whole playlist
+        if name == DEFAULT:
+            data[DEFAULT] = {}
+        else:
+            data.pop(name, None)
+
+
+class Playlists:
+    """Named, ordered playlists of song ids; thread-safe."""
+
+    def __init__(self, path: str, compact_every: int = DEFAULT_COMPACT_EVERY, follow: bool = False):
+        self.store = JsonStore(path, {DEFAULT: []}, _apply, compact_every=compact_every,
+                               decode=_decode, encode=_encode, follow=follow)
+        self._lock = threading.Lock()
+
+    def sync(self) -> int:
+        """Replica mode (follow=True): apply the writer process's latest changes."""
+        with self._lock:
+            return self.store.sync()
+
+    @property
+    def _data(self) -> Dict[str, Dict[str, None]]:
+        return self.store.data
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return list(self._data)
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return {name: len(ids) for name, ids in self._data.items()}
+
+    def __len__(self) -> int:
+        """Songs in the default playlist."""
+        return len(self._data[DEFAULT])
+
+    def exists(self, name: str) -> bool:
+        return name in self._data
+
+    def contains(self, name: str, song_id: str) -> bool:
+        return song_id in self._data.get(name, ())
+
+    def ids(self, name: str = DEFAULT) -> List[str]:
+        """The playlist's song ids in order: a snapshot (just references, 8 bytes a
+        song), safe to iterate while the playlist changes."""
+        with self._lock:
+            return list(self._data.get(name, ()))
+
+    def add(self, song_id: str, name: str = DEFAULT) -> int:
+        with self._lock:
+            if song_id not in self._data.get(name, ()):
+                self.store.record({"op": "add", "k": song_id, "p": name})
+            return len(self._data[name])
+
+    def remove(self, song_id: str, name: str = DEFAULT) -> int:
+        with self._lock:
+            ids = self._data.get(name, {})
+            if song_id in ids:
+                self.store.record({"op": "remove", "k": song_id, "p": name})
+            return len(ids)
+
+    def remove_everywhere(self, song_id: str) -> None:
+        """Take a deleted song out of every playlist."""
+        with self._lock:
+            for name, ids in list(self._data.items()):
+                if song_id in ids:
+                    self.store.record({"op": "remove", "k": song_id, "p": name})
+
+    def drop(self, name: str) -> bool:
+        """Delete a playlist (the default one is only emptied)."""
+        with self._lock:
+            if name not in self._data:
+                return False
+            self.store.record({"op": "drop", "p": name})
+            return True
+
+    @property
+    def unsaved(self) -> bool:
+        return self.store.unsaved
+
+    def save(self) -> None:
+        with self._lock:
+            self.store.save()
@@ -0,0 +1,317 @@
+# recommend.py — offline batch recommendations (e.g. a nightly precompute for every user)
+# Run from the repo root, against the API's data dir (same MUSICLIB_DATA /
+# MUSICLIB_LIBRARY / MUSICLIB_CONTENT_DIR variables):
+#   python recommend.py --user-id alice --topk 10 --stdout   → JSON lines on stdout
+#   python recommend.py --topk 20 --workers 4                → every user, into ./output/
+#   python recommend.py --seed-id 3135556 --topk 10          → similar songs per seed song
+# - Everything is opened read-only (the stores as followers, like a reader
+#   worker), so it can run next to a live server. The content model is the one
+#   the server saved (content/), caught up with library changes since; MF
+#   factors come from mf.npz. Nothing is fitted per user.
+# - Users are scored in blocks: content and item-kNN CF for a whole block is
+#   one pass over the content matrix (recommender.*_block), MF one matrix
+#   product; blocks are sized so the dense (users x songs) arrays stay within
+#   --budget-mb per worker.
+# - Users are cut into chunks of --chunk. A process pool scores chunks, each
+#   written to its own part file (output/recs.00000.ndjson, ...) and renamed
+#   into place when complete. Workers are forked where possible, so the matrix
+#   and factors are shared copy-on-write instead of copied. Rerunning with the
+#   same arguments skips the parts already there, so an interrupted run resumes
+#   (--overwrite starts over).
+# Scores match GET /recommendations and /similar's exact search for the same
+# data, except that CF always uses full item-kNN, never the MUSICLIB_CF_NEIGHBOURS table.
+
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+import zlib
+
+import numpy as np
+from scipy import sparse
+
+import recommender
+from content import ContentModel, ContentSnapshot, song_popularity, song_text
+from interactions import InteractionStore
+from library import SongLibrary
+from mf import MFModel
+from neighbours import block_rows_for
+from storage import atomic_replace, load_json, write_json
+
+DATA_DIR = os.environ.get("MUSICLIB_DATA", ".")
+LIB_PATH = os.path.join(DATA_DIR, os.environ.get("MUSICLIB_LIBRARY", "library.json"))
+INTERACTIONS_PATH = os.path.join(DATA_DIR, "interactions.npz")
+CONTENT_DIR = os.environ.get("MUSICLIB_CONTENT_DIR") or os.path.join(DATA_DIR, "content")
+MF_PATH = os.path.join(DATA_DIR, "mf.npz")
+DENSE_ARRAYS = 8  # (users x songs) arrays alive at once while scoring a block
+
+
+def log(msg: str) -> None:
+    print(f"[recommend] {msg}", file=sys.stderr, flush=True)
+
+
+def load_content(library: SongLibrary) -> ContentModel:
+    """The server's saved model, caught up with the library (as api.load_content
+    does, minus the save); a fresh fit when there is none or most songs changed."""
+    model = ContentModel(drift=float("inf"))  # no background refresh threads: we fork
+    items = [(s.song_id, song_text(s), song_popularity(s)) for s in library.all_songs()]
+    if model.load(CONTENT_DIR):
+        changed, gone = model.diff(items)
+        if len(changed) + len(gone) <= len(items) // 4:
+            for sid in gone:
+                model.remove(sid)
+            for it in changed:
+                model.add(*it)
+            if changed or gone:
+                model.refresh()  # the IDF the server would move to next
+            return model
+    log("no usable saved content model, fitting the library")
+    model.fit(items)
+    return model
+
+
+def _selection(ids: Sequence[str], lookup: Callable[[str], Optional[int]], n: int) -> sparse.csr_matrix:
+    """(len(ids) x n) 0/1 matrix taking a column per id to its `lookup` column."""
+    pairs = [(r, c) for r, c in ((r, lookup(sid)) for r, sid in enumerate(ids)) if c is not None]
+    rows = np.array([p[0] for p in pairs], dtype=np.int64)
+    cols = np.array([p[1] for p in pairs], dtype=np.int64)
+    return sparse.csr_matrix((np.ones(len(pairs), dtype=np.float32), (rows, cols)), shape=(len(ids), n))
+
+
+class Job:
+    """Everything a worker needs, built once in the parent. Under fork the
+    workers share it; under spawn it's pickled to each (see _pool_init)."""
+
+    def __init__(self, snap: ContentSnapshot, keys: List[str], seeds: sparse.csr_matrix,
+                 mf: Optional[MFModel], mf_seeds: Optional[sparse.csr_matrix], args: argparse.Namespace):
+        self.matrix = snap.matrix
+        self.alive = np.asarray(snap.alive)
+        self.pop = np.asarray(snap.popularity, dtype=np.float32)
+        self.ids = snap.idx_to_id
+        self.keys = keys          # user ids (or seed song ids), one per row of `seeds`
+        self.seeds = seeds        # (keys x songs) interaction weights, or the seed rows
+        self.mf = mf
+        self.mf_seeds = mf_seeds  # (keys x MF items) interaction weights
+        self.similar = args.seed_id is not None or args.seed_file is not None
+        self.topk, self.alpha, self.beta, self.gamma = args.topk, args.alpha, args.beta, args.gamma
+        self.chunk, self.format, self.out = args.chunk, args.format, args.out
+        self.block = max(1, block_rows_for(len(self.ids), args.budget_mb / DENSE_ARRAYS))
+        self.mf_rows = self.mf_cols = self.mf_known = None
+        if mf is not None:  # content rows ↔ factor rows of the songs both know (api._mf_alignment)
+            self.mf_rows, self.mf_cols = mf.align(snap.row)
+            self.mf_known = np.zeros(len(self.alive), dtype=bool)
+            self.mf_known[self.mf_rows] = True
+
+    @property
+    def name(self) -> str:
+        return "similar" if self.similar else "recs"
+
+    def n_chunks(self) -> int:
+        return -(-len(self.keys) // self.chunk)
+
+    def part_path(self, chunk: int) -> str:
+        return os.path.join(self.out, f"{self.name}.{chunk:05d}.{self.format}")
+
+    # ---- scoring ------------------------------------------------------------------
+    def score_block(self, start: int, stop: int):
+        """(top song rows, their scores) for keys[start:stop]; -inf marks padding."""
+        seeds = self.seeds[start:stop]
+        seen = (seeds != 0).toarray()
+        mask = self.alive[None, :] & ~seen
+        if self.similar:  # /similar: cosine to the seed song (rows are unit length)
+            scores = recommender.cf_scores_block(self.matrix, seeds)
+        else:  # /recommendations: api.hybrid_recommend, a block of users at a time
+            scores = np.zeros(seen.shape, dtype=np.float32)
+            has_seeds = seen.any(axis=1)
+            if self.alpha:
+                scores += np.float32(self.alpha) * recommender.content_scores_block(self.matrix, seeds)
+            if self.beta:
+                scores += np.float32(self.beta) * self._cf(start, stop, seeds, mask) * has_seeds[:, None]
+            if self.gamma:
+                scores += np.float32(self.gamma) * self.pop[None, :]
+        scores[~mask] = -np.inf
+        top = recommender.top_k_rows(scores, self.topk)
+        return top, np.take_along_axis(scores, top, axis=1)
+
+    def _cf(self, start: int, stop: int, seeds: sparse.csr_matrix, mask: np.ndarray) -> np.ndarray:
+        """api.cf_item_score_array per row: item-kNN, replaced by MF for the songs
+        the model knows in the rows of users it can fold in."""
+        knn = recommender.cf_scores_block(self.matrix, seeds)
+        if self.mf is None:
+            return recommender.minmax_rows(knn, mask)
+        mf = np.zeros(mask.shape, dtype=np.float32)
+        use_mf = np.zeros(mask.shape[0], dtype=bool)
+        known = self.mf_seeds[start:stop]
+        for u in range(mask.shape[0]):
+            row = known[u]
+            if row.nnz:
+                vec = self.mf.fold_in(row.indices, row.data)
+                mf[u, self.mf_rows] = self.mf.scores(vec)[self.mf_cols]
+                use_mf[u] = True
+        return recommender.mf_with_fallback_rows(mf, knn, self.mf_known, mask, use_mf)
+
+    # ---- output -------------------------------------------------------------------
+    def write_chunk(self, chunk: int, f) -> int:
+        """Score one chunk, writing its lines to `f` block by block; returns rows written."""
+        start, stop = chunk * self.chunk, min(len(self.keys), (chunk + 1) * self.chunk)
+        key = "song_id" if self.similar else "user_id"
+        writer = csv.writer(f) if self.format == "csv" else None
+        if writer is not None and (chunk == 0 or f is not sys.stdout):
+            writer.writerow([key, "rank", "song_id", "score"])
+        for lo in range(start, stop, self.block):
+            hi = min(stop, lo + self.block)
+            top, scores = self.score_block(lo, hi)
+            for r in range(hi - lo):
+                recs = [(self.ids[j], round(float(s), 6)) for j, s in zip(top[r], scores[r]) if s != -np.inf]
+                if writer is not None:
+                    writer.writerows([self.keys[lo + r], n + 1, sid, s] for n, (sid, s) in enumerate(recs))
+                else:
+                    f.write(json.dumps({key: self.keys[lo + r],
+                                        self.name: [{"song_id": sid, "score": s} for sid, s in recs]}) + "\n")
+        return stop - start
+
+
+_job: Optional[Job] = None
+
+
+def _pool_init(job: Optional[Job]) -> None:
+    global _job
+    if job is not None:  # spawn: a pickled copy; fork: already inherited
+        _job = job
+
+
+def _run_chunk(chunk: int) -> int:
+    path = _job.part_path(chunk)
+    written = [0]
+
+    def write(tmp: str) -> None:
+        with open(tmp, "w", encoding="utf-8", newline="") as f:
+            written[0] = _job.write_chunk(chunk, f)
+    atomic_replace(write, path)
+    return written[0]
+
+
+# ----------------------------------------------------------------------------
+# Setup
+# ----------------------------------------------------------------------------
+def user_job(args: argparse.Namespace, snap: ContentSnapshot) -> Job:
+    store = InteractionStore(INTERACTIONS_PATH, follow=True)
+    users = args.user_id or list(store.users)
+    rows = [store.user_idx.get(u) for u in users]
+    missing = [u for u, r in zip(users, rows) if r is None]
+    if missing:
+        log(f"{len(missing)} user(s) without interactions (popularity only): {', '.join(missing[:5])}")
+    weights = store.weights()  # users x store items, LIKE_WEIGHT*likes + plays
+    known = [(n, r) for n, r in enumerate(rows) if r is not None]
+    pick = sparse.csr_matrix((np.ones(len(known), dtype=np.float32),
+                              ([n for n, _ in known], [r for _, r in known])),
+                             shape=(len(users), weights.shape[0]))
+    weights = (pick @ weights).tocsr()  # rows in `users` order
+    seeds = (weights @ _selection(store.items, snap.row, snap.n)).tocsr()
+    mf = MFModel.load(MF_PATH) if args.beta else None
+    mf_seeds = (weights @ _selection(store.items, mf.item_idx.get, len(mf.items))).tocsr() if mf is not None else None
+    return Job(snap, users, seeds, mf, mf_seeds, args)
+
+
+def seed_job(args: argparse.Namespace, snap: ContentSnapshot) -> Job:
+    ids = list(args.seed_id or [])
+    if args.seed_file:
+        with open(args.seed_file, encoding="utf-8") as f:
+            ids += [line.strip() for line in f if line.strip()]
+    known = [sid for sid in ids if snap.row(sid) is not None]
+    if len(known) < len(ids):
+        log(f"skipping {len(ids) - len(known)} seed(s) not in the library")
+    seeds = _selection(known, snap.row, snap.n)  # a one-hot row per seed
+    return Job(snap, known, seeds, None, None, args)
+
+
+def manifest(job: Job) -> Dict[str, Any]:
+    """What the part files depend on: a rerun resumes only if this matches."""
+    return {"keys": len(job.keys), "keys_crc": zlib.crc32("\n".join(job.keys).encode("utf-8")),
+            "chunk": job.chunk, "format": job.format, "topk": job.topk,
+            "weights": [job.alpha, job.beta, job.gamma]}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Batch recommendations for many users (or similar songs for many seeds).")
+    ap.add_argument("--user-id", action="append", help="score this user (repeatable; default: every user)")
+    ap.add_argument("--seed-id", action="append", help="similar songs for this song id instead (repeatable)")
+    ap.add_argument("--seed-file", help="... or for every song id in this file, one per line")
+    ap.add_argument("--topk", type=int, default=10)
+    ap.add_argument("--alpha", type=float, default=0.6, help="content weight (as /recommendations)")
+    ap.add_argument("--beta", type=float, default=0.3, help="collaborative weight")
+    ap.add_argument("--gamma", type=float, default=0.0, help="popularity weight")
+    ap.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+    ap.add_argument("--out", default="output", help="directory for the part files (default: %(default)s)")
+    ap.add_argument("--stdout", action="store_true", help="write to stdout instead, in one process")
+    ap.add_argument("--chunk", type=int, default=10000, help="users per part file")
+    ap.add_argument("--workers", type=int, default=0, help="processes (default: one per CPU)")
+    ap.add_argument("--budget-mb", type=float, default=256.0, help="dense score arrays per worker")
+    ap.add_argument("--overwrite", action="store_true", help="discard part files from a different run")
+    args = ap.parse_args()
+    if args.topk < 1 or args.chunk < 1:
+        ap.error("--topk and --chunk must be at least 1")
+
+    t0 = time.perf_counter()
+    library = SongLibrary(LIB_PATH, follow=True)
+    model = load_content(library)
+    snap = model.snapshot()
+    if snap.matrix is None or snap.n == 0:
+        raise SystemExit("the library is empty")
+    job = seed_job(args, snap) if args.seed_id or args.seed_file else user_job(args, snap)
+    log(f"loaded {len(model)} songs, {len(job.keys)} {'seeds' if job.similar else 'users'}"
+        f"{', MF factors' if job.mf is not None else ''} in {time.perf_counter() - t0:.1f}s")
+
+    global _job
+    _job = job
+    t1 = time.perf_counter()
+    if args.stdout:
+        for chunk in range(job.n_chunks()):
+            job.write_chunk(chunk, sys.stdout)
+        log(f"scored {len(job.keys)} in {time.perf_counter() - t1:.1f}s")
+        return
+
+    os.makedirs(args.out, exist_ok=True)
+    meta_path = os.path.join(args.out, f"{job.name}.json")
+    meta = manifest(job)
+    old = load_json(meta_path, None)
+    stale = sorted(glob.glob(os.path.join(args.out, f"{job.name}.[0-9]*.*")))
+    if old != meta and stale:
+        if not args.overwrite:
+            raise SystemExit(f"{args.out} holds parts of a different run ({meta_path}); "
+                             f"pass --overwrite to replace them or choose another --out")
+        for path in stale:
+            os.remove(path)
+    write_json(meta_path, meta)
+    todo = [c for c in range(job.n_chunks()) if not os.path.exists(job.part_path(c))]
+    if len(todo) < job.n_chunks():
+        log(f"resuming: {job.n_chunks() - len(todo)} of {job.n_chunks()} parts already written")
+
+    workers = min(args.workers or os.cpu_count() or 1, len(todo)) or 1
+    done = 0
+    if workers == 1:
+        for chunk in todo:
+            done += _run_chunk(chunk)
+            log(f"part {chunk}: {done} rows")
+    else:
+        # fork shares the loaded arrays with every worker; spawn has to copy them
+        fork = "fork" in multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context("fork" if fork else "spawn")
+        with ProcessPoolExecutor(workers, mp_context=ctx, initializer=_pool_init,
+                                 initargs=(None if fork else job,)) as pool:
+            for chunk, n in zip(todo, pool.map(_run_chunk, todo)):
+                done += n
+                log(f"part {chunk}: {done} rows")
+    elapsed = time.perf_counter() - t1
+    log(f"scored {done} in {elapsed:.1f}s ({done / max(elapsed, 1e-9):.0f}/s) → {args.out}/{job.name}.*.{job.format}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# recommender.py — array-based scoring for the hybrid recommender
+# Pure functions over NumPy/SciPy arrays aligned to the content model's row
+# indices (ContentModel.id_to_idx). No globals, so api.py and offline jobs can
+# share them.
+
+from __future__ import annotations
+from typing import Optional
+
+import numpy as np
+from scipy import sparse
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, best first (argpartition, no full sort)."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def content_scores(matrix: sparse.csr_matrix, seeds: np.ndarray) -> np.ndarray:
+    """Cosine of every row against the mean of the seed rows (rows are unit length)."""
+    profile = np.asarray(matrix[seeds].mean(axis=0)).ravel()
+    norm = np.linalg.norm(profile)
+    if norm == 0:
+        return np.zeros(matrix.shape[0], dtype=np.float32)
+    return (np.asarray(matrix @ profile).ravel() / norm).astype(np.float32)
+
+
+def cf_scores(matrix: sparse.csr_matrix, seeds: np.ndarray, weights: np.ndarray,
+              table: Optional[sparse.csr_matrix] = None) -> np.ndarray:
+    """Summed seed→item similarity weighted by `weights`.
+
+    Rows are l2-normalised, so sum_j w_j * cos(j, item) = M @ (M[seeds].T @ w).
+    With a top-M neighbour `table`, only the seeds' neighbours get a score.
+    """
+    if table is not None:
+        return np.asarray(table[seeds].T @ weights).ravel()
+    profile = np.asarray(matrix[seeds].T @ weights).ravel()  # (V,)
+    return np.asarray(matrix @ profile).ravel()
+
+
+def minmax(scores: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """Scale scores[mask] to 0..1; everything outside the mask becomes 0."""
+    out = np.zeros(len(scores), dtype=np.float32)
+    if mask.any():
+        lo, hi = scores[mask].min(), scores[mask].max()
+        out[mask] = (scores[mask] - lo) / (hi - lo + 1e-8)
+    return out
+
+
+def mf_with_fallback(mf: np.ndarray, knn: np.ndarray, known: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """CF score per song: ALS where the model has factors for it (`known`),
+    item-kNN for the rest, each min-max scaled over the candidates it covers."""
+    out = minmax(knn, mask)
+    both = mask & known
+    out[both] = minmax(mf, both)[both]
+    return out
+
+
+def hybrid_top_k(k: int, candidates: np.ndarray, alpha: float, beta: float, gamma: float,
+                 cb: Optional[np.ndarray] = None, cf: Optional[np.ndarray] = None,
+                 pop: Optional[np.ndarray] = None) -> np.ndarray:
+    """Blend alpha*CB + beta*CF + gamma*popularity and return the top-k candidate rows.
+
+    `candidates` is a boolean mask (alive and not yet seen); missing components count as 0.
+    """
+    scores = np.zeros(len(candidates), dtype=np.float32)
+    for w, part in ((alpha, cb), (beta, cf), (gamma, pop)):
+        if part is not None and w:
+            scores += np.float32(w) * part
+    scores[~candidates] = -np.inf
+    return top_k_indices(scores, min(k, int(candidates.sum())))
+
+
+# ---- blocks of users (offline batch scoring, recommend.py) -------------------------
+# Same scores as the functions above, for a block of users at once: `seeds` is a
+# sparse (users x songs) matrix of interaction weights, one row per user, and
+# every result is a dense (users x songs) array.
+
+def propagate(matrix: sparse.csr_matrix, profiles: sparse.csr_matrix) -> np.ndarray:
+    """profiles (users x terms) against every song row: one pass over the matrix
+    for the whole block instead of one per user."""
+    if profiles.shape[0] == 0:
+        return np.zeros((0, matrix.shape[0]), dtype=np.float32)
+    cols = np.unique(profiles.indices)  # only the terms the block uses, not all 2**18
+    dense = profiles[:, cols].T.toarray().astype(np.float32)
+    return np.ascontiguousarray(np.asarray(matrix[:, cols] @ dense).T)
+
+
+def content_scores_block(matrix: sparse.csr_matrix, seeds: sparse.csr_matrix) -> np.ndarray:
+    """content_scores for each row of `seeds` (its nonzero columns are the seeds)."""
+    hit = seeds.copy()
+    hit.data = np.ones_like(hit.data, dtype=np.float32)
+    counts = np.maximum(np.diff(hit.indptr), 1)
+    profiles = sparse.diags(1.0 / counts) @ hit @ matrix  # mean seed row per user
+    norms = np.sqrt(np.asarray(profiles.multiply(profiles).sum(axis=1)).ravel())
+    scores = propagate(matrix, profiles)
+    return scores / np.where(norms > 0, norms, 1.0)[:, None].astype(np.float32)
+
+
+def cf_scores_block(matrix: sparse.csr_matrix, seeds: sparse.csr_matrix) -> np.ndarray:
+    """cf_scores (no neighbour table) for each row of `seeds`."""
+    return propagate(matrix, (seeds @ matrix).tocsr())
+
+
+def minmax_rows(scores: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """minmax applied to every row (mask is users x songs)."""
+    lo = np.where(mask, scores, np.inf).min(axis=1, keepdims=True)
+    hi = np.where(mask, scores, -np.inf).max(axis=1, keepdims=True)
+    lo, hi = np.where(np.isfinite(lo), lo, 0), np.where(np.isfinite(hi), hi, 0)
+    return np.where(mask, (scores - lo) / (hi - lo + 1e-8), 0).astype(np.float32)
+
+
+def mf_with_fallback_rows(mf: np.ndarray, knn: np.ndarray, known: np.ndarray,
+                          mask: np.ndarray, use_mf: np.ndarray) -> np.ndarray:
+    """mf_with_fallback for every row; rows where use_mf is False are kNN only."""
+    out = minmax_rows(knn, mask)
+    both = mask & known[None, :] & use_mf[:, None]
+    return np.where(both, minmax_rows(mf, both), out)
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """top_k_indices for every row: (users x k) indices, best first."""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.zeros((scores.shape[0], 0), dtype=np.int64)
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
@@ -0,0 +1,387 @@
+# search.py — full-text search over song metadata (/search)
+# - one inverted index over title / artist / album / genres; a term's weight in
+#   a song is the sum of its FIELD_WEIGHTS (a title word counts most), ranked
+#   with BM25 on those weighted counts and the weighted song length
+# - tokenize(): casefolded, accents folded, runs of word characters; applied the
+#   same way to songs and to queries
+# - postings live in a "base" segment (term-sorted CSR arrays) plus a small
+#   "delta" of songs indexed since the last merge, folded into the base once it
+#   holds merge_every postings (the same split InteractionStore uses). Deletes
+#   are tombstones; like Lucene, df still counts them until the next merge
+# - type-ahead: the last query token also matches the dictionary terms it is a
+#   prefix of (a contiguous range of the sorted term list; the most frequent
+#   kept, up to MAX_EXPANSIONS terms / PREFIX_POSTINGS postings)
+# - fuzzy=True: a query token with no exact match matches the dictionary terms
+#   one edit away (deletes/transposes/replaces/inserts looked up in the dictionary)
+# - ranking: songs matching more of the query's tokens first, then BM25
+# Not thread-safe by itself: SongLibrary updates it under its write lock and
+# searches it under the read lock.
+
+from __future__ import annotations
+from array import array
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import re
+import string
+import unicodedata
+
+import numpy as np
+
+FIELD_WEIGHTS = {"title": 3.0, "artist": 2.0, "album": 1.0, "genres": 1.0}
+K1, B = 1.2, 0.75          # BM25 saturation / length normalisation
+MIN_PREFIX = 2             # shorter last tokens only match whole words
+MAX_EXPANSIONS = 50        # dictionary terms a prefix / typo may expand to
+PREFIX_POSTINGS = 100000   # ... and the postings a prefix may pull in (bounds latency)
+FUZZY_MIN_LEN = 4          # shorter tokens are too ambiguous to correct
+FUZZY_WEIGHT = 0.5         # a corrected token scores half an exact one
+_ALPHABET = string.ascii_lowercase + string.digits
+
+_TOKEN = re.compile(r"\w+")
+_STRIDE = 1e6  # _accumulate packs (lists matched, score) into one float
+
+
+def _fold(text: str) -> str:
+    text = text.casefold()
+    if not text.isascii():  # "Beyoncé" → "beyonce"
+        text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return text
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(_fold(text))
+
+
+def _grow(buf: np.ndarray, need: int) -> np.ndarray:
+    if need <= len(buf):
+        return buf
+    out = np.zeros(max(need, 2 * len(buf), 16), dtype=buf.dtype)
+    out[:len(buf)] = buf
+    return out
+
+
+class SearchIndex:
+    def __init__(self, merge_every: int = 50000):
+        self.merge_every = merge_every
+        self.ids: List[Optional[str]] = []   # doc → song_id (None once deleted)
+        self.doc_of: Dict[str, int] = {}     # song_id → its live doc
+        self._alive = np.zeros(0, dtype=bool)
+        self._dlen = np.zeros(0, dtype=np.float32)  # weighted length per doc
+        self._sig = np.zeros(0, dtype=np.int64)     # hash of the indexed fields
+        self._len_sum = 0.0                 # over live docs
+        self._dead = 0                      # tombstones whose postings aren't merged out yet
+        # base segment: sorted term dictionary → CSR postings (doc, weighted tf)
+        self._terms: List[str] = []
+        self._row: Dict[str, int] = {}
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._docs = np.zeros(0, dtype=np.int32)
+        self._tf = np.zeros(0, dtype=np.float32)
+        self._impact = np.zeros(0, dtype=np.float32)  # BM25 tf part, precomputed per posting
+        # delta: postings added since the last merge
+        self._delta: Dict[str, Tuple[List[int], List[float]]] = {}
+        self._delta_n = 0
+        self._new_terms: List[str] = []     # delta terms not in the base, sorted
+        self._cache: Dict[tuple, Dict[str, float]] = {}  # (artist, album, genres) → weighted terms
+
+    def __len__(self) -> int:
+        return len(self.doc_of)
+
+    # ---- documents --------------------------------------------------------------
+    def _weighted_terms(self, song) -> Dict[str, float]:
+        genres = tuple(song.genres or ())
+        key = (song.artist, song.album, genres)
+        rest = self._cache.get(key)  # an album's songs share artist/album/genres
+        if rest is None:
+            if len(self._cache) > 100000:
+                self._cache.clear()
+            rest = {}
+            for field, values in (("artist", (song.artist,)), ("album", (song.album,)), ("genres", genres)):
+                for value in values:
+                    for tok in tokenize(value or ""):
+                        rest[tok] = rest.get(tok, 0.0) + FIELD_WEIGHTS[field]
+            self._cache[key] = rest
+        out = dict(rest)
+        w = FIELD_WEIGHTS["title"]
+        for tok in tokenize(song.title or ""):
+            out[tok] = out.get(tok, 0.0) + w
+        return out
+
+    @staticmethod
+    def _signature(song) -> int:
+        return hash((song.title, song.artist, song.album, tuple(song.genres or ())))
+
+    def _new_doc(self, song, terms: Dict[str, float]) -> int:
+        doc = len(self.ids)
+        self.ids.append(song.song_id)
+        self.doc_of[song.song_id] = doc
+        self._alive = _grow(self._alive, doc + 1)
+        self._dlen = _grow(self._dlen, doc + 1)
+        self._sig = _grow(self._sig, doc + 1)
+        length = float(sum(terms.values()))
+        self._alive[doc] = True
+        self._dlen[doc] = length
+        self._sig[doc] = self._signature(song)
+        self._len_sum += length
+        return doc
+
+    def rebuild(self, songs: Iterable) -> None:
+        """Index `songs` from scratch, in bulk (one sort instead of per-song inserts)."""
+        self.__init__(self.merge_every)
+        flat: List[str] = []
+        tfs = array("f")
+        lengths, sigs, sizes = [], [], []
+        for song in songs:
+            terms = self._weighted_terms(song)
+            self.doc_of[song.song_id] = len(self.ids)
+            self.ids.append(song.song_id)
+            flat.extend(terms)
+            tfs.extend(terms.values())
+            lengths.append(sum(terms.values()))
+            sigs.append(self._signature(song))
+            sizes.append(len(terms))
+        self._alive = np.ones(len(self.ids), dtype=bool)
+        self._dlen = np.asarray(lengths, dtype=np.float32)
+        self._sig = np.asarray(sigs, dtype=np.int64)
+        self._len_sum = float(self._dlen.sum())
+        vocab = list(dict.fromkeys(flat))
+        term_id = {t: i for i, t in enumerate(vocab)}
+        tids = np.fromiter(map(term_id.__getitem__, flat), dtype=np.int32, count=len(flat))
+        docs = np.repeat(np.arange(len(self.ids), dtype=np.int32), sizes)
+        self._build_base(vocab, tids, docs, np.frombuffer(tfs, dtype=np.float32))
+
+    def _build_base(self, terms: List[str], tids: np.ndarray, docs: np.ndarray, tfs: np.ndarray) -> None:
+        """Replace the base with these postings (term ids index `terms`; docs ascending)."""
+        order = sorted(range(len(terms)), key=terms.__getitem__)
+        remap = np.empty(len(terms), dtype=np.int64)
+        remap[order] = np.arange(len(terms))
+        rows = remap[tids] if len(tids) else np.zeros(0, dtype=np.int64)
+        counts = np.bincount(rows, minlength=len(terms))  # per sorted term
+        keep = counts > 0  # terms left without postings drop out of the dictionary
+        # docs only ever grow (a re-indexed song gets a new one), so base postings
+        # followed by delta ones are already in doc order within a term, and the
+        # stable sort (timsort: base is one long run) only has to group by term
+        sort = np.argsort(rows, kind="stable")
+        self._terms = [terms[t] for t, k in zip(order, keep) if k]
+        self._row = {t: i for i, t in enumerate(self._terms)}
+        self._indptr = np.concatenate(([0], np.cumsum(counts[keep]))).astype(np.int64)
+        self._docs = docs[sort].astype(np.int32)
+        self._tf = tfs[sort].astype(np.float32)
+        self._impact = self._saturate(self._tf, self._docs)  # with this merge's avgdl
+        self._delta, self._delta_n, self._new_terms = {}, 0, []
+        self._dead = 0
+
+    def _saturate(self, tf: np.ndarray, docs: np.ndarray) -> np.ndarray:
+        """BM25's tf term: saturating in tf, normalised by the song's length."""
+        avgdl = self._len_sum / max(len(self.doc_of), 1) or 1.0
+        return (tf * (K1 + 1.0) / (tf + K1 * (1.0 - B + B * self._dlen[docs] / avgdl))).astype(np.float32)
+
+    def add(self, song) -> None:
+        """Index a new song, or re-index one whose text fields changed."""
+        doc = self.doc_of.get(song.song_id)
+        if doc is not None:
+            if self._sig[doc] == self._signature(song):
+                return  # e.g. a play count update
+            self.remove(song.song_id)
+        terms = self._weighted_terms(song)
+        doc = self._new_doc(song, terms)
+        for term, tf in terms.items():
+            postings = self._delta.get(term)
+            if postings is None:
+                postings = self._delta[term] = ([], [])
+                if term not in self._row:
+                    insort(self._new_terms, term)
+            postings[0].append(doc)
+            postings[1].append(tf)
+        self._delta_n += len(terms)
+        if self._delta_n >= self.merge_every:
+            self._merge()
+
+    def remove(self, song_id: str) -> None:
+        doc = self.doc_of.pop(song_id, None)
+        if doc is None:
+            return
+        self._alive[doc] = False
+        self.ids[doc] = None
+        self._len_sum -= float(self._dlen[doc])
+        self._dead += 1
+        if self._dead > max(len(self.doc_of), 1) // 4:
+            self._merge()
+
+    def _merge(self) -> None:
+        """Fold the delta into the base and drop tombstoned postings."""
+        terms = self._terms + self._new_terms  # each of the two is sorted; _build_base sorts again
+        row = self._row if not self._new_terms else {t: i for i, t in enumerate(terms)}
+        base_tids = np.repeat(np.arange(len(self._terms)), np.diff(self._indptr))
+        d_terms = list(self._delta)
+        d_tids = np.repeat(np.array([row[t] for t in d_terms], dtype=np.int64),
+                           [len(self._delta[t][0]) for t in d_terms])
+        d_docs = np.array([d for t in d_terms for d in self._delta[t][0]], dtype=np.int32)
+        d_tfs = np.array([f for t in d_terms for f in self._delta[t][1]], dtype=np.float32)
+        tids = np.concatenate((base_tids, d_tids)).astype(np.int64)
+        docs = np.concatenate((self._docs, d_docs))
+        tfs = np.concatenate((self._tf, d_tfs))
+        live = self._alive[docs]
+        self._build_base(terms, tids[live], docs[live], tfs[live])
+
+    # ---- term lookup ------------------------------------------------------------------
+    def _df(self, term: str) -> int:
+        r = self._row.get(term)
+        n = int(self._indptr[r + 1] - self._indptr[r]) if r is not None else 0
+        d = self._delta.get(term)
+        return n + (len(d[0]) if d is not None else 0)
+
+    def _postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(docs, BM25 tf part) for a term across base and delta."""
+        r = self._row.get(term)
+        d = self._delta.get(term)
+        lo, hi = (self._indptr[r], self._indptr[r + 1]) if r is not None else (0, 0)
+        docs, impact = self._docs[lo:hi], self._impact[lo:hi]
+        if d is not None:
+            new = np.asarray(d[0], dtype=np.int32)
+            docs = np.concatenate((docs, new))
+            impact = np.concatenate((impact, self._saturate(np.asarray(d[1], dtype=np.float32), new)))
+        return docs, impact
+
+    def _prefixed(self, prefix: str) -> List[str]:
+        """The most frequent terms starting with `prefix`, within the caps."""
+        lo = bisect_left(self._terms, prefix)
+        hi = bisect_left(self._terms, prefix + "\U0010ffff", lo)
+        out = []
+        if hi > lo:
+            df = np.diff(self._indptr[lo:hi + 1])
+            top = np.argsort(-df, kind="stable")[:MAX_EXPANSIONS]
+            out = [self._terms[lo + int(i)] for i in top]
+        i = bisect_left(self._new_terms, prefix)
+        while i < len(self._new_terms) and self._new_terms[i].startswith(prefix):
+            out.append(self._new_terms[i])
+            i += 1
+        if len(out) > MAX_EXPANSIONS:
+            out = sorted(out, key=self._df, reverse=True)[:MAX_EXPANSIONS]
+        kept, total = [], 0
+        for term in out:
+            total += self._df(term)
+            if kept and total > PREFIX_POSTINGS:
+                break
+            kept.append(term)
+        return kept
+
+    def _known(self, term: str) -> bool:
+        return term in self._row or term in self._delta
+
+    def _one_edit(self, term: str) -> List[str]:
+        """Dictionary terms one delete / transpose / replace / insert away."""
+        letters = set(_ALPHABET) | set(term)
+        splits = [(term[:i], term[i:]) for i in range(len(term) + 1)]
+        cands = {a + b[1:] for a, b in splits if b}
+        cands |= {a + b[1] + b[0] + b[2:] for a, b in splits if len(b) > 1}
+        cands |= {a + c + b[1:] for a, b in splits if b for c in letters}
+        cands |= {a + c + b for a, b in splits for c in letters}
+        cands.discard(term)
+        found = [c for c in cands if self._known(c)]
+        return sorted(found, key=self._df, reverse=True)[:MAX_EXPANSIONS]
+
+    # ---- queries --------------------------------------------------------------------
+    def search(self, query: str, k: int = 20, prefix: bool = True,
+               fuzzy: bool = False) -> List[Tuple[str, float]]:
+        """Top-k (song_id, score) for a free-text query."""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        n_live = len(self.doc_of)
+        if not tokens or n_live == 0:
+            return []
+        # one group of (term, weight) per query token
+        groups: List[List[Tuple[str, float]]] = []
+        for n, tok in enumerate(tokens):
+            group = [(tok, 1.0)] if self._known(tok) else []
+            if prefix and n == len(tokens) - 1 and len(tok) >= MIN_PREFIX:
+                group += [(t, 1.0) for t in self._prefixed(tok) if t != tok]
+            if fuzzy and not group and len(tok) >= FUZZY_MIN_LEN:
+                group = [(t, FUZZY_WEIGHT) for t in self._one_edit(tok)]
+            if group:
+                groups.append(group)
+        if not groups:
+            return []
+        n_docs = n_live + self._dead
+        per_group = [self._score_group(group, n_docs) for group in groups]
+        if self._dead:
+            per_group = [(d[self._alive[d]], sc[self._alive[d]]) for d, sc in per_group]
+        if len(per_group) == 1:
+            docs, scores = per_group[0]
+            matched = np.ones(len(docs))
+        else:
+            # songs matching every token outrank the rest, so if there are k of
+            # them nothing else needs scoring
+            docs, scores = self._match_all(per_group)
+            matched = np.full(len(docs), len(per_group))
+            if len(docs) < k and len(per_group) == 2:
+                # the rest match one token and score by it alone: each list's best will do
+                parts = [(docs, scores, matched)]
+                for d, sc in per_group:
+                    d, sc = _top(d, sc, k + len(docs))
+                    other = ~np.isin(d, docs)
+                    parts.append((d[other], sc[other], np.ones(int(other.sum()))))
+                docs, scores, matched = (np.concatenate(p) for p in zip(*parts))
+            elif len(docs) < k:
+                docs, scores, matched = _accumulate([d for d, _ in per_group], [sc for _, sc in per_group], len(self.ids))
+        if len(docs) == 0:
+            return []
+        rank = matched * (float(scores.max()) + 1.0) + scores  # more tokens matched first
+        top = np.argpartition(-rank, k - 1)[:k] if len(rank) > k else np.arange(len(rank))
+        top = top[np.argsort(-rank[top], kind="stable")]
+        return [(self.ids[docs[i]], float(scores[i])) for i in top]
+
+    def _match_all(self, per_group: List[Tuple[np.ndarray, np.ndarray]]) -> Tuple[np.ndarray, np.ndarray]:
+        """(docs, summed scores) of the songs in every group: walks the shortest
+        list and looks its songs up in the others."""
+        per_group = sorted(per_group, key=lambda g: len(g[0]))
+        docs, scores = per_group[0]
+        for other, other_scores in per_group[1:]:
+            if len(docs) > len(self.ids) // 64:  # long: scatter + gather beats bisecting
+                acc = np.zeros(len(self.ids), dtype=np.float32)
+                acc[other] = other_scores
+                add = acc[docs]
+                found = add > 0  # every score is positive
+                docs, scores = docs[found], scores[found] + add[found]
+            else:
+                pos = np.minimum(np.searchsorted(other, docs), max(len(other) - 1, 0))
+                found = other[pos] == docs if len(other) else np.zeros(len(docs), dtype=bool)
+                docs, scores = docs[found], scores[found] + other_scores[pos[found]]
+        return docs, scores
+
+    def _score_group(self, group: Sequence[Tuple[str, float]], n_docs: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(docs ascending, BM25 scores) matching any term of one query token's group."""
+        all_docs, all_scores = [], []
+        for term, weight in group:
+            docs, impact = self._postings(term)
+            if len(docs) == 0:
+                continue
+            df = len(docs)
+            idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            all_docs.append(docs)
+            all_scores.append(impact * np.float32(weight * idf))
+        if not all_docs:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        if len(all_docs) == 1:
+            return all_docs[0], all_scores[0]  # a posting list holds each doc once
+        docs, scores, _ = _accumulate(all_docs, all_scores, len(self.ids))
+        return docs, scores
+
+
+def _top(docs: np.ndarray, scores: np.ndarray, m: int) -> Tuple[np.ndarray, np.ndarray]:
+    if len(docs) <= m:
+        return docs, scores
+    best = np.argpartition(-scores, m - 1)[:m]
+    return docs[best], scores[best]
+
+
+def _accumulate(docs_list: List[np.ndarray], scores_list: List[np.ndarray],
+                n: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Per distinct doc: summed score and how many of the lists it appeared in."""
+    docs = np.concatenate(docs_list)
+    scores = np.concatenate(scores_list)
+    if len(docs) > n // 16:  # dense accumulation beats sorting for long lists
+        # one pass for both: every posting adds _STRIDE + its score (scores are < _STRIDE)
+        total = np.bincount(docs, weights=scores.astype(np.float64) + _STRIDE, minlength=n)
+        hit = np.flatnonzero(total > 0)  # (a bool mask is much faster to scan)
+        count = np.floor(total[hit] / _STRIDE)
+        return hit, total[hit] - count * _STRIDE, count
+    uniq, inv = np.unique(docs, return_inverse=True)
+    return uniq, np.bincount(inv, weights=scores), np.bincount(inv)
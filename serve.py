@@ -0,0 +1,74 @@
+# serve.py — run the API as one writer process plus N reader workers
+#   python serve.py --workers 4 --port 8000
+#
+# `uvicorn api:app --workers N` would give every worker its own copy of the
+# library and models, and every worker would append to (and compact) the same
+# files. Here exactly one process, the writer (MUSICLIB_ROLE=writer, on a
+# loopback port), owns the files and does every mutation. The N public workers
+# (MUSICLIB_ROLE=reader):
+#   - memory-map the content matrix the writer publishes, so it is in RAM once
+#     however many workers there are
+#   - keep their library / interactions / playlists replicas current by tailing
+#     the writer's append-only logs
+#   - watch the shared version counters (a few bytes, checked every
+#     MUSICLIB_FOLLOW_S) to know when to do either
+#   - forward POST/DELETE requests (and /trending) to the writer
+# Reads therefore scale with the number of workers. A write is visible in the
+# worker that forwarded it as soon as the writer replies, and in the others
+# within FOLLOW_S. Content rows (for /similar and /recommendations) follow
+# within MUSICLIB_PUBLISH_S; interactions within MUSICLIB_EVENT_FLUSH_S.
+
+from __future__ import annotations
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import requests
+import uvicorn
+
+
+def wait_ready(url: str, proc: subprocess.Popen, timeout: float) -> None:
+    """Block until the writer is ready (its content model loaded and published)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"writer exited with code {proc.returncode}")
+        try:
+            if requests.get(url + "/ready", timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"writer not ready after {timeout:.0f}s")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Serve the API with one writer and N reader workers.")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="reader workers (default: cpus)")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--writer-port", type=int, default=0, help="loopback port of the writer (default: port+1)")
+    ap.add_argument("--startup-timeout", type=float, default=600.0)
+    args = ap.parse_args()
+
+    writer_url = f"http://127.0.0.1:{args.writer_port or args.port + 1}"
+    env = dict(os.environ, MUSICLIB_ROLE="writer")
+    writer = subprocess.Popen([sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1",
+                               "--port", writer_url.rsplit(":", 1)[1]], env=env)
+    try:
+        wait_ready(writer_url, writer, args.startup_timeout)
+        # reader workers are spawned by uvicorn and inherit this environment
+        os.environ.update(MUSICLIB_ROLE="reader", MUSICLIB_WRITER_URL=writer_url)
+        uvicorn.run("api:app", host=args.host, port=args.port, workers=max(1, args.workers))
+    finally:
+        writer.terminate()
+        try:
+            writer.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            writer.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,27 @@
+import sys
+
+_intern = sys.intern
+
+
 class Song:
     """A single track"""
+    # __slots__: no per-instance __dict__ (together with BSTNode's, about a
+    # third of what each song cost in memory; see benchmarks/bench_memory.py)
+    __slots__ = ("song_id", "title", "artist", "album", "genres", "duration", "plays", "rank", "bpm")
+
     def __init__(self, song_id, title, artist, album="", genres=None, duration=0,
                  plays=0, rank=0, bpm=None):
         if song_id is None:
             raise ValueError("song_id cannot be None")
         self.song_id = str(song_id)   # use string keys for consistancy
         self.title = title or "" #default to empty str if empty
-        self.artist = artist or ""
+        # artist/album/genre strings repeat across many songs: intern them so
+        # every song by an artist points at the same str object
+        self.artist = _intern(str(artist or ""))
 
         # extra data
-        self.album = album or ""
-        self.genres = list(genres) if genres is not None else []  # avoid shared lists
+        self.album = _intern(str(album or ""))
+        self.genres = tuple(_intern(str(g)) for g in genres) if genres else ()  # immutable, so safe to share
         self.duration = int(duration)  # seconds
         self.plays = int(plays)
         self.rank = int(rank)          # Deezer popularity proxy
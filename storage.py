@@ -0,0 +1,227 @@
+# storage.py — snapshot + append-only mutation log persistence
+# Instead of rewriting a whole JSON file on every change, each change is appended
+# as one JSON line to "<file>.log". Once the log gets long it is folded back into
+# the snapshot ("compaction"): the snapshot is written to a temp file, fsynced and
+# atomically renamed over the old one, then the log is truncated.
+#
+# Records should be idempotent (e.g. "set plays to 7", not "plays += 1"): a crash
+# between the rename and the truncate replays the old log onto the new snapshot.
+#
+# Other processes can follow a log as it grows (LogFollower): compaction swaps in
+# a fresh log file instead of truncating the old one in place, so a follower can
+# always finish reading the file it has open before moving on.
+
+from __future__ import annotations
+from typing import Any, Callable, Iterator, List, Optional
+import json
+import os
+import threading
+
+from metrics import span
+
+DEFAULT_COMPACT_EVERY = 5000
+
+
+def load_json(path: str, default):
+    """Read a JSON file, falling back to `default` when missing/corrupt."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return default
+
+
+def write_json(path: str, obj: Any, indent: Optional[int] = 2) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=indent, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def atomic_replace(write: Callable[[str], None], path: str) -> None:
+    """Call write(tmp_path), then rename tmp over `path` (readers never see half a file)."""
+    tmp = path + ".tmp"
+    write(tmp)
+    os.replace(tmp, path)
+    try:  # persist the rename itself
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass  # not supported on every platform (e.g. Windows)
+
+
+class AppendLog:
+    """JSON-lines mutation log with a compaction counter."""
+
+    def __init__(self, path: str, compact_every: int = DEFAULT_COMPACT_EVERY, fsync: bool = False):
+        self.path = path
+        self.compact_every = compact_every
+        self.fsync = fsync   # fsync every append (durable, but much slower)
+        self.pending = 0     # records since the last compaction
+        self._fh = None
+        self._lock = threading.Lock()
+
+    def replay(self) -> Iterator[dict]:
+        """Yield logged records in order; a torn last line (crash mid-write) is cut off."""
+        if not os.path.exists(self.path):
+            return
+        good = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partial write at the tail
+                good += len(line)
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                self.pending += 1
+                yield rec
+        if good < os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(good)
+
+    def append(self, rec: dict) -> None:
+        self.append_many([rec])
+
+    def append_many(self, recs) -> None:
+        lines = "".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in recs)
+        if not lines:
+            return
+        with self._lock:
+            if self._fh is None:
+                self._fh = open(self.path, "a", encoding="utf-8")
+            self._fh.write(lines)
+            self._fh.flush()
+            if self.fsync:
+                os.fsync(self._fh.fileno())
+            self.pending += lines.count("\n")
+
+    @property
+    def due(self) -> bool:
+        return self.pending >= self.compact_every
+
+    def compact(self, write_snapshot: Callable[[str], None], snapshot_path: str) -> None:
+        """Atomically replace the snapshot via write_snapshot(tmp_path), then empty the log."""
+        with self._lock:
+            atomic_replace(write_snapshot, snapshot_path)
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+            # a new empty file rather than truncating: followers still reading the
+            # old one see all of it (see LogFollower)
+            atomic_replace(lambda tmp: open(tmp, "w").close(), self.path)
+            self.pending = 0
+
+
+class LogFollower:
+    """Reads the records another process appends to an AppendLog, as they land.
+
+    Open the follower *before* reading the snapshot: records already folded into
+    a newer snapshot may then be applied twice, which idempotent records allow,
+    but none are missed. When the writer compacts, the follower drains the old
+    file (everything in it is in the new snapshot as well) and moves on to the
+    new one.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fh = None
+        self._partial = b""
+        self._open()
+
+    def _open(self) -> None:
+        self._partial = b""
+        try:
+            self._fh = open(self.path, "rb")
+        except FileNotFoundError:
+            self._fh = None
+
+    def _read(self) -> List[dict]:
+        *lines, self._partial = (self._partial + self._fh.read()).split(b"\n")
+        out = []
+        for line in lines:
+            try:
+                out.append(json.loads(line))
+            except ValueError:
+                continue
+        return out
+
+    def poll(self) -> List[dict]:
+        """Records appended since the last call (only complete lines)."""
+        out: List[dict] = []
+        while True:
+            if self._fh is None:
+                self._open()
+                if self._fh is None:
+                    return out
+            out += self._read()
+            try:
+                swapped = os.stat(self.path).st_ino != os.fstat(self._fh.fileno()).st_ino
+            except FileNotFoundError:
+                return out
+            if not swapped:
+                return out
+            out += self._read()  # compacted: the writer is done with this file
+            self._fh.close()
+            self._open()
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+class JsonStore:
+    """A small JSON document (dict or list) persisted as snapshot + log.
+
+    `apply(data, rec)` mutates the document for one logged record; it's used both
+    for replay at startup and by callers that want to record + apply in one go.
+    `decode`/`encode` convert between the JSON snapshot and an in-memory form
+    (e.g. lists ↔ dicts for O(1) lookups); both default to the identity.
+    With `follow=True` the store is a read-only replica of one another process
+    writes: sync() applies that process's new log records.
+    """
+
+    def __init__(self, path: str, default, apply: Callable[[Any, dict], None],
+                 compact_every: int = DEFAULT_COMPACT_EVERY, indent: Optional[int] = 2,
+                 decode: Optional[Callable[[Any], Any]] = None,
+                 encode: Optional[Callable[[Any], Any]] = None, follow: bool = False):
+        self.path = path
+        self.apply = apply
+        self.indent = indent
+        self.encode = encode or (lambda data: data)
+        self.follower = LogFollower(path + ".log") if follow else None
+        self.log = None if follow else AppendLog(path + ".log", compact_every=compact_every)
+        self.data = load_json(path, default)
+        if decode is not None:
+            self.data = decode(self.data)
+        for rec in (self.follower.poll() if follow else self.log.replay()):
+            apply(self.data, rec)
+
+    def sync(self) -> int:
+        """Follower mode: apply records logged since the last call; returns how many."""
+        recs = self.follower.poll()
+        for rec in recs:
+            self.apply(self.data, rec)
+        return len(recs)
+
+    def record(self, rec: dict) -> None:
+        """Apply one mutation and append it to the log (O(1) disk write)."""
+        self.apply(self.data, rec)
+        self.log.append(rec)
+        if self.log.due:
+            self.save()
+
+    @property
+    def unsaved(self) -> bool:
+        """Logged changes not folded into the snapshot yet, or no snapshot at all."""
+        return self.log is not None and (self.log.pending > 0 or not os.path.exists(self.path))
+
+    def save(self) -> None:
+        """Write a full snapshot and truncate the log."""
+        with span("json.save"):
+            self.log.compact(lambda tmp: write_json(tmp, self.encode(self.data), indent=self.indent), self.path)
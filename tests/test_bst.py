@@ -0,0 +1,112 @@
+# test_bst.py — AVL SongBST against a dict: order, balance and page() cursors
+import math
+import random
+
+import pytest
+
+from bst import SongBST
+from indexes import SORT_KEYS
+from song import Song
+
+
+def _song(i, rng):
+    return Song(f"{i:05d}", f"title {rng.randrange(50)}", f"Artist {i % 7}",
+                plays=rng.randrange(20), rank=rng.randrange(1000))
+
+
+def _check(tree, model):
+    assert len(tree) == len(model)
+    assert [s.song_id for s in tree.inorder()] == sorted(model)
+
+    def height(node):  # recomputed, not trusted from node.height
+        if node is None:
+            return 0
+        left, right = height(node.left), height(node.right)
+        assert abs(left - right) <= 1 and node.height == 1 + max(left, right)
+        return 1 + max(left, right)
+
+    assert height(tree.root) <= 1.45 * math.log2(len(model) + 2)  # AVL bound
+
+
+def _walk(tree, **kw):
+    """Every page of a listing, following next_key cursors."""
+    out, after = [], None
+    while True:
+        songs, after = tree.page(after=after, **kw)
+        out += [s.song_id for s in songs]
+        if after is None:
+            return out
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_random_insert_delete_matches_a_dict(seed):
+    rng = random.Random(seed)
+    tree, model = SongBST(), {}
+    for _ in range(3000):
+        i = rng.randrange(800)
+        if rng.random() < 0.35:
+            assert tree.delete(f"{i:05d}") == (model.pop(f"{i:05d}", None) is not None)
+        else:
+            song = _song(i, rng)
+            tree.insert(song)
+            model[song.song_id] = song
+    _check(tree, model)
+    for sid, song in model.items():
+        assert tree.find(sid) is song
+    assert tree.find("nope") is None
+
+
+def test_sorted_inserts_stay_balanced():
+    rng = random.Random(3)
+    tree, model = SongBST(), {}
+    for i in range(2000):  # ascending ids: the worst case for a plain BST
+        song = _song(i, rng)
+        tree.insert(song)
+        model[song.song_id] = song
+    _check(tree, model)
+    for i in range(0, 2000, 2):
+        tree.delete(f"{i:05d}")
+        del model[f"{i:05d}"]
+    _check(tree, model)
+
+
+def test_bulk_load_keeps_the_last_duplicate():
+    rng = random.Random(4)
+    songs = [_song(i, rng) for i in rng.sample(range(500), 300)]
+    again = _song(int(songs[0].song_id), rng)
+    tree = SongBST()
+    tree.bulk_load(songs + [again])
+    model = {s.song_id: s for s in songs + [again]}
+    _check(tree, model)
+    assert tree.find(again.song_id) is again
+
+
+@pytest.mark.parametrize("sort", ["id"] + list(SORT_KEYS))
+@pytest.mark.parametrize("limit", [1, 7, 50])
+def test_page_cursors_walk_the_whole_order(sort, limit):
+    rng = random.Random(5)
+    tree, model = SongBST(), {}
+    for i in rng.sample(range(1000), 400):
+        song = _song(i, rng)
+        tree.insert(song)
+        model[song.song_id] = song
+    for sid in rng.sample(sorted(model), 100):
+        tree.delete(sid)
+        del model[sid]
+    for sid in rng.sample(sorted(model), 50):  # re-file under new plays / title
+        song = _song(int(sid), rng)
+        tree.insert(song)
+        model[sid] = song
+    key = (lambda s: (s.song_id,)) if sort == "id" else SORT_KEYS[sort]
+
+    def expected(keep):
+        return [s.song_id for s in sorted(filter(keep, model.values()), key=key)]
+
+    assert _walk(tree, sort=sort, limit=limit) == expected(lambda s: True)
+    assert _walk(tree, sort=sort, limit=limit, min_plays=10) == expected(lambda s: s.plays >= 10)
+    assert _walk(tree, sort=sort, limit=limit, artist="artist 3") == expected(lambda s: s.artist == "Artist 3")
+
+
+def test_page_rejects_an_unknown_sort():
+    with pytest.raises(ValueError):
+        SongBST().page("bogus")
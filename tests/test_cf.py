@@ -0,0 +1,26 @@
+# test_cf.py — the collaborative score once an ALS model has been trained
+import os
+import tempfile
+
+os.environ["MUSICLIB_DATA"] = tempfile.mkdtemp(prefix="musiclib-test-")  # before api reads it
+
+import numpy as np
+
+import api
+from song import Song
+
+
+def test_cf_scores_stay_nonzero_after_mf_training():
+    # one user, as in the default setup: ALS only has factors for the songs they touched
+    api.library.add_songs([Song(str(i), f"title {i}", f"artist {i % 5}", genres=[("rock", "jazz", "pop")[i % 3]])
+                           for i in range(30)])
+    api.load_content()
+    api.interactions_store.add_events([(api.DEFAULT_USER, "0", "like"), (api.DEFAULT_USER, "1", "play"),
+                                       (api.DEFAULT_USER, "7", "play")])
+    before = api.cf_item_score_array(api.DEFAULT_USER)
+    assert np.count_nonzero(before) > 0
+
+    assert api.mf_trainer.train() is not None
+    after = api.cf_item_score_array(api.DEFAULT_USER)
+    assert np.count_nonzero(after) == np.count_nonzero(before)
+    assert api.hybrid_recommend(5, alpha=0.0, beta=1.0)
@@ -0,0 +1,46 @@
+# test_content.py — ContentModel persistence across restarts
+import glob
+import os
+
+import numpy as np
+
+from content import ContentModel
+from storage import load_json
+
+
+def _fitted(songs):
+    model = ContentModel(n_features=2 ** 12)
+    model.fit(songs)
+    return model
+
+
+def test_save_after_restart_never_reuses_the_live_generation(tmp_path):
+    songs = [(str(i), f"song {i} by artist {i % 3}", 0.0) for i in range(20)]
+    _fitted(songs).save(str(tmp_path))
+    first = load_json(os.path.join(tmp_path, "model.json"), None)
+
+    restarted = ContentModel(n_features=2 ** 12)  # counters start over in a new process
+    assert restarted.load(str(tmp_path))
+    assert (restarted.epoch, restarted.version) > (first["epoch"], first["version"])
+    restarted.add("20", "a new song", 0.0)
+    restarted.save(str(tmp_path))
+    second = load_json(os.path.join(tmp_path, "model.json"), None)
+    assert second["name"] != first["name"]
+    assert not glob.glob(os.path.join(tmp_path, first["name"] + ".*.npy"))  # replaced, not overwritten
+
+    again = ContentModel(n_features=2 ** 12)
+    assert again.load(str(tmp_path))
+    assert len(again) == 21 and again.id_to_idx["20"] == 20
+    assert np.array_equal(again.matrix.toarray(), restarted.matrix.toarray())
+
+
+def test_attach_rereads_a_restarted_publisher(tmp_path):
+    songs = [(str(i), f"song {i} by artist {i % 3}", 0.0) for i in range(10)]
+    _fitted(songs).publish(str(tmp_path))
+    reader = ContentModel(n_features=2 ** 12)
+    assert reader.attach(str(tmp_path))
+    assert not reader.attach(str(tmp_path))  # nothing new
+
+    _fitted(songs[:5]).publish(str(tmp_path))  # same epoch/version, another process
+    assert reader.attach(str(tmp_path))
+    assert reader.idx_to_id == [str(i) for i in range(5)]
@@ -0,0 +1,139 @@
+# trending.py — time-decayed play counters with a live top-k per window
+# Forward decay: an event of weight w at time t adds w * exp((t - t0) / tau) to
+# the song's counter, where t0 is a fixed landmark. The decayed score "now" is
+# counter * exp(-(now - t0) / tau) — the same factor for every song — so the
+# ranking never changes just because time passes. That makes an update O(1)
+# and lets a small top-k set stay exact: a song outside it can only overtake
+# a member by receiving an event, and that's when we check.
+# When the exponent gets large, everything is rescaled to a new landmark.
+
+from __future__ import annotations
+from typing import Dict, Iterable, List, Optional, Tuple
+import json
+import math
+import os
+import threading
+import time
+
+from storage import atomic_replace, write_json
+
+WINDOWS = {"1h": 3600.0, "24h": 86400.0, "7d": 7 * 86400.0}  # name → mean lifetime (s)
+
+
+class DecayedCounter:
+    """Forward-decayed score per song with a bounded top-`capacity` set.
+
+    Deletes shrink the set (it's refilled from all scores below capacity // 2),
+    so top_k is exact for k <= capacity // 2.
+    """
+
+    def __init__(self, tau: float, capacity: int = 200, t0: Optional[float] = None):
+        self.tau = tau
+        self.capacity = capacity
+        self.t0 = time.time() if t0 is None else t0
+        self.scores: Dict[str, float] = {}
+        self.top: Dict[str, float] = {}  # the `capacity` largest scores
+        self._min: Optional[str] = None  # id of the smallest score in `top`
+
+    def _rescale(self, t: float) -> None:
+        f = math.exp(-(t - self.t0) / self.tau)
+        self.scores = {k: v * f for k, v in self.scores.items() if v * f > 1e-12}
+        self.top = {k: v * f for k, v in self.top.items() if k in self.scores}
+        self._min = min(self.top, key=self.top.get) if self.top else None
+        self.t0 = t
+
+    def add(self, song_id: str, weight: float = 1.0, t: Optional[float] = None) -> None:
+        t = time.time() if t is None else t
+        if (t - self.t0) / self.tau > 50:  # keep exp() well inside float range
+            self._rescale(t)
+        score = self.scores.get(song_id, 0.0) + weight * math.exp((t - self.t0) / self.tau)
+        self.scores[song_id] = score
+        if song_id in self.top:
+            self.top[song_id] = score
+            if song_id == self._min:
+                self._min = min(self.top, key=self.top.get)
+        elif len(self.top) < self.capacity:
+            self.top[song_id] = score
+            if self._min is None or score < self.top[self._min]:
+                self._min = song_id
+        elif score > self.top[self._min]:
+            del self.top[self._min]
+            self.top[song_id] = score
+            self._min = min(self.top, key=self.top.get)
+
+    def remove(self, song_id: str) -> None:
+        self.scores.pop(song_id, None)
+        if self.top.pop(song_id, None) is not None:
+            if len(self.top) < self.capacity // 2:
+                self._refill()  # rare: many top songs deleted
+            self._min = min(self.top, key=self.top.get) if self.top else None
+
+    def _refill(self) -> None:
+        best = sorted(self.scores.items(), key=lambda kv: -kv[1])[:self.capacity]
+        self.top = dict(best)
+
+    def decayed(self, t: Optional[float] = None) -> float:
+        """Multiplier turning stored counters into scores at time t."""
+        t = time.time() if t is None else t
+        return math.exp(-(t - self.t0) / self.tau)
+
+    def top_k(self, k: int, t: Optional[float] = None) -> List[Tuple[str, float]]:
+        f = self.decayed(t)
+        best = sorted(self.top.items(), key=lambda kv: -kv[1])[:k]
+        return [(sid, v * f) for sid, v in best]
+
+
+class Trending:
+    """One DecayedCounter per window; thread-safe."""
+
+    def __init__(self, windows: Dict[str, float] = WINDOWS, capacity: int = 200):
+        self.windows = {name: DecayedCounter(tau, capacity) for name, tau in windows.items()}
+        self._lock = threading.Lock()
+
+    def add(self, song_id: str, weight: float = 1.0, t: Optional[float] = None) -> None:
+        with self._lock:
+            for c in self.windows.values():
+                c.add(song_id, weight, t)
+
+    def add_many(self, events: Iterable[Tuple[str, float]], t: Optional[float] = None) -> None:
+        """(song_id, weight) pairs, all at time t (default now); one lock round-trip."""
+        t = time.time() if t is None else t
+        with self._lock:
+            for song_id, weight in events:
+                for c in self.windows.values():
+                    c.add(song_id, weight, t)
+
+    def remove(self, song_id: str) -> None:
+        with self._lock:
+            for c in self.windows.values():
+                c.remove(song_id)
+
+    def top(self, window: str, k: int = 10) -> List[Tuple[str, float]]:
+        """(song_id, decayed score) best first; KeyError for an unknown window."""
+        c = self.windows[window]
+        with self._lock:
+            return c.top_k(k)
+
+    # ---- persistence (a small JSON snapshot; counters survive restarts) --------
+    def save(self, path: str) -> None:
+        with self._lock:
+            data = {name: {"tau": c.tau, "t0": c.t0, "scores": c.scores} for name, c in self.windows.items()}
+        atomic_replace(lambda tmp: write_json(tmp, data, indent=None), path)
+
+    def load(self, path: str) -> None:
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except ValueError:
+            return
+        with self._lock:
+            for name, c in self.windows.items():
+                saved = data.get(name)
+                if not saved or saved.get("tau") != c.tau:
+                    continue
+                c.t0 = saved["t0"]
+                c.scores = {k: float(v) for k, v in saved["scores"].items()}
+                c._refill()
+                c._min = min(c.top, key=c.top.get) if c.top else None